@@ -1,20 +1,56 @@
 # ai.py (updated for Groq)
 import os
 import json
-from typing import Dict, Any, List
+import asyncio
+import time
+from typing import Dict, Any, List, AsyncIterator
 from dotenv import load_dotenv
 
+from utils.metrics import observe_upstream
+from utils.route_solver import optimize_school_routes
+
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-20b")
 USE_MOCK = os.getenv("USE_MOCK_AI", "true").lower() in ("1","true","yes")
+# Point at a local fake (benchmarks/llm_stub.py) with GROQ_BASE_URL
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Requests allowed in flight to the LLM at once; the rest wait their turn
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+
+_groq_client = None
+_llm_slots = None
+
+
+def get_llm_client():
+    """Shared AsyncGroq client with a pooled connection, created on first use."""
+    global _groq_client
+    if _groq_client is None and GROQ_API_KEY and not USE_MOCK:
+        import httpx
+        from groq import AsyncGroq
+        _groq_client = AsyncGroq(
+            api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+            http_client=httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=httpx.Limits(
+                max_connections=LLM_CONCURRENCY, max_keepalive_connections=LLM_CONCURRENCY)),
+        )
+    return _groq_client
+
+
+async def close_llm_client():
+    global _groq_client
+    if _groq_client is not None:
+        await _groq_client.close()
+        _groq_client = None
 
-if GROQ_API_KEY and not USE_MOCK:
-    from groq import Groq
-    groq_client = Groq(api_key=GROQ_API_KEY)
-else:
-    groq_client = None
+
+def _slots() -> asyncio.Semaphore:
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+    return _llm_slots
 
 ROUTE_OPTIMIZE_PROMPT = """
 You are an optimization assistant. Given stops and vehicles, produce an optimized assignment ...
@@ -33,21 +69,64 @@ Respond:
 """
 
 async def call_llm_for_chat(prompt: str, max_tokens: int = 200) -> Dict[str, Any]:
-    if USE_MOCK or not groq_client:
+    client = get_llm_client()
+    if client is None:
         return {"text": f"[MOCK] Echo: {prompt}", "raw": {"mock": True}}
 
-    # Call Groq chat completions
-    resp = groq_client.chat.completions.create(
-        model=GROQ_MODEL,
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=max_tokens
-    )
+    # Awaited on the shared async client, so the event loop keeps serving sockets meanwhile
+    async with _slots():
+        start = time.perf_counter()
+        try:
+            resp = await client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens
+            )
+        except Exception:
+            observe_upstream("llm", start, ok=False)
+            raise
+        observe_upstream("llm", start)
     text = resp.choices[0].message.content
-    return {"text": text, "raw": resp}
+    return {"text": text, "raw": resp.model_dump(exclude_none=True)}
+
+
+async def stream_llm_for_chat(prompt: str, max_tokens: int = 200) -> AsyncIterator[str]:
+    """Reply text in chunks as the model produces them."""
+    client = get_llm_client()
+    if client is None:
+        for word in f"[MOCK] Echo: {prompt}".split(" "):
+            yield word + " "
+        return
+
+    async with _slots():
+        # Timed to the last chunk, so this is the whole generation, not time to first token
+        start, ok = time.perf_counter(), False
+        try:
+            stream = await client.chat.completions.create(
+                model=GROQ_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            ok = True
+        finally:
+            observe_upstream("llm_stream", start, ok=ok)
+
+def _has_coordinates(stop: Dict[str, Any]) -> bool:
+    return stop.get("lat") is not None and (stop.get("lon") is not None or stop.get("lng") is not None)
 
 async def optimize_route_via_ai(stops: List[Dict[str, Any]], vehicles: List[Dict[str, Any]] = None, liveTraffic: Dict[str, Any] = None) -> Dict[str, Any]:
+    # Stops with coordinates are solved locally (deterministic, bounded time) off the event loop
+    if stops and all(_has_coordinates(s) for s in stops):
+        parsed = await asyncio.to_thread(optimize_school_routes, stops, vehicles, liveTraffic)
+        return {"parsed": parsed, "raw": {"solver": "local"}, "text": json.dumps(parsed)}
+
+    # Otherwise fall back to asking the LLM
     input_payload = {"stops": stops, "vehicles": vehicles or [], "liveTraffic": liveTraffic or {}}
     prompt = ROUTE_OPTIMIZE_PROMPT.replace("{input_json}", json.dumps(input_payload))
     result = await call_llm_for_chat(prompt, max_tokens=800)
@@ -0,0 +1,122 @@
+# benchmarks/broadcast_load.py
+"""
+Load benchmark for the location fan-out.
+
+Simulates N drivers pinging at a fixed rate and M dashboards connected to a
+real socketio.AsyncServer (transport sends are stubbed out), then compares the
+old per-ping global emit with the batched LocationBroadcaster.
+
+    python -m benchmarks.broadcast_load --drivers 300 --dashboards 50 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import socketio
+
+from utils.broadcast import LocationBroadcaster, room_for
+
+
+def p99(values):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+async def build_server(dashboards, routes, subscribe):
+    sio = socketio.AsyncServer(async_mode="asgi")
+    counters = {"emits": 0, "packets": 0, "latencies": []}
+
+    async def fake_send(eio_sid, pkt):
+        counters["packets"] += 1
+
+    sio._send_eio_packet = fake_send
+    real_emit = sio.emit
+
+    async def timed_emit(event, data=None, room=None, **kwargs):
+        counters["emits"] += 1
+        await real_emit(event, data, room=room, **kwargs)
+        recipients = len(list(sio.manager.get_participants("/", room)))
+        now = time.perf_counter()
+        positions = data["positions"] if "positions" in data else [data]
+        counters["latencies"].extend((now - p["_sent"]) * 1000 for p in positions for _ in range(recipients))
+
+    sio.emit = timed_emit
+
+    for i in range(dashboards):
+        sid = await sio.manager.connect(f"eio-{i}", "/")
+        if subscribe:
+            await sio.enter_room(sid, room_for("route", random.randrange(routes)))
+    return sio, counters
+
+
+async def drive(handler, drivers, routes, hz, seconds):
+    interval = 1 / hz
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for bus in range(drivers):
+            await handler({
+                "bus_id": f"BUS_{bus}",
+                "route_id": bus % routes,
+                "lat": 17.4 + random.random() / 100,
+                "lng": 78.4 + random.random() / 100,
+                "_sent": time.perf_counter(),
+            })
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+async def run_before(args):
+    sio, counters = await build_server(args.dashboards, args.routes, subscribe=False)
+
+    async def handler(data):
+        await sio.emit("mobile_location_update", data)
+
+    cpu = time.process_time()
+    await drive(handler, args.drivers, args.routes, args.hz, args.seconds)
+    return counters, time.process_time() - cpu
+
+
+async def run_after(args):
+    sio, counters = await build_server(args.dashboards, args.routes, subscribe=True)
+    broadcaster = LocationBroadcaster(sio, tick_ms=args.tick_ms)
+
+    async def handler(data):
+        broadcaster.push(data)
+
+    cpu = time.process_time()
+    broadcaster.start()
+    await drive(handler, args.drivers, args.routes, args.hz, args.seconds)
+    await broadcaster.stop()
+    return counters, time.process_time() - cpu
+
+
+def report(name, counters, cpu, seconds):
+    lat = counters["latencies"]
+    print(f"{name:>7}: emits/sec={counters['emits'] / seconds:9.1f}  "
+          f"packets/sec={counters['packets'] / seconds:10.1f}  "
+          f"p50={statistics.median(lat) if lat else 0:7.2f}ms  p99={p99(lat):7.2f}ms  "
+          f"cpu={cpu:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=300)
+    parser.add_argument("--dashboards", type=int, default=50)
+    parser.add_argument("--routes", type=int, default=30)
+    parser.add_argument("--hz", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tick-ms", type=int, default=250)
+    args = parser.parse_args()
+    random.seed(7)
+
+    print(f"{args.drivers} drivers @ {args.hz} Hz, {args.dashboards} dashboards, tick={args.tick_ms}ms")
+    report("before", *asyncio.run(run_before(args)), args.seconds)
+    report("after", *asyncio.run(run_after(args)), args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bulk_import.py
+"""
+Student onboarding throughput: one POST /api/transport/students/ per row
+(the only way in before) vs a single CSV or JSON-lines upload to /bulk,
+and re-importing the same roster as an upsert on roll_no.
+
+Runs on a scratch SQLite file through the ASGI app in-process, so it
+measures the handler + DB path, not the network.
+
+    python -m benchmarks.bulk_import --rows 20000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+
+FIELDS = ["name", "roll_no", "parent_contact", "route_id", "rfid_tag", "face_model_ref"]
+
+
+def roster(rows):
+    return [{"name": f"Student {i}", "roll_no": f"R{i:06d}", "parent_contact": "+91-9000000000",
+             "route_id": None, "rfid_tag": f"TAG{i:06d}", "face_model_ref": None} for i in range(rows)]
+
+
+def as_csv(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(records)
+    return out.getvalue().encode()
+
+
+def as_jsonl(records):
+    return "".join(json.dumps(r) + "\n" for r in records).encode()
+
+
+async def run(records, single_rows):
+    import httpx
+    from fastapi import FastAPI
+    from sqlmodel import delete
+
+    import database
+    from models import Student
+    from routers import students
+
+    app = FastAPI()
+    app.include_router(students.router)
+
+    def reset():
+        with database.get_session() as s:
+            s.exec(delete(Student))
+            s.commit()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=None) as client:
+        reset()
+        start = time.perf_counter()
+        for record in records[:single_rows]:
+            r = await client.post("/api/transport/students/", json=record)
+            r.raise_for_status()
+        single = single_rows / (time.perf_counter() - start)
+        print(f"  POST per row        {single:10,.0f} rows/s  ({single_rows:,} rows, "
+              f"{len(records) / single:6.1f}s projected for {len(records):,})")
+
+        for name, body, content_type, query in (
+                ("bulk CSV", as_csv(records), "text/csv", ""),
+                ("bulk JSON-lines", as_jsonl(records), "application/x-ndjson", ""),
+                ("bulk CSV upsert", as_csv(records), "text/csv", "?upsert_on=roll_no"),
+        ):
+            if not query:
+                reset()
+            start = time.perf_counter()
+            r = await client.post(f"/api/transport/students/bulk{query}", content=body,
+                                  headers={"content-type": content_type})
+            elapsed = time.perf_counter() - start
+            report = r.json()
+            print(f"  {name:<19} {len(records) / elapsed:10,.0f} rows/s  ({elapsed:6.2f}s, "
+                  f"inserted {report['inserted']:,}, updated {report['updated']:,}, failed {report['failed']})")
+
+    await database.async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--single-rows", type=int, default=1000, help="rows sent one POST at a time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        import database
+
+        database.init_db()
+        print(f"{args.rows:,} students")
+        asyncio.run(run(roster(args.rows), min(args.single_rows, args.rows)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/chat_cache.py
+"""
+Chat reply cache and DB context on a replayed stream of operator questions.
+
+Questions come from a handful of intents ("which buses are late", "route N
+stops", "any alerts", ...) in varied wording, with popular routes asked
+about more often. Each goes through routers.chat.chat against the fake LLM
+(benchmarks/llm_stub.py, which reports token usage). Reports the cache hit
+rate, LLM tokens saved per request, reply latency on hits vs misses, and
+the size and build time of the context that misses carry.
+
+    python -m benchmarks.chat_cache --requests 1000 --routes 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.llm_stub import create_app
+from benchmarks.osrm_stub import serve_in_thread
+
+INTENTS = [
+    ["Which buses are late?", "which buses are running late", "Any bus delayed right now?", "late buses",
+     "Which bus is late?"],
+    ["What are the stops on route {n}?", "route {n} stops", "Stops for route #{n}", "list the stops of route {n}"],
+    ["Who drives route {n}?", "driver of route {n}", "Who is the driver on route {n}"],
+    ["Any alerts today?", "show alerts", "What alerts are there?", "alerts"],
+    ["Which vehicles are due for service?", "vehicles due service", "Which vehicle is due for a service?"],
+    ["Whose licence is expiring?", "licence expiry", "Which drivers have licences expiring?"],
+]
+
+
+def seed(engine, rng, routes, stops):
+    from sqlalchemy import insert
+    from models import Alert, Driver, Route, Vehicle
+    from utils.route_stops import migrate_route_stops
+
+    with engine.begin() as conn:
+        conn.execute(insert(Vehicle), [{"reg_no": f"TS09-{i:04d}", "capacity": 40,
+                                        "last_service_date": datetime.utcnow() - timedelta(days=rng.randint(0, 300))}
+                                       for i in range(routes)])
+        conn.execute(insert(Driver), [{"name": f"Driver {i}", "phone": None, "license_number": f"DL{i}",
+                                       "training_records": None} for i in range(routes)])
+        conn.execute(insert(Route), [{
+            "name": f"Line {r}", "active": True, "assigned_vehicle_id": r + 1, "assigned_driver_id": r + 1,
+            "stops": json.dumps([{"lat": 17.3 + r * 1e-3 + i * 1e-3, "lon": 78.4, "name": f"Stop {r}-{i}",
+                                  "offset_min": i * 3} for i in range(stops)]),
+        } for r in range(routes)])
+        conn.execute(insert(Alert), [{"alert_type": rng.choice(["service_due", "license_expiry", "bus_stale"]),
+                                      "message": f"Synthetic alert {i}", "meta_info": "{}",
+                                      "created_at": datetime.utcnow() - timedelta(minutes=rng.randint(0, 1400))}
+                                     for i in range(500)])
+    migrate_route_stops(engine)
+
+
+def questions(rng, count, routes):
+    popular = [rng.randint(1, routes) for _ in range(20)]
+    for _ in range(count):
+        intent = rng.choice(INTENTS)
+        # Most route questions are about a few busy routes
+        n = rng.choice(popular) if rng.random() < 0.8 else rng.randint(1, routes)
+        yield rng.choice(intent).format(n=n)
+
+
+async def replay(args, rng):
+    from routers.chat import ChatRequest, chat
+    from utils.chat_context import chat_cache, context_builder
+
+    # Cold vs warm context build
+    start = time.perf_counter()
+    await context_builder.build("route 7 stops and late buses")
+    cold = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    _, warm_tokens = await context_builder.build("route 7 stops and late buses")
+    warm = (time.perf_counter() - start) * 1000
+
+    hit_ms, miss_ms, context_tokens = [], [], []
+    for question in questions(rng, args.requests, args.routes):
+        start = time.perf_counter()
+        resp = await chat(ChatRequest(message=question))
+        elapsed = (time.perf_counter() - start) * 1000
+        if resp.cached:
+            hit_ms.append(elapsed)
+        else:
+            miss_ms.append(elapsed)
+            context_tokens.append(resp.context_tokens)
+    return cold, warm, hit_ms, miss_ms, context_tokens, chat_cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--routes", type=int, default=300)
+    parser.add_argument("--stops", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp, serve_in_thread(create_app(args.latency_ms, 1, 40)) as llm_url:
+        os.environ.update({"DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                           "GROQ_BASE_URL": llm_url, "GROQ_API_KEY": "stub", "USE_MOCK_AI": "false"})
+        import database
+        database.init_db()
+        seed(database.engine, rng, args.routes, args.stops)
+        cold, warm, hit_ms, miss_ms, context_tokens, stats = asyncio.run(replay(args, rng))
+
+    print(f"{args.requests:,} questions over {args.routes} routes; LLM {args.latency_ms:g} ms + 40 tokens")
+    print(f"  hit rate {stats['hit_rate']:.1%}  ({stats['hits']} hits, {stats['misses']} LLM calls)")
+    print(f"  tokens saved {stats['tokens_saved']:,} total, {stats['tokens_saved_per_request']} per request")
+    print(f"  reply latency  hit {statistics.median(hit_ms):7.2f} ms   miss {statistics.median(miss_ms):7.2f} ms (median)")
+    print(f"  context on misses: median {statistics.median(context_tokens)} tokens, max {max(context_tokens)} "
+          f"(budget {os.getenv('CHAT_CONTEXT_TOKENS', '600')}); build cold {cold:.1f} ms, warm {warm:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/chat_load.py
+"""
+Does GPS fan-out keep flowing while chat requests wait on the LLM?
+
+Runs the app (main.socket_app) under uvicorn against the fake LLM in
+benchmarks/llm_stub.py. A driver pings every 50 ms and a fleet dashboard
+records when each bus_locations frame arrives; meanwhile --chats chat
+requests are sent at once. Compared:
+
+  blocking  the previous call_llm_for_chat (sync Groq client inside async def)
+  async     the shared AsyncGroq client
+  stream    the same with "stream": true, timing the first SSE event
+
+    python -m benchmarks.chat_load --chats 8 --latency-ms 500
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+import socketio
+
+from benchmarks.llm_stub import create_app
+from benchmarks.osrm_stub import serve_in_thread
+
+
+def blocking_call_llm_for_chat(base_url):
+    from groq import Groq
+    client = Groq(api_key="stub", base_url=base_url)
+
+    async def call_llm_for_chat(prompt, max_tokens=200):
+        # What ai.call_llm_for_chat did before: a synchronous HTTP call on the event loop
+        resp = client.chat.completions.create(model="stub", messages=[{"role": "user", "content": prompt}],
+                                              max_tokens=max_tokens)
+        return {"text": resp.choices[0].message.content, "raw": None}
+    return call_llm_for_chat
+
+
+async def run_phase(app_url, chats, stream):
+    frames = []
+    dashboard = socketio.AsyncClient()
+    dashboard.on("bus_locations", lambda _: frames.append(time.perf_counter()))
+    await dashboard.connect(app_url, transports=["websocket"])
+    await dashboard.call("subscribe", {})
+    driver = socketio.AsyncClient()
+    await driver.connect(app_url, transports=["websocket"])
+
+    stop = asyncio.Event()
+
+    async def drive():
+        n = 0
+        while not stop.is_set():
+            await driver.emit("mobile_location_update", {"bus_id": "BUS_1", "lat": 17.3 + n * 1e-5, "lng": 78.4})
+            n += 1
+            await asyncio.sleep(0.05)
+
+    async def chat(client, i):
+        start = time.perf_counter()
+        body = {"message": f"where is bus {i}", "stream": stream}
+        if not stream:
+            resp = await client.post("/api/ai/chat", json=body)
+            resp.raise_for_status()
+            return time.perf_counter() - start, time.perf_counter() - start
+        first = None
+        async with client.stream("POST", "/api/ai/chat", json=body) as resp:
+            async for line in resp.aiter_lines():
+                if line.startswith("data:") and first is None:
+                    first = time.perf_counter() - start
+        return first, time.perf_counter() - start
+
+    driving = asyncio.create_task(drive())
+    await asyncio.sleep(1)  # settle: frames flowing before the load
+    async with httpx.AsyncClient(base_url=app_url, timeout=120) as client:
+        load_start = time.perf_counter()
+        results = await asyncio.gather(*(chat(client, i) for i in range(chats)))
+        load_end = time.perf_counter()
+    stop.set()
+    await driving
+    await driver.disconnect()
+    await dashboard.disconnect()
+
+    during = [t for t in frames if load_start <= t <= load_end]
+    edges = [load_start] + during + [load_end]
+    gaps = [b - a for a, b in zip(edges, edges[1:])]
+    return {
+        "wall": load_end - load_start,
+        "first": statistics.median(r[0] for r in results),
+        "done": statistics.median(r[1] for r in results),
+        "frames": len(during) / (load_end - load_start),
+        "max_gap": max(gaps) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=500, help="LLM time to first token")
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            serve_in_thread(create_app(args.latency_ms, args.token_ms, args.tokens)) as llm_url:
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+            "TELEMETRY_DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'telemetry.db')}",
+            "RAZORPAY_KEY_ID": os.getenv("RAZORPAY_KEY_ID", "bench"),
+            "RAZORPAY_KEY_SECRET": os.getenv("RAZORPAY_KEY_SECRET", "bench"),
+            "GROQ_BASE_URL": llm_url, "GROQ_API_KEY": "stub", "USE_MOCK_AI": "false",
+            "BROADCAST_TICK_MS": "100",
+        })
+        with contextlib.redirect_stdout(io.StringIO()):  # the ping handler logs every ping
+            import main as app_main
+        from routers import chat as chat_router
+
+        async_call = chat_router.call_llm_for_chat
+        print(f"{args.chats} concurrent chats, LLM {args.latency_ms:g} ms to first token + "
+              f"{args.tokens} x {args.token_ms:g} ms; broadcast tick 100 ms, ping every 50 ms")
+        with serve_in_thread(app_main.socket_app) as app_url, contextlib.redirect_stdout(io.StringIO()):
+            rows = []
+            for label, call, stream in (("blocking", blocking_call_llm_for_chat(llm_url), False),
+                                        ("async", async_call, False),
+                                        ("stream", async_call, True)):
+                chat_router.call_llm_for_chat = call
+                rows.append((label, asyncio.run(run_phase(app_url, args.chats, stream))))
+        for label, r in rows:
+            print(f"  {label:9s} all chats done in {r['wall']:5.2f}s  median first byte {r['first'] * 1000:6.0f} ms  "
+                  f"median reply {r['done'] * 1000:6.0f} ms  frames {r['frames']:4.1f}/s  "
+                  f"longest frame gap {r['max_gap']:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
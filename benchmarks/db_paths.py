@@ -0,0 +1,121 @@
+# benchmarks/db_paths.py
+"""
+Concurrent list/create load on the CRUD endpoints: the old sync handlers
+(threadpool + per-call Session) vs the async engine with request-scoped
+sessions. Both run against the same scratch SQLite file (WAL pragmas on).
+
+    python -m benchmarks.db_paths --requests 1000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def reset_students(database, rows):
+    # Same starting table for both runs so list payloads are comparable
+    from sqlmodel import delete
+    from models import Student
+
+    with database.get_session() as s:
+        s.exec(delete(Student))
+        s.add_all(Student(name=f"Seed {i}", roll_no=f"S{i}") for i in range(rows))
+        s.commit()
+
+
+def build_sync_app():
+    # The pre-async handlers, kept here only as the comparison baseline
+    from fastapi import FastAPI
+    from sqlmodel import select
+
+    from database import get_session
+    from models import Student
+    from schemas import StudentCreate, StudentRead
+
+    app = FastAPI()
+
+    @app.post("/api/transport/students/", response_model=StudentRead)
+    def create_student(payload: StudentCreate):
+        with get_session() as s:
+            st = Student.model_validate(payload.model_dump())
+            s.add(st); s.commit(); s.refresh(st)
+            return st
+
+    @app.get("/api/transport/students/", response_model=list[StudentRead])
+    def list_students():
+        with get_session() as s:
+            return s.exec(select(Student)).all()
+
+    return app
+
+
+def build_async_app():
+    from fastapi import FastAPI
+    from routers import students
+
+    app = FastAPI()
+    app.include_router(students.router)
+    return app
+
+
+async def drive(app, requests, concurrency, write_ratio):
+    import httpx
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                if i % 100 < write_ratio * 100:
+                    r = await client.post("/api/transport/students/", json={
+                        "name": f"Student {i}", "roll_no": f"R{i}", "parent_contact": None,
+                        "route_id": None, "rfid_tag": None, "face_model_ref": None,
+                    })
+                else:
+                    r = await client.get("/api/transport/students/")
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += r.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    # aiosqlite keeps a worker thread per pooled connection until disposed
+    from database import async_engine
+    await async_engine.dispose()
+    return requests / elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed-rows", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        import database
+
+        database.init_db()
+
+        for name, app in (("sync", build_sync_app()), ("async", build_async_app())):
+            reset_students(database, args.seed_rows)
+            rps, lat, errors = asyncio.run(drive(app, args.requests, args.concurrency, args.write_ratio))
+            print(f"{name:>5}: {rps:8.1f} req/s  p50={pct(lat, 0.5):7.1f}ms  p99={pct(lat, 0.99):7.1f}ms  "
+                  f"errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/eta_replay.py
+"""
+Replays synthetic bus traces through the ETA engine and scores its ETAs.
+
+Each trace drives a bus along a route with varying cruise speed, traffic
+slow-downs and dwell at every stop, pinging every few seconds with GPS noise.
+For every ping the predicted minutes to each remaining stop is compared with
+the true arrival time. The random 10-25 min value the parent endpoint used
+to return is scored as a baseline.
+
+    python -m benchmarks.eta_replay --trips 50 --stops 25
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+from utils.eta import EtaEngine
+from utils.gps_utils import haversine_km
+
+
+def make_route(rng, n_stops):
+    lat, lng = 17.40, 78.40
+    heading = rng.uniform(0, 2 * math.pi)
+    stops = []
+    for i in range(n_stops):
+        stops.append({"name": f"Stop {i}", "lat": lat, "lon": lng})
+        heading += rng.uniform(-0.6, 0.6)
+        step = rng.uniform(0.4, 1.2) / 111.0
+        lat += step * math.cos(heading)
+        lng += step * math.sin(heading)
+    return stops
+
+
+def simulate(rng, stops, ping_every=5.0, noise_m=8.0):
+    """Yield (t, lat, lng, speed) pings and return true arrival time per stop."""
+    pings, arrivals = [], [0.0]
+    t = 0.0
+    cruise = rng.uniform(18, 32)
+    for a, b in zip(stops, stops[1:]):
+        t += rng.uniform(20, 60)  # dwell at stop a
+        leg = haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
+        covered = 0.0
+        while covered < leg:
+            speed = max(3.0, cruise * rng.uniform(0.5, 1.3) * (0.4 if rng.random() < 0.1 else 1.0))
+            step = min(leg - covered, speed * ping_every / 3600)
+            covered += step
+            t += step / speed * 3600
+            f = covered / leg
+            jitter = noise_m / 111_000
+            pings.append((t,
+                          a["lat"] + (b["lat"] - a["lat"]) * f + rng.gauss(0, jitter),
+                          a["lon"] + (b["lon"] - a["lon"]) * f + rng.gauss(0, jitter),
+                          speed))
+        arrivals.append(t)
+    return pings, arrivals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, default=50)
+    parser.add_argument("--stops", type=int, default=25)
+    parser.add_argument("--ping-every", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    errors = {"next stop": [], "last stop": []}
+    baseline = []
+    update_time = 0.0
+    updates = 0
+
+    for trip in range(args.trips):
+        engine = EtaEngine(route_loader=lambda _: None)
+        stops = make_route(rng, args.stops)
+        engine.set_route("BUS", stops)
+        pings, arrivals = simulate(rng, stops, args.ping_every)
+        t0 = time.time()
+
+        for t, lat, lng, speed in pings:
+            start = time.perf_counter()
+            engine.on_ping("BUS", lat, lng, ts=t0 + t, speed_kmph=speed)
+            update_time += time.perf_counter() - start
+            updates += 1
+
+            state = engine.get("BUS")
+            if not state.etas:
+                continue
+            next_true = (arrivals[state.next_stop] - t) / 60
+            last_true = (arrivals[-1] - t) / 60
+            if next_true >= 0:
+                errors["next stop"].append(abs(state.etas[0] - next_true))
+            errors["last stop"].append(abs(state.etas[-1] - last_true))
+            baseline.append(abs(rng.randint(10, 25) - last_true))
+
+    print(f"{args.trips} trips, {updates} pings, {args.stops} stops/route")
+    for name, errs in errors.items():
+        errs.sort()
+        print(f"  ETA to {name:<9}: MAE {statistics.mean(errs):5.2f} min  "
+              f"p90 {errs[int(len(errs) * 0.9)]:5.2f} min")
+    print(f"  random 10-25 min : MAE {statistics.mean(baseline):5.2f} min (old endpoint, last stop)")
+    print(f"  per-ping update  : {update_time / updates * 1e6:.1f} us")
+
+    # Parent endpoint read path
+    start = time.perf_counter()
+    for _ in range(100_000):
+        engine.eta_minutes("BUS")
+    print(f"  eta lookup       : {(time.perf_counter() - start) / 100_000 * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
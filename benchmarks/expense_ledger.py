@@ -0,0 +1,141 @@
+# benchmarks/expense_ledger.py
+"""
+Expense ledger at 1M rows: listing and aggregates in SQL vs the old
+in-memory list.
+
+The finance router used to keep every expense in a Python list and return
+all of it; totals would have meant looping over that list. This seeds a
+scratch SQLite DB and compares:
+
+1. Listing: serializing the whole ledger vs one keyset page (first and
+   deep), optionally filtered to one vehicle.
+2. Totals per vehicle / category / month, all time and for one month:
+   looping over the in-memory list vs expense_totals (one GROUP BY over
+   a covering index).
+
+    python -m benchmarks.expense_ledger --rows 1000000 --vehicles 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+CATEGORIES = ["Fuel", "Maintenance", "Tyres", "Insurance", "Tolls", "Permits", "Cleaning", "Other"]
+
+
+def seed(engine, rng, rows, vehicles, first_day, days, chunk=50_000):
+    from sqlalchemy import insert
+    from models import Expense
+
+    numbers = [f"TS09{chr(65 + i // 1000 % 26)}{i:04d}" for i in range(vehicles)]
+    for start in range(0, rows, chunk):
+        with engine.begin() as conn:
+            conn.execute(insert(Expense), [{
+                "vehicle_number": rng.choice(numbers), "category": rng.choice(CATEGORIES),
+                "amount": round(rng.uniform(100, 20000), 2),
+                "spent_on": first_day + timedelta(days=rng.randrange(days)), "notes": None,
+            } for _ in range(min(chunk, rows - start))])
+    return numbers
+
+
+def python_totals(expenses, group_by, start=None, end=None):
+    # What the in-memory list allowed: walk every expense on each request
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+    for e in expenses:
+        if (start and e.spent_on < start) or (end and e.spent_on > end):
+            continue
+        key = {"vehicle": e.vehicleNumber, "category": e.category, "month": e.spent_on.isoformat()[:7]}[group_by]
+        totals[key] += e.amount
+        counts[key] += 1
+    return totals, counts
+
+
+def page(engine, limit, cursor=None, vehicle=None):
+    from sqlalchemy import select
+    from models import Expense
+    from utils.expense_ledger import expense_filters
+    from utils.pagination import encode_cursor, keyset
+
+    stmt = keyset(select(Expense).where(*expense_filters(vehicle=vehicle)),
+                  [Expense.spent_on, Expense.id], cursor, descending=True).limit(limit)
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    return rows, encode_cursor([rows[-1].spent_on, rows[-1].id])
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+    rng = random.Random(20)
+    first_day = date(2024, 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        import database
+        from pydantic import TypeAdapter
+        from sqlalchemy import select, text
+        from models import Expense
+        from routers.finance import ExpenseOut, _out
+        from utils.expense_ledger import expense_totals
+
+        database.init_db()
+        engine = database.engine
+        t = time.perf_counter()
+        numbers = seed(engine, rng, args.rows, args.vehicles, first_day, args.days)
+        print(f"{args.rows:,} expenses, {args.vehicles:,} vehicles, {args.days} days; "
+              f"seeded in {time.perf_counter() - t:.1f} s")
+
+        print("listing")
+        with engine.connect() as conn:
+            everything = [_out(row) for row in conn.execute(select(Expense)).all()]
+        adapter = TypeAdapter(list[ExpenseOut])
+        body, ms = timed(adapter.dump_json, everything, by_alias=True)
+        print(f"  whole ledger as JSON      {ms:9.1f} ms  {len(body) / 1e6:6.1f} MB (old GET, from memory)")
+        del body
+        (rows, cursor), ms = timed(page, engine, 100, repeat=20)
+        print(f"  first page of 100         {ms:9.2f} ms")
+        for _ in range(50):
+            rows, cursor = page(engine, 100, cursor)
+        _, ms = timed(page, engine, 100, cursor, repeat=20)
+        print(f"  page 52 of 100            {ms:9.2f} ms")
+        _, ms = timed(page, engine, 100, vehicle=numbers[7], repeat=20)
+        print(f"  one vehicle, first page   {ms:9.2f} ms")
+
+        month = (date(2025, 6, 1), date(2025, 6, 30))
+        print("totals (python loop over the in-memory list vs SQL)")
+        for group_by in ("vehicle", "category", "month"):
+            for label, window in (("all time", (None, None)), ("one month", month)):
+                (py_totals, _), py_ms = timed(python_totals, everything, group_by, *window)
+                sql, sql_ms = timed(expense_totals, group_by, *window, repeat=3)
+                assert len(sql["groups"]) == len(py_totals)
+                assert abs(sql["total"] - sum(py_totals.values())) < 1
+                print(f"  by {group_by:8s} {label:9s}  python loop {py_ms:8.1f} ms   "
+                      f"GROUP BY {sql_ms:7.1f} ms  ({len(sql['groups'])} groups, {sql['count']:,} rows)")
+        _, ms = timed(expense_totals, "category", vehicle=numbers[7], repeat=20)
+        print(f"  one vehicle by category            GROUP BY {ms:7.2f} ms")
+
+        with engine.connect() as conn:
+            print("query plans")
+            for group_by in ("vehicle", "category"):
+                column = "vehicle_number" if group_by == "vehicle" else group_by
+                plan = conn.execute(text(f"EXPLAIN QUERY PLAN SELECT {column}, sum(amount), count(*) "
+                                         f"FROM expense GROUP BY {column}")).all()
+                print(f"  by {group_by:8s}: " + "; ".join(row[-1] for row in plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# benchmarks/fleet_rollups.py
+"""
+Lead-summary KPIs from per bus / route / day rollups vs recomputing them
+from the raw ping history.
+
+Simulates a month of service for N buses: each bus runs its route out in
+the morning and back in the afternoon at a speed that varies per day,
+pinging every --interval seconds. Pings go through the ETA engine (which
+reports stop arrivals and delays) into the rollups, and are also written
+raw to a scratch telemetry DB. Reports the per-ping rollup cost, then the
+month summary read from the rollups vs a full scan of the raw pings.
+
+    python -m benchmarks.fleet_rollups --buses 500 --days 30 --interval 60
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from utils.eta import EtaEngine
+from utils.fleet_rollups import FleetRollups
+from utils.gps_utils import haversine_km
+from utils.telemetry import TelemetryStore, create_telemetry_engine
+
+SCHEDULE_KMPH = 22.0
+
+
+def make_route(rng, n_stops):
+    lat, lng = 17.3 + rng.random() * 0.2, 78.3 + rng.random() * 0.2
+    heading = rng.uniform(0, 2 * math.pi)
+    stops, km = [], 0.0
+    for i in range(n_stops):
+        if stops:
+            km += haversine_km(stops[-1]["lat"], stops[-1]["lon"], lat, lng)
+        stops.append({"name": f"Stop {i}", "lat": lat, "lon": lng, "offset_min": km / SCHEDULE_KMPH * 60})
+        heading += rng.uniform(-0.5, 0.5)
+        step = rng.uniform(0.8, 1.5) / 111.0
+        lat += step * math.cos(heading)
+        lng += step * math.sin(heading)
+    return stops
+
+
+def reverse(stops):
+    total = stops[-1]["offset_min"]
+    return [{**s, "offset_min": total - s["offset_min"]} for s in reversed(stops)]
+
+
+def trip(stops, start_ts, kmph, interval):
+    """(ts, lat, lng) pings along the stops at a constant speed, ending on the last stop."""
+    legs = [haversine_km(a["lat"], a["lon"], b["lat"], b["lon"]) for a, b in zip(stops, stops[1:])]
+    duration = sum(legs) / kmph * 3600
+    t = 0.0
+    while True:
+        km = min(t, duration) / 3600 * kmph
+        i = 0
+        while i < len(legs) - 1 and km > legs[i]:
+            km -= legs[i]
+            i += 1
+        f = min(km / legs[i], 1.0) if legs[i] else 1.0
+        a, b = stops[i], stops[i + 1]
+        yield start_ts + t, a["lat"] + (b["lat"] - a["lat"]) * f, a["lon"] + (b["lon"] - a["lon"]) * f
+        if t >= duration:
+            return
+        t = min(t + interval, duration)
+
+
+def simulate(store, rollups, rng, args, first_day):
+    n_routes = max(1, args.buses // args.buses_per_route)
+    routes = {}
+    for r in range(1, n_routes + 1):
+        out = make_route(rng, args.stops)
+        routes[r], routes[r + n_routes] = out, reverse(out)
+    eta = EtaEngine(route_loader=routes.get)
+    for route_id, stops in routes.items():
+        eta.set_route(f"preload-{route_id}", stops, route_id=route_id)
+    eta.on_arrival(rollups.record_arrival)
+
+    pings = 0
+    eta_time = rollup_time = write_time = flush_time = 0.0
+    for d in range(args.days):
+        day_start = datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc).timestamp() \
+            + d * 86400
+        raw = []
+        for bus in range(args.buses):
+            bus_id = f"BUS_{bus}"
+            route_id = bus % n_routes + 1
+            # Slow days run late: scheduled at 22 km/h, driven at 16-26 km/h
+            kmph = SCHEDULE_KMPH * rng.uniform(0.75, 1.15)
+            depart = day_start + 7 * 3600 + rng.uniform(0, 1800)
+            ping_stream = list(trip(routes[route_id], depart, kmph, args.interval))
+            back = ping_stream[-1][0] + 8 * 3600 + rng.uniform(0, 600)
+            ping_stream += trip(routes[route_id + n_routes], back, kmph, args.interval)
+            trip_route = route_id
+            for ts, lat, lng in ping_stream:
+                if ts >= back:
+                    trip_route = route_id + n_routes
+                t0 = time.perf_counter()
+                state = eta.on_ping(bus_id, lat, lng, ts=ts, route_id=trip_route)
+                t1 = time.perf_counter()
+                rollups.record_ping(bus_id, lat, lng, state.ts, state.route_id)
+                t2 = time.perf_counter()
+                eta_time += t1 - t0
+                rollup_time += t2 - t1
+                raw.append({"bus_id": bus_id, "ts": ts, "lat": lat, "lng": lng, "speed": kmph, "heading": None})
+            pings += len(ping_stream)
+        t = time.perf_counter()
+        store.write(raw)
+        t1 = time.perf_counter()
+        asyncio.run(rollups.flush())
+        write_time += t1 - t
+        flush_time += time.perf_counter() - t1
+    return pings, eta_time, rollup_time, write_time, flush_time
+
+
+def raw_summary(rollups, store, start_day, end_day):
+    """What lead-summary would have to do without rollups: fold every raw ping in the window."""
+    start = datetime(start_day.year, start_day.month, start_day.day, tzinfo=timezone.utc).timestamp()
+    end = datetime(end_day.year, end_day.month, end_day.day, tzinfo=timezone.utc).timestamp() + 86400 - 1e-6
+    deltas = rollups.scan_raw(store, start, end)
+    buses = {bus_id for _, bus_id, _ in deltas}
+    return {"buses": len(buses), "pings": sum(d["pings"] for d in deltas.values()),
+            "distance_km": round(sum(d["distance_km"] for d in deltas.values()), 2),
+            "active_hours": round(sum(d["active_s"] for d in deltas.values()) / 3600, 2)}
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=60)
+    parser.add_argument("--stops", type=int, default=15)
+    parser.add_argument("--buses-per-route", type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(19)
+    first_day = date(2026, 9, 1)
+    last_day = first_day + timedelta(days=args.days - 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_telemetry_engine(f"sqlite:///{os.path.join(tmp, 'telemetry.db')}")
+        store = TelemetryStore(engine)
+        rollups = FleetRollups(engine=engine)
+
+        pings, eta_time, rollup_time, write_time, flush_time = simulate(store, rollups, rng, args, first_day)
+        print(f"{args.buses} buses, {args.days} days, {pings:,} pings, {rollups.stats['arrivals']:,} stop arrivals")
+        print(f"  ingest   : ETA engine {eta_time / pings * 1e6:5.2f} us/ping, rollups {rollup_time / pings * 1e6:5.2f}"
+              f" us/ping; raw writes {write_time:6.1f} s, rollup flushes {flush_time * 1000:6.1f} ms "
+              f"({rollups.stats['rows_upserted']:,} rows)")
+
+        print(f"  month summary ({first_day} .. {last_day})")
+        raw, raw_ms = timed(raw_summary, rollups, store, first_day, last_day)
+        print(f"    raw ping scan      {raw_ms:10.1f} ms  distance {raw['distance_km']:,.1f} km, "
+              f"active {raw['active_hours']:,.1f} h, {raw['buses']} buses")
+        for group_by in ("none", "route", "bus", "day"):
+            summary, ms = timed(rollups.summary, first_day, last_day, group_by, repeat=5)
+            print(f"    rollups, by {group_by:5s}  {ms:10.2f} ms  distance {summary['distance_km']:,.1f} km, "
+                  f"active {summary['active_hours']:,.1f} h, {summary['buses']} buses, "
+                  f"on time {summary['on_time_pct']}%, avg delay {summary['avg_delay_min']} min, "
+                  f"utilization {summary['utilization_pct']}%, {len(summary['groups'])} groups")
+        summary, ms = timed(rollups.summary, first_day, last_day, "day", route_id=1, repeat=5)
+        print(f"    rollups, route 1   {ms:10.2f} ms  on time {summary['on_time_pct']}%, "
+              f"avg delay {summary['avg_delay_min']} min")
+
+        # Rollups rebuilt from raw history (e.g. after enabling them on an existing DB)
+        fresh = FleetRollups(engine=create_telemetry_engine(f"sqlite:///{os.path.join(tmp, 'backfill.db')}"))
+        written, ms = timed(fresh.backfill, store, first_day, last_day)
+        again, again_ms = timed(fresh.backfill, store, first_day, last_day)
+        print(f"  backfill : {written:,} rows in {ms / 1000:.1f} s, rerun {again} rows in {again_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
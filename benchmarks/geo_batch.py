@@ -0,0 +1,69 @@
+# benchmarks/geo_batch.py
+"""
+Scalar haversine_km loop vs the NumPy batch functions in utils.geo_batch.
+
+    python -m benchmarks.geo_batch --sizes 1000 10000 100000
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from utils.geo_batch import haversine_matrix, haversine_one_to_many, haversine_pairwise
+from utils.gps_utils import haversine_km
+
+
+def best_of(fn, repeat=3):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'n':>8} {'case':>12} {'scalar ms':>11} {'f64 ms':>9} {'f32 ms':>9} {'x f64':>7} {'x f32':>7} {'max err m':>10}")
+    for n in args.sizes:
+        lats1 = [rng.uniform(17.2, 17.6) for _ in range(n)]
+        lons1 = [rng.uniform(78.2, 78.7) for _ in range(n)]
+        lats2 = [rng.uniform(17.2, 17.6) for _ in range(n)]
+        lons2 = [rng.uniform(78.2, 78.7) for _ in range(n)]
+        a1, o1, a2, o2 = map(np.array, (lats1, lons1, lats2, lons2))
+
+        # Matrix side chosen so the matrix holds ~n cells
+        side = max(1, int(math.sqrt(n)))
+        cases = {
+            "pairwise": (
+                lambda: [haversine_km(*p) for p in zip(lats1, lons1, lats2, lons2)],
+                lambda dt: haversine_pairwise(a1, o1, a2, o2, dtype=dt),
+            ),
+            "one-to-many": (
+                lambda: [haversine_km(lats1[0], lons1[0], la, lo) for la, lo in zip(lats2, lons2)],
+                lambda dt: haversine_one_to_many(lats1[0], lons1[0], a2, o2, dtype=dt),
+            ),
+            f"matrix {side}x{side}": (
+                lambda: [[haversine_km(la, lo, lb, lob) for lb, lob in zip(lats2[:side], lons2[:side])]
+                         for la, lo in zip(lats1[:side], lons1[:side])],
+                lambda dt: haversine_matrix(a1[:side], o1[:side], a2[:side], o2[:side], dtype=dt),
+            ),
+        }
+        for name, (scalar, batch) in cases.items():
+            expected = np.array(scalar(), dtype=np.float64)
+            err = np.abs(batch(np.float32).astype(np.float64) - expected).max() * 1000
+            t_scalar = best_of(scalar, repeat=1 if n >= 100_000 else 3)
+            t64 = best_of(lambda: batch(np.float64))
+            t32 = best_of(lambda: batch(np.float32))
+            print(f"{n:>8} {name:>12} {t_scalar * 1000:>11.2f} {t64 * 1000:>9.3f} {t32 * 1000:>9.3f} "
+                  f"{t_scalar / t64:>7.1f} {t_scalar / t32:>7.1f} {err:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/import_time.py
+"""
+Cold-start import budget for the app (what a serverless cold start pays
+before the first request).
+
+Imports main in fresh interpreters under `python -X importtime`, reports
+the median cumulative import time and main's heaviest direct imports, and
+exits non-zero when the median is over budget or when an integration that
+should load on demand (LLM SDK, HTTP clients, ...) was imported. Payment
+keys are left unset: the app has to start without them.
+
+    python -m benchmarks.import_time --runs 5 --budget-ms 1800
+    IMPORT_BUDGET_MS=1500 python -m benchmarks.import_time
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Loaded on first use only; any of these at import time is a regression
+LAZY_MODULES = ("groq", "httpx", "langchain", "langgraph", "twilio", "razorpay")
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1800"))
+
+PROBE = "import sys, main; print(' '.join(m for m in {lazy!r} if m in sys.modules))"
+
+
+def parse_importtime(stderr: str):
+    """[(depth, name, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def direct_imports(rows, module="main"):
+    """Modules imported by `module` itself, with their cumulative time.
+
+    importtime prints children before their parent, so they are the rows
+    one level deeper than `module`, since the previous row at its level.
+    """
+    end = next(i for i, row in enumerate(rows) if row[1] == module)
+    depth = rows[end][0]
+    start = end
+    while start > 0 and rows[start - 1][0] > depth:
+        start -= 1
+    return [(name, cumulative) for d, name, _, cumulative in rows[start:end] if d == depth + 1]
+
+
+def measure(env):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(lazy=LAZY_MODULES)],
+                          capture_output=True, text=True, env=env, cwd=os.getcwd())
+    if proc.returncode:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    total_us = next(cumulative for _, name, _, cumulative in rows if name == "main")
+    return total_us / 1000, direct_imports(rows), proc.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {k: v for k, v in os.environ.items()
+               if not k.startswith("RAZORPAY_") and k != "PYTHONDONTWRITEBYTECODE"}
+        env.update({"DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+                    "TELEMETRY_DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'telemetry.db')}"})
+        measure(env)  # warm the bytecode cache; a deploy ships compiled .pyc too
+        runs = [measure(env) for _ in range(args.runs)]
+
+    runs.sort(key=lambda run: run[0])
+    totals = [total for total, _, _ in runs]
+    median = statistics.median(totals)
+    _, children, loaded = runs[len(runs) // 2]
+    print(f"import main: median {median:,.0f} ms over {args.runs} runs "
+          f"(min {totals[0]:,.0f}, max {totals[-1]:,.0f}), budget {args.budget_ms:,.0f} ms")
+    print("heaviest direct imports of main (cumulative):")
+    for name, cumulative in sorted(children, key=lambda c: -c[1])[:args.top]:
+        print(f"  {cumulative / 1000:8,.1f} ms  {name}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"import time {median:,.0f} ms is over the {args.budget_ms:,.0f} ms budget")
+    if loaded:
+        failures.append(f"loaded at import, should load on first use: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
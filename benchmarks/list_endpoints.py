@@ -0,0 +1,131 @@
+# benchmarks/list_endpoints.py
+"""
+Time-to-first-byte, total time and peak Python memory of the students list
+endpoint on a large table: the old unpaginated list vs one keyset page vs
+the NDJSON stream of every row, plus a deep page (cursor near the end).
+
+The ASGI app is called directly so the first body chunk can be timed; peak
+memory comes from a second, tracemalloc-instrumented pass.
+
+    python -m benchmarks.list_endpoints --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def seed(database, rows):
+    from sqlalchemy import insert
+    from models import Route, Student
+
+    with database.engine.begin() as conn:
+        conn.execute(insert(Route), [{"name": f"R{r}", "stops": "[]", "active": True} for r in range(50)])
+        conn.execute(insert(Student), [
+            {"name": f"Student {i}", "roll_no": f"R{i:06d}", "parent_contact": "+91-9000000000",
+             "route_id": i % 50 + 1, "rfid_tag": f"TAG{i}", "face_model_ref": None}
+            for i in range(rows)
+        ])
+
+
+def build_old_app():
+    # The pre-pagination handler: whole table, one response
+    from fastapi import Depends, FastAPI
+    from sqlmodel import select
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from database import get_async_session
+    from models import Student
+    from schemas import StudentRead
+
+    app = FastAPI()
+
+    @app.get("/api/transport/students/", response_model=list[StudentRead])
+    async def list_students(s: AsyncSession = Depends(get_async_session)):
+        return (await s.exec(select(Student))).all()
+
+    return app
+
+
+async def call(app, query: str):
+    """Run one GET through the ASGI app; returns (ttfb, total, bytes)."""
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/api/transport/students/", "raw_path": b"/api/transport/students/",
+             "query_string": query.encode(), "headers": [(b"host", b"bench")], "server": ("bench", 80),
+             "client": ("127.0.0.1", 1), "root_path": ""}
+    first = None
+    size = 0
+    start = time.perf_counter()
+
+    requested = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Streaming responses listen for a disconnect; only send it once the app is finished
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(message["body"])
+
+    await app(scope, receive, send)
+    done.set()
+    return first or 0.0, time.perf_counter() - start, size
+
+
+async def run(cases, rows):
+    from database import async_engine
+
+    print(f"{rows:,} students")
+    for name, app, query in cases:
+        ttfb, total, size = await call(app, query)
+        tracemalloc.start()
+        await call(app, query)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {name:<20} ttfb {ttfb * 1000:8.1f} ms  total {total * 1000:8.1f} ms  "
+              f"{size / 1e6:7.2f} MB sent  peak {peak / 1e6:7.1f} MB")
+    # Pooled aiosqlite connections belong to this loop
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        import database
+        from fastapi import FastAPI
+        from routers import students
+        from utils.pagination import encode_cursor
+
+        database.init_db()
+        seed(database, args.rows)
+        new_app = FastAPI()
+        new_app.include_router(students.router)
+
+        cases = [
+            ("old: whole table", build_old_app(), ""),
+            ("page (limit=100)", new_app, "limit=100"),
+            ("deep page", new_app, f"limit=100&cursor={encode_cursor([args.rows - 100])}"),
+            ("page, route filter", new_app, "limit=100&route_id=7"),
+            ("ndjson, all rows", new_app, "format=ndjson"),
+        ]
+        asyncio.run(run(cases, args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/llm_stub.py
+"""
+Local stand-in for the Groq chat completions API (OpenAI-compatible), so chat
+can be exercised without an API key or network.
+
+Answers POST /openai/v1/chat/completions, plain or with "stream": true
+(Server-Sent Events), after a fixed time to first token and then one token
+every --token-ms. Point the app at it with GROQ_BASE_URL:
+
+    python -m benchmarks.llm_stub --port 5056 --latency-ms 800
+    GROQ_BASE_URL=http://127.0.0.1:5056 GROQ_API_KEY=x USE_MOCK_AI=false python main.py
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def create_app(latency_ms: float = 800, token_ms: float = 20, tokens: int = 40) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    def reply_tokens(body):
+        prompt = body["messages"][-1]["content"]
+        words = (f"Answer to: {prompt.split()[-2] if len(prompt.split()) > 1 else prompt} " * tokens).split()
+        return [w + " " for w in words[:min(tokens, body.get("max_tokens") or tokens)]]
+
+    def envelope(kind, model, choice):
+        return {"id": "chatcmpl-stub", "object": kind, "created": int(time.time()), "model": model,
+                "choices": [choice]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def completions(request: Request):
+        app.state.calls += 1
+        body = await request.json()
+        model = body.get("model", "stub")
+        words = reply_tokens(body)
+        await asyncio.sleep(latency_ms / 1000)
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(words) * token_ms / 1000)
+            completion = envelope("chat.completion", model, {
+                "index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "".join(words)},
+            })
+            prompt_tokens = len(body["messages"][-1]["content"]) // 4
+            completion["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                                   "total_tokens": prompt_tokens + len(words)}
+            return completion
+
+        async def events():
+            for word in words:
+                chunk = envelope("chat.completion.chunk", model,
+                                 {"index": 0, "delta": {"content": word}, "finish_reason": None})
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_ms / 1000)
+            yield f"data: {json.dumps(envelope('chat.completion.chunk', model, {'index': 0, 'delta': {}, 'finish_reason': 'stop'}))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=40)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.token_ms, args.tokens), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/metrics_overhead.py
+"""
+What observability costs on the hot paths.
+
+1. Per ping: the old debug print (to a block-buffered file, and line-
+   buffered as under PYTHONUNBUFFERED or a terminal) vs a suppressed
+   log.debug, a histogram observe and the timed_event wrapper, next to the
+   full mobile_location_update handler for scale.
+2. Per HTTP request: the RequestMetrics middleware around a no-op app.
+3. Per scrape: rendering /metrics with a realistic number of series.
+
+    python -m benchmarks.metrics_overhead --pings 50000 --requests 50000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+
+def per_call_us(fn, n, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+async def per_call_async_us(fn, n, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            await fn()
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+def ping(i):
+    return {"bus_id": f"BUS{i % 2000:04d}", "lat": 12.9 + (i % 100) * 1e-4, "lng": 77.6, "speed": 24.0,
+            "heading": 90, "route_id": i % 50}
+
+
+async def hot_path(args):
+    from utils.metrics import Histogram, timed_event
+
+    data = ping(7)
+    results = {}
+    with open(os.devnull, "w") as buffered, open(os.devnull, "w", buffering=1) as line_buffered:
+        results["print, block-buffered stdout"] = per_call_us(
+            lambda: print(f"Received location from mobile: {data}", file=buffered), args.pings)
+        results["print, line-buffered stdout"] = per_call_us(
+            lambda: print(f"Received location from mobile: {data}", file=line_buffered), args.pings)
+
+    log = logging.getLogger("bench.transport")
+    log.setLevel(logging.INFO)
+    results["log.debug below LOG_LEVEL"] = per_call_us(
+        lambda: log.debug("Received location from mobile: %s", data), args.pings)
+
+    histogram = Histogram("bench", "bench", ("event",))
+    results["histogram observe"] = per_call_us(lambda: histogram.observe(0.0004, "mobile_location_update"),
+                                               args.pings)
+
+    async def handler(sid, data):
+        return None
+
+    wrapped = timed_event(handler)
+    bare = await per_call_async_us(lambda: handler("sid", data), args.pings)
+    results["timed_event wrapper"] = await per_call_async_us(lambda: wrapped("sid", data), args.pings) - bare
+
+    import main
+
+    pings = [ping(i) for i in range(args.pings)]
+    start = time.perf_counter()
+    for p in pings:
+        await main.mobile_location_update("sid", p)
+    results["whole ping handler (for scale)"] = (time.perf_counter() - start) / len(pings) * 1e6
+
+    print(f"per ping ({args.pings:,} calls, best of 5):")
+    for label, us in results.items():
+        print(f"  {label:32s} {us:7.2f} us")
+
+
+async def http_overhead(args):
+    # Around a no-op ASGI app: end-to-end request timings vary by more than the middleware costs
+    from utils.metrics import RequestMetrics
+
+    class Route:
+        path = "/api/transport/items/{item_id}"
+
+    async def endpoint(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    def call(app):
+        return lambda: app({"type": "http", "method": "GET", "path": "/api/transport/items/1"}, receive, send)
+
+    bare = await per_call_async_us(call(endpoint), args.requests)
+    wrapped = await per_call_async_us(call(RequestMetrics(endpoint)), args.requests)
+    print(f"per HTTP request ({args.requests:,} calls, best of 5):")
+    print(f"  {'RequestMetrics middleware':32s} {wrapped - bare:7.2f} us")
+
+
+def render_cost(args):
+    from utils.metrics import Registry
+
+    registry = Registry()
+    http = registry.histogram("http_request_duration_seconds", "", ("method", "route", "status"))
+    events = registry.histogram("sio_event_duration_seconds", "", ("event",))
+    db = registry.histogram("db_query_duration_seconds", "", ("db", "statement"))
+    for i in range(args.routes):
+        for status in ("200", "404", "500"):
+            http.observe(0.003, "GET", f"/api/transport/r{i}/{{id}}", status)
+    for event in ("mobile_location_update", "subscribe", "unsubscribe", "parent_subscribe", "disconnect"):
+        events.observe(0.0002, event)
+    for statement in ("select", "insert", "update", "delete", "begin", "commit"):
+        db.observe(0.001, "app", statement)
+    for name in ("broadcast", "telemetry", "rollups", "osrm"):
+        registry.stats(name, lambda: {f"c{k}": k for k in range(6)})
+    text = registry.render()
+    us = per_call_us(registry.render, 20)
+    print(f"per scrape: {len(text.splitlines()):,} lines, {len(text) / 1024:,.0f} KiB, {us / 1000:.2f} ms to render")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pings", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--routes", type=int, default=80, help="route templates with series in the scrape")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        os.environ.setdefault("TELEMETRY_DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'telemetry.db')}")
+        asyncio.run(hot_path(args))
+        asyncio.run(http_overhead(args))
+        render_cost(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/multi_worker.py
+"""
+Several uvicorn workers sharing one message queue and live-state store.
+
+Starts the RESP stub (benchmarks.resp_stub) and N separate `main:socket_app`
+processes pointed at it, then:
+
+  1. cross-worker delivery: drivers ping worker 0 while a fleet dashboard
+     listens on the last worker, which must see every bus; the last worker's
+     /fleet/nearby and /trip/states must list them too (via the shared live state).
+  2. ingest throughput: drivers spread round-robin over the workers ping as
+     fast as they can; the pings each worker recorded are summed.
+
+    python -m benchmarks.multi_worker --workers 1 2 --drivers 40 --seconds 5
+
+Throughput only scales with cores: on a single-CPU box the workers (and the
+load generator) share one core, so expect flat numbers there.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import socketio
+
+from benchmarks.osrm_stub import free_port
+from benchmarks.resp_stub import serve_in_thread
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+@contextlib.contextmanager
+def workers(count, redis_url, tmp):
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'app.db')}",
+        "TELEMETRY_DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'telemetry.db')}",
+        "RAZORPAY_KEY_ID": os.getenv("RAZORPAY_KEY_ID", "bench"),
+        "RAZORPAY_KEY_SECRET": os.getenv("RAZORPAY_KEY_SECRET", "bench"),
+        "SIO_MESSAGE_QUEUE": redis_url,
+        "LIVE_STATE_URL": redis_url,
+        "LIVE_STATE_SYNC_MS": "200",
+    }
+    procs, urls = [], []
+    try:
+        # One at a time so they don't race each other creating tables
+        for _ in range(count):
+            port = free_port()
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:socket_app", "--port", str(port), "--log-level", "warning"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+            ))
+            url = f"http://127.0.0.1:{port}"
+            deadline = time.time() + 30
+            while True:
+                try:
+                    get_json(url + "/")
+                    break
+                except OSError:
+                    if procs[-1].poll() is not None or time.time() > deadline:
+                        raise RuntimeError(f"worker on port {port} did not start")
+                    time.sleep(0.2)
+            urls.append(url)
+        yield urls
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+
+
+async def connect(url):
+    client = socketio.AsyncClient()
+    await client.connect(url, transports=["websocket"])
+    return client
+
+
+def ping(bus, n=0):
+    return {"bus_id": f"BUS_{bus}", "lat": 17.3 + bus * 0.001 + n * 1e-6, "lng": 78.4 + bus * 0.001}
+
+
+async def cross_worker(urls, buses):
+    dashboard = await connect(urls[-1])
+    seen = set()
+    dashboard.on("bus_locations", lambda frame: seen.update(p["bus_id"] for p in frame["positions"]))
+    await dashboard.call("subscribe", {})
+
+    drivers = [await connect(urls[0]) for _ in range(buses)]
+    deadline = time.time() + 10
+    while time.time() < deadline and len(seen) < buses:
+        for bus, client in enumerate(drivers):
+            await client.emit("mobile_location_update", ping(bus))
+        await asyncio.sleep(0.25)
+
+    near = await asyncio.to_thread(get_json, f"{urls[-1]}/api/transport/fleet/nearby?lat=17.3&lng=78.4&k={buses}")
+    states = await asyncio.to_thread(get_json, f"{urls[-1]}/api/transport/trip/states")
+    for client in drivers + [dashboard]:
+        await client.disconnect()
+    return len(seen), len(near["buses"]), len(states["trips"])
+
+
+async def throughput(urls, drivers, seconds):
+    clients = [await connect(urls[i % len(urls)]) for i in range(drivers)]
+    before = [await asyncio.to_thread(get_json, u + "/api/transport/telemetry/stats") for u in urls]
+    stop = time.perf_counter() + seconds
+
+    async def drive(bus, client):
+        n = 0
+        while time.perf_counter() < stop:
+            # An acked event per ping keeps the client from running ahead of the server
+            await client.call("mobile_location_update", ping(bus, n))
+            n += 1
+
+    await asyncio.gather(*(drive(bus, c) for bus, c in enumerate(clients)))
+    after = [await asyncio.to_thread(get_json, u + "/api/transport/telemetry/stats") for u in urls]
+    for client in clients:
+        await client.disconnect()
+    return sum(a["recorded"] - b["recorded"] for a, b in zip(after, before)) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--drivers", type=int, default=40)
+    parser.add_argument("--buses", type=int, default=20, help="buses in the cross-worker check")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPU(s)")
+
+    with serve_in_thread() as (redis_url, stub):
+        with tempfile.TemporaryDirectory() as tmp, workers(2, redis_url, tmp) as urls:
+            dashboard_saw, nearby, trips = asyncio.run(cross_worker(urls, args.buses))
+        print(f"cross-worker: {args.buses} buses on worker 0; dashboard on worker 1 saw {dashboard_saw}, "
+              f"its /fleet/nearby lists {nearby}, its /trip/states lists {trips}")
+
+        for count in args.workers:
+            with tempfile.TemporaryDirectory() as tmp, workers(count, redis_url, tmp) as urls:
+                rate = asyncio.run(throughput(urls, args.drivers, args.seconds))
+            print(f"  {count} worker(s)  {args.drivers} drivers  {rate:9,.0f} pings/s")
+        print(f"RESP stub: {stub.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/osrm_cache.py
+"""
+OSRM route requests against a local stub: old per-request AsyncClient with no
+caching vs the shared pooled OsrmClient with route cache and request collapsing.
+
+Legs are drawn from a fixed set of stop pairs with a skewed distribution, the
+way buses repeat the same stop-to-stop legs all day.
+
+    python -m benchmarks.osrm_cache --requests 2000 --concurrency 50 --legs 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.osrm_stub import create_app, serve_in_thread
+from utils.osrm_client import OsrmClient
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def make_workload(n_requests, n_legs, seed=3):
+    rng = random.Random(seed)
+    stops = [(17.3 + rng.random() * 0.3, 78.3 + rng.random() * 0.3) for _ in range(n_legs * 2)]
+    legs = [(stops[2 * i], stops[2 * i + 1]) for i in range(n_legs)]
+    # Zipf-like: a few legs are requested far more often than the rest
+    weights = [1 / (i + 1) for i in range(n_legs)]
+    return rng.choices(legs, weights=weights, k=n_requests)
+
+
+async def run(workload, concurrency, call):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(leg):
+        async with sem:
+            start = time.perf_counter()
+            await call(leg)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(leg) for leg in workload))
+    return time.perf_counter() - start, latencies
+
+
+async def before(base_url, workload, concurrency):
+    async def call(leg):
+        (lat1, lng1), (lat2, lng2) = leg
+        url = f"{base_url}/route/v1/driving/{lng1},{lat1};{lng2},{lat2}?overview=full&geometries=geojson"
+        async with httpx.AsyncClient() as client:
+            (await client.get(url)).json()
+
+    return await run(workload, concurrency, call)
+
+
+async def after(base_url, workload, concurrency):
+    client = OsrmClient(base_url=base_url, cache_path=None)
+    await client.start()
+
+    async def call(leg):
+        (lat1, lng1), (lat2, lng2) = leg
+        await client.route(lat1, lng1, lat2, lng2)
+
+    try:
+        elapsed, latencies = await run(workload, concurrency, call)
+    finally:
+        await client.close()
+    return elapsed, latencies, client.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--legs", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    workload = make_workload(args.requests, args.legs)
+    app = create_app(args.latency_ms)
+    with serve_in_thread(app) as base_url:
+        elapsed, lat = asyncio.run(before(base_url, workload, args.concurrency))
+        calls_before = app.state.calls
+        print(f"before: {args.requests / elapsed:8.1f} req/s  p50={pct(lat, 0.5):7.1f}ms  "
+              f"p99={pct(lat, 0.99):7.1f}ms  upstream calls={calls_before}")
+
+        elapsed, lat, metrics = asyncio.run(after(base_url, workload, args.concurrency))
+        print(f" after: {args.requests / elapsed:8.1f} req/s  p50={pct(lat, 0.5):7.1f}ms  "
+              f"p99={pct(lat, 0.99):7.1f}ms  upstream calls={app.state.calls - calls_before}  "
+              f"hit rate={metrics['cache']['hit_rate']:.1%}  collapsed={metrics['collapsed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/osrm_stub.py
+"""
+Local stand-in for an OSRM server, so benchmarks never hit the public demo.
+
+Answers /route/v1/driving and /table/v1/driving from straight-line distances
+after a fixed delay.
+Run standalone and point the app at it with OSRM_BASE_URL:
+
+    python -m benchmarks.osrm_stub --port 5055 --latency-ms 40
+    OSRM_BASE_URL=http://127.0.0.1:5055 python main.py
+"""
+import argparse
+import asyncio
+import contextlib
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Query
+
+from utils.gps_utils import haversine_km
+
+STUB_SPEED_KMPH = 30
+
+
+def parse_coords(coords: str):
+    points = []
+    for pair in coords.split(";"):
+        lng, lat = pair.split(",")
+        points.append((float(lat), float(lng)))
+    return points
+
+
+def create_app(latency_ms: float = 40) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/route/v1/driving/{coords}")
+    async def route(coords: str):
+        app.state.calls += 1
+        await asyncio.sleep(latency_ms / 1000)
+        (lat1, lng1), (lat2, lng2) = parse_coords(coords)[:2]
+        km = haversine_km(lat1, lng1, lat2, lng2) * 1.3
+        return {
+            "code": "Ok",
+            "routes": [{
+                "distance": km * 1000,
+                "duration": km / STUB_SPEED_KMPH * 3600,
+                "geometry": {"type": "LineString", "coordinates": [[lng1, lat1], [lng2, lat2]]},
+            }],
+        }
+
+    @app.get("/table/v1/driving/{coords}")
+    async def table(coords: str, sources: str = Query(None), destinations: str = Query(None)):
+        app.state.calls += 1
+        await asyncio.sleep(latency_ms / 1000)
+        points = parse_coords(coords)
+        src = [int(i) for i in sources.split(";")] if sources else range(len(points))
+        dst = [int(i) for i in destinations.split(";")] if destinations else range(len(points))
+        distances = [[haversine_km(*points[i], *points[j]) * 1300 for j in dst] for i in src]
+        durations = [[d / 1000 / STUB_SPEED_KMPH * 3600 for d in row] for row in distances]
+        return {"code": "Ok", "durations": durations, "distances": distances}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve_in_thread(app, port: int = None):
+    """Run an ASGI app with uvicorn in a background thread; yields its base URL."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# benchmarks/parent_push.py
+"""
+Parent tracking load: HTTP polling vs the Socket.IO push channel.
+
+P parents track students spread over B buses for a simulated window while
+the buses ping at 1 Hz. Polling calls the tracking handler and serializes
+its response for every poll. Push runs ParentFeed against a real
+socketio.AsyncServer (transport stubbed) with every parent connected.
+Only the delivery path is timed; ping processing is shared by both. Polling
+CPU excludes the HTTP server stack, so the real gap is larger than shown.
+
+    python -m benchmarks.parent_push --parents 5000 --buses 200 --seconds 300
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+import socketio
+
+from routers import transport_parent
+from utils.eta import EtaEngine
+from utils.parent_feed import ParentFeed, parent_room
+
+
+def setup_fleet(rng, buses, parents, engine):
+    transport_parent.eta_engine = engine
+    transport_parent.STUDENTS.clear()
+    transport_parent.BUSES.clear()
+    routes = {}
+    for b in range(buses):
+        bus_id = f"BUS_{b}"
+        lat, lng = 17.3 + rng.random() * 0.3, 78.3 + rng.random() * 0.3
+        stops = [{"name": f"S{i}", "lat": lat + i * 0.004, "lon": lng + i * 0.003} for i in range(20)]
+        routes[bus_id] = stops
+        engine.set_route(bus_id, stops)
+        transport_parent.BUSES[bus_id] = {
+            "busNumber": f"B-{b}", "model": "Synthetic", "location": {"lat": lat, "lng": lng},
+            "speed": 0, "driver": {"name": "Driver", "phone": "+91-0000000000"},
+        }
+    for p in range(parents):
+        transport_parent.STUDENTS[f"STU{p}"] = {
+            "id": f"STU{p}", "name": "Student", "grade": "5A",
+            "route": {"source": "School", "destination": "Home"},
+            "bus_id": f"BUS_{p % buses}", "stop_index": rng.randrange(20),
+        }
+    return routes
+
+
+def drive(engine, routes, second, t0):
+    for bus_id, stops in routes.items():
+        f = min(second / 600, 0.999) * (len(stops) - 1)
+        i = int(f)
+        a, b = stops[i], stops[i + 1]
+        engine.on_ping(bus_id, a["lat"] + (b["lat"] - a["lat"]) * (f - i),
+                       a["lon"] + (b["lon"] - a["lon"]) * (f - i), ts=t0 + second, speed_kmph=25)
+
+
+async def polling(args, engine, routes):
+    rng = random.Random(2)
+    offsets = {f"STU{p}": rng.uniform(0, args.poll_every) for p in range(args.parents)}
+    requests = 0
+    payload_bytes = 0
+    cpu = 0.0
+    t0 = time.time()
+    for second in range(args.seconds):
+        drive(engine, routes, second, t0)
+        start = time.process_time()
+        for student_id, offset in offsets.items():
+            # Each parent polls once every poll_every seconds
+            if math.floor(second - offset) % args.poll_every == 0 and second >= offset:
+                body = json.dumps(await transport_parent.get_tracking_info(student_id))
+                payload_bytes += len(body)
+                requests += 1
+        cpu += time.process_time() - start
+    return requests, payload_bytes, cpu
+
+
+async def push(args, engine, routes):
+    sio = socketio.AsyncServer(async_mode="asgi")
+    packets = {"count": 0, "bytes": 0}
+
+    async def fake_send(eio_sid, pkt):
+        packets["count"] += 1
+        packets["bytes"] += len(pkt.data) if isinstance(pkt.data, (str, bytes)) else 0
+
+    sio._send_eio_packet = fake_send
+    feed = ParentFeed(sio, engine, min_interval=0)
+    t0 = time.time()
+    drive(engine, routes, 0, t0)
+
+    start = time.process_time()
+    snapshot_bytes = 0
+    for p in range(args.parents):
+        student = transport_parent.STUDENTS[f"STU{p}"]
+        sid = await sio.manager.connect(f"eio-{p}", "/")
+        snapshot = transport_parent.build_tracking_info(student["id"])
+        snapshot_bytes += len(json.dumps(snapshot))
+        await feed.subscribe(sid, student["bus_id"], snapshot)
+    cpu = time.process_time() - start
+
+    emits = 0
+    for second in range(1, args.seconds):
+        drive(engine, routes, second, t0)
+        for bus_id in routes:
+            feed.mark(bus_id)
+        # Flushing every push_every seconds is the same as the per-bus throttle
+        if second % args.push_every == 0:
+            start = time.process_time()
+            emits += await feed.flush()
+            cpu += time.process_time() - start
+    assert all(sio.manager.rooms["/"].get(parent_room(b)) for b in routes)
+    return args.parents, emits, packets["count"], packets["bytes"] + snapshot_bytes, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parents", type=int, default=5000)
+    parser.add_argument("--buses", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=300)
+    parser.add_argument("--poll-every", type=int, default=5)
+    parser.add_argument("--push-every", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = EtaEngine(route_loader=lambda _: None)
+    routes = setup_fleet(random.Random(1), args.buses, args.parents, engine)
+    requests, body_bytes, cpu = asyncio.run(polling(args, engine, routes))
+    print(f"{args.parents} parents on {args.buses} buses, {args.seconds}s simulated")
+    print(f"polling every {args.poll_every}s: {requests:>9,} requests  {body_bytes / 1e6:8.1f} MB  cpu {cpu:6.2f}s")
+
+    engine = EtaEngine(route_loader=lambda _: None)
+    routes = setup_fleet(random.Random(1), args.buses, args.parents, engine)
+    subs, emits, packets, sent_bytes, cpu = asyncio.run(push(args, engine, routes))
+    print(f"push (<= 1/{args.push_every}s): {subs:>9,} subscribes, {emits:,} frames encoded, "
+          f"{packets:,} packets  {sent_bytes / 1e6:8.1f} MB  cpu {cpu:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
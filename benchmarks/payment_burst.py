@@ -0,0 +1,278 @@
+# benchmarks/payment_burst.py
+"""
+Fee-collection burst against a local fake Razorpay.
+
+1. Order creation from many parents at once: the old blocking client in a
+   sync handler (a shared sync session called from the threadpool, as the
+   razorpay SDK did with requests) vs the pooled async client. A sync endpoint is probed
+   meanwhile: blocked order calls hold threadpool slots it also needs.
+2. Webhooks: every payment sends payment.authorized, payment.captured and
+   order.paid in shuffled order, and a share of them is redelivered. Each
+   event is handled inline (its own transaction per webhook) or by the
+   durable queue (group-committed ack, batched workers). Reports ack
+   latency, throughput and time until the payments table is final, and
+   checks every payment ends up captured exactly once.
+
+    python -m benchmarks.payment_burst --payments 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SECRET = "whsec_bench"
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def burst(client, requests, concurrency):
+    """POST every (path, kwargs) with at most `concurrency` in flight; returns latencies in ms and wall time."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(path, kwargs):
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post(path, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path, kwargs) for path, kwargs in requests))
+    return latencies, failures, time.perf_counter() - start
+
+
+def add_health(app):
+    # Any sync endpoint (most of the app's are) runs in the same threadpool
+    @app.get("/health")
+    def health():
+        return {"ok": True}
+
+    return app
+
+
+async def probe(client, stop, every=0.05):
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(every)
+    return latencies
+
+
+def legacy_app(api_url):
+    # The old handler: blocking HTTP call from a sync endpoint, one shared session
+    import httpx
+    from fastapi import FastAPI, HTTPException
+
+    app = add_health(FastAPI())
+    session = httpx.Client(auth=("rzp_test", "secret"), timeout=60)
+
+    @app.post("/api/transport/opt/{studentId}")
+    def create_order(studentId: str, body: dict):
+        try:
+            response = session.post(f"{api_url}/orders", json={"amount": int(body["planAmount"] * 100),
+                                                               "currency": "INR", "receipt": studentId})
+            response.raise_for_status()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {"success": True, "order": response.json()}
+
+    return app
+
+
+def webhook_deliveries(rng, payments, redeliver):
+    from benchmarks.razorpay_stub import payment_event, signed
+
+    deliveries = []
+    for i in range(payments):
+        payment_id, order_id = f"pay_{i:08d}", f"order_{i:08d}"
+        for n, (event, status) in enumerate((("payment.authorized", "authorized"),
+                                             ("payment.captured", "captured"), ("order.paid", "captured"))):
+            body = payment_event(event, payment_id, order_id, f"STU{i}", 150000, status)
+            deliveries.append(signed(body, SECRET, f"evt_{i:08d}_{n}"))
+    rng.shuffle(deliveries)
+    deliveries += rng.sample(deliveries, int(len(deliveries) * redeliver))
+    return deliveries
+
+
+def inline_app(queue):
+    # Same checks, but each webhook writes and applies its own event before answering
+    import hashlib
+    import hmac
+    import json
+    from fastapi import FastAPI, Header, HTTPException, Request
+    from utils.payment_events import event_key
+
+    app = FastAPI()
+
+    def apply(row):
+        fresh = queue.append([row])[0]
+        if fresh:
+            queue.process_batch("inline")
+        else:
+            queue.stats["duplicates"] += 1
+        return fresh
+
+    @app.post("/api/transport/webhook")
+    async def webhook(request: Request, x_razorpay_signature: str = Header(None),
+                      x_razorpay_event_id: str = Header(None)):
+        body = await request.body()
+        generated = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(generated, x_razorpay_signature or ""):
+            raise HTTPException(status_code=400, detail="Webhook signature mismatch")
+        event = json.loads(body)
+        row = {"event_id": x_razorpay_event_id or event_key(event, body), "event": event["event"],
+               "payload": body.decode(), "attempts": 0}
+        fresh = await asyncio.to_thread(apply, row)
+        return {"received": True, "duplicate": not fresh}
+
+    return app
+
+
+async def wait_drained(queue, timeout=120):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if not await asyncio.to_thread(queue.backlog):
+            return time.perf_counter() - start
+        await asyncio.sleep(0.02)
+    raise TimeoutError("payment events not processed in time")
+
+
+def check_payments(engine, payments):
+    from sqlalchemy import func, select
+    from models import Payment
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(Payment.status, func.count()).group_by(Payment.status)).all()
+    by_status = dict(rows)
+    assert by_status == {"captured": payments}, by_status
+    return by_status
+
+
+def clear(engine):
+    from sqlalchemy import delete
+    from models import Payment, PaymentEvent
+
+    with engine.begin() as conn:
+        conn.execute(delete(Payment))
+        conn.execute(delete(PaymentEvent))
+
+
+def report(label, latencies, failures, wall, extra=""):
+    print(f"  {label:22s} {len(latencies) / wall:8,.0f} req/s  p50 {statistics.median(latencies):7.1f} ms  "
+          f"p99 {pct(latencies, 0.99):7.1f} ms  errors {failures}{extra}")
+
+
+async def run(args, api_url):
+    import httpx
+    from fastapi import FastAPI
+    import database
+    from routers import payment
+    from utils.payment_events import payment_events
+
+    database.init_db()
+    app = add_health(FastAPI())
+    app.include_router(payment.router)
+    rng = random.Random(21)
+
+    print(f"order creation: {args.orders} parents, {args.concurrency} at a time, Razorpay latency {args.latency_ms:g} ms")
+    orders = [(f"/api/transport/opt/STU{i}", {"json": {"studentId": f"STU{i}", "planAmount": 1500}})
+              for i in range(args.orders)]
+    for label, target in (("sync handler + SDK", legacy_app(api_url)), ("async pooled client", app)):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://app",
+                                     timeout=60) as client:
+            stop = asyncio.Event()
+            prober = asyncio.create_task(probe(client, stop))
+            result = await burst(client, orders, args.concurrency)
+            stop.set()
+            health = await prober
+            report(label, *result, f"  | /health meanwhile p50 {statistics.median(health):6.1f} ms, "
+                                   f"max {max(health):6.1f} ms")
+    await payment.rzp_client.close()
+
+    deliveries = webhook_deliveries(rng, args.payments, args.redeliver)
+    requests = [("/api/transport/webhook", {"headers": headers, "content": raw}) for headers, raw in deliveries]
+    print(f"webhooks: {args.payments:,} payments, {len(requests):,} deliveries "
+          f"({args.redeliver:.0%} redelivered), {args.concurrency} at a time")
+
+    from utils.payment_events import PaymentEventQueue
+    inline = PaymentEventQueue(workers=0)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=inline_app(inline)), base_url="http://app",
+                                 timeout=60) as client:
+        latencies, failures, wall = await burst(client, requests, args.concurrency)
+    check_payments(database.engine, args.payments)
+    report("inline, per webhook", latencies, failures, wall,
+           f"  final after {wall:5.2f} s, {inline.stats['duplicates']} duplicates")
+    clear(database.engine)
+
+    payment_events.start()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app",
+                                 timeout=60) as client:
+        latencies, failures, wall = await burst(client, requests, args.concurrency)
+        drained = await wait_drained(payment_events)
+    check_payments(database.engine, args.payments)
+    m = payment_events.metrics()
+    report("queued, group commit", latencies, failures, wall,
+           f"  final after {wall + drained:5.2f} s, {m['duplicates']} duplicates")
+    print(f"    {m['commits']} ack commits ({m['received'] / max(m['commits'], 1):.0f} events each), "
+          f"{m['worker_batches']} worker batches, {m['payments_written']:,} payment upserts")
+    await payment_events.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--redeliver", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    args = parser.parse_args()
+
+    from benchmarks.osrm_stub import free_port
+
+    # Own process, like the real Razorpay: its CPU time doesn't share our GIL
+    port = free_port()
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.razorpay_stub", "--port", str(port),
+                             "--latency-ms", str(args.latency_ms)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stub_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_port(port)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ.update({
+                "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                "RAZORPAY_KEY_ID": "rzp_test", "RAZORPAY_KEY_SECRET": "secret", "RZP_WEBHOOK_SECRET": SECRET,
+                "RAZORPAY_API_URL": f"{stub_url}/v1",
+            })
+            asyncio.run(run(args, f"{stub_url}/v1"))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"stub did not start on port {port}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/razorpay_stub.py
+"""
+Local stand-in for the Razorpay orders API, plus signed webhook payloads,
+so payments can be exercised without keys or network.
+
+Answers POST /v1/orders (basic auth required) after --latency-ms. Point the
+app at it with RAZORPAY_API_URL:
+
+    python -m benchmarks.razorpay_stub --port 5057 --latency-ms 150
+    RAZORPAY_API_URL=http://127.0.0.1:5057/v1 python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float = 150) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/v1/orders")
+    async def create_order(request: Request):
+        app.state.calls += 1
+        if not request.headers.get("authorization", "").startswith("Basic "):
+            return JSONResponse({"error": {"code": "BAD_REQUEST_ERROR",
+                                           "description": "Authentication failed"}}, status_code=401)
+        body = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        return {"id": f"order_{os.urandom(7).hex()}", "entity": "order", "amount": body["amount"],
+                "amount_paid": 0, "currency": body.get("currency", "INR"), "receipt": body.get("receipt"),
+                "status": "created", "notes": body.get("notes") or [], "created_at": int(time.time())}
+
+    return app
+
+
+def payment_event(event: str, payment_id: str, order_id: str, student_id: str, amount: int,
+                  status: str) -> dict:
+    """A webhook body shaped like Razorpay's payment.* / order.paid events."""
+    payment = {"id": payment_id, "entity": "payment", "amount": amount, "currency": "INR", "status": status,
+               "order_id": order_id, "method": "upi", "notes": {"studentId": student_id}}
+    payload = {"payment": {"entity": payment}}
+    if event == "order.paid":
+        payload["order"] = {"entity": {"id": order_id, "entity": "order", "amount": amount, "status": "paid"}}
+    return {"entity": "event", "account_id": "acc_stub", "event": event, "contains": list(payload),
+            "payload": payload, "created_at": int(time.time())}
+
+
+def signed(body: dict, secret: str, event_id: str):
+    """(headers, raw body) as Razorpay would POST them to the webhook URL."""
+    raw = json.dumps(body).encode()
+    signature = hmac.new(secret.encode(), raw, hashlib.sha256).hexdigest()
+    return {"x-razorpay-signature": signature, "x-razorpay-event-id": event_id,
+            "content-type": "application/json"}, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
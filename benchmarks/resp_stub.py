@@ -0,0 +1,224 @@
+# benchmarks/resp_stub.py
+"""
+Local stand-in for a Redis server, so the multi-worker setup can be tried
+without installing one.
+
+Speaks enough RESP2 / RESP3 for what the app uses: PUBLISH / SUBSCRIBE
+(Socket.IO message queue), HSET / HGET / HGETALL / HDEL (shared live
+state), SET NX PX / GET / PEXPIRE and the lock's compare-and-act EVAL
+scripts (scheduler leader lock), plus the connection handshake redis-py sends (HELLO, CLIENT).
+Everything lives in memory.
+
+    python -m benchmarks.resp_stub --port 6390
+    SIO_MESSAGE_QUEUE=redis://127.0.0.1:6390/0 uvicorn main:socket_app --port 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import re
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from benchmarks.osrm_stub import free_port
+
+
+# No Lua here: EVAL only understands utils/scheduler.py's "if GET key == token then <command>" scripts
+_COMPARE_AND = re.compile(rb"if redis\.call\('get',KEYS\[1\]\)==ARGV\[1\] then "
+                          rb"return redis\.call\('(\w+)',KEYS\[1\](?:,ARGV\[2\])?\) end return 0")
+
+
+class Map(dict):
+    pass
+
+
+class Push(list):
+    pass
+
+
+def encode(value, proto: int = 2) -> bytes:
+    if value is None:
+        return b"_\r\n" if proto == 3 else b"$-1\r\n"
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    if isinstance(value, Map):
+        if proto == 3:
+            return b"%%%d\r\n" % len(value) + b"".join(encode(k, proto) + encode(v, proto) for k, v in value.items())
+        value = [x for kv in value.items() for x in kv]
+    prefix = b">" if proto == 3 and isinstance(value, Push) else b"*"
+    return prefix + b"%d\r\n" % len(value) + b"".join(encode(v, proto) for v in value)
+
+
+class RespStub:
+    def __init__(self):
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+        self.strings: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # value, monotonic expiry
+        # Subscribed connections and the protocol each one negotiated
+        self.channels: Dict[bytes, Dict[asyncio.StreamWriter, int]] = {}
+        self.stats = {"commands": 0, "published": 0, "delivered": 0}
+
+    async def read_command(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command (e.g. from redis-cli / telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        proto = 2
+        try:
+            while True:
+                args = await self.read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                self.stats["commands"] += 1
+                name, args = args[0].upper(), args[1:]
+                if name == b"HELLO":
+                    proto = int(args[0]) if args else proto
+                    writer.write(encode(Map({b"server": b"resp-stub", b"version": b"7.0.0", b"proto": proto,
+                                             b"mode": b"standalone", b"role": b"master", b"modules": []}), proto))
+                elif name == b"SUBSCRIBE":
+                    for ch in args:
+                        subscribed.add(ch)
+                        self.channels.setdefault(ch, {})[writer] = proto
+                        writer.write(encode(Push([b"subscribe", ch, len(subscribed)]), proto))
+                elif name == b"UNSUBSCRIBE":
+                    for ch in args or list(subscribed):
+                        subscribed.discard(ch)
+                        self.channels.get(ch, {}).pop(writer, None)
+                        writer.write(encode(Push([b"unsubscribe", ch, len(subscribed)]), proto))
+                else:
+                    writer.write(encode(self.execute(name, args), proto))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for ch in subscribed:
+                self.channels.get(ch, {}).pop(writer, None)
+            writer.close()
+
+    def execute(self, name: bytes, args):
+        if name == b"PING":
+            return b"PONG" if not args else args[0]
+        if name in (b"CLIENT", b"SELECT", b"AUTH"):
+            return True
+        if name == b"PUBLISH":
+            channel, message = args
+            receivers = list(self.channels.get(channel, {}).items())
+            for w, proto in receivers:
+                w.write(encode(Push([b"message", channel, message]), proto))
+            self.stats["published"] += 1
+            self.stats["delivered"] += len(receivers)
+            return len(receivers)
+        if name == b"HSET":
+            h = self.hashes.setdefault(args[0], {})
+            added = 0
+            for field, value in zip(args[1::2], args[2::2]):
+                added += field not in h
+                h[field] = value
+            return added
+        if name == b"HGET":
+            return self.hashes.get(args[0], {}).get(args[1])
+        if name == b"HGETALL":
+            return Map(self.hashes.get(args[0], {}))
+        if name == b"HDEL":
+            h = self.hashes.get(args[0], {})
+            return sum(h.pop(f, None) is not None for f in args[1:])
+        if name == b"SET":
+            key, value, opts = args[0], args[1], [a.upper() for a in args[2:]]
+            exists = self._string(key) is not None
+            if (b"NX" in opts and exists) or (b"XX" in opts and not exists):
+                return None
+            expires = None
+            for unit, scale in ((b"PX", 0.001), (b"EX", 1)):
+                if unit in opts:
+                    expires = time.monotonic() + int(opts[opts.index(unit) + 1]) * scale
+            self.strings[key] = (value, expires)
+            return True
+        if name == b"GET":
+            return self._string(args[0])
+        if name == b"PEXPIRE":
+            value = self._string(args[0])
+            if value is None:
+                return 0
+            self.strings[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return 1
+        if name == b"EVAL":
+            match = _COMPARE_AND.fullmatch(args[0])
+            if match is None or args[1] != b"1":
+                return Exception("unsupported script")
+            if self._string(args[2]) != args[3]:
+                return 0
+            return self.execute(match.group(1).upper(), [args[2], *args[4:]])
+        if name == b"DEL":
+            return sum((self.hashes.pop(k, None) is not None) + (self.strings.pop(k, None) is not None)
+                       for k in args)
+        return Exception(f"unknown command '{name.decode()}'")
+
+    def _string(self, key: bytes) -> Optional[bytes]:
+        value, expires = self.strings.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.strings[key]
+            return None
+        return value
+
+    async def serve(self, port: int):
+        return await asyncio.start_server(self.handle, "127.0.0.1", port)
+
+
+@contextlib.contextmanager
+def serve_in_thread(port: int = None):
+    """Run the stub on its own event loop in a background thread; yields its redis:// URL."""
+    port = port or free_port()
+    stub = RespStub()
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(stub.serve(port))
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    try:
+        yield f"redis://127.0.0.1:{port}/0", stub
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run():
+        server = await RespStub().serve(args.port)
+        print(f"RESP stub on redis://127.0.0.1:{args.port}/0")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
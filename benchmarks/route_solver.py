@@ -0,0 +1,88 @@
+# benchmarks/route_solver.py
+"""
+Synthetic school-route instances for utils.route_solver.
+
+Each instance puts a school depot in the middle of a city-sized box with
+clustered pickup stops and a fleet whose capacity covers all students.
+Records solve time and tour cost (nearest-neighbour vs improved).
+
+    python -m benchmarks.route_solver
+    python -m benchmarks.route_solver --json results.json
+"""
+import argparse
+import json
+import random
+import time
+
+from utils.route_solver import optimize_school_routes, solve
+from utils.geo_batch import haversine_matrix
+
+INSTANCES = [
+    # (name, stops, vehicles)
+    ("small", 40, 4),
+    ("medium", 100, 10),
+    ("large", 200, 20),
+]
+
+
+def make_instance(n_stops, n_vehicles, seed):
+    rng = random.Random(seed)
+    school = {"id": "school", "lat": 17.44, "lon": 78.38, "depot": True}
+    centres = [(17.44 + rng.uniform(-0.15, 0.15), 78.38 + rng.uniform(-0.15, 0.15))
+               for _ in range(max(3, n_vehicles // 2))]
+    stops = [school]
+    for i in range(n_stops):
+        clat, clon = rng.choice(centres)
+        stops.append({
+            "id": f"stop-{i}",
+            "lat": clat + rng.gauss(0, 0.02),
+            "lon": clon + rng.gauss(0, 0.02),
+            "students": rng.randint(1, 6),
+        })
+    demand = sum(s.get("students", 0) for s in stops)
+    capacity = int(demand / n_vehicles * 1.15) + 6
+    vehicles = [{"id": f"bus-{v}", "capacity": capacity} for v in range(n_vehicles)]
+    return stops, vehicles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--time-limit", type=float, default=2.0)
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--json", help="write per-instance results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'instance':>8} {'seed':>4} {'stops':>5} {'veh':>4} {'nn km':>9} {'final km':>9} "
+          f"{'gain %':>7} {'solve s':>8} {'unassigned':>10}")
+    for name, n_stops, n_vehicles in INSTANCES:
+        for seed in range(args.seeds):
+            stops, vehicles = make_instance(n_stops, n_vehicles, seed)
+            matrix = haversine_matrix([s["lat"] for s in stops], [s["lon"] for s in stops])
+
+            start = time.perf_counter()
+            raw = solve(matrix, [s.get("students", 0) for s in stops],
+                        [v["capacity"] for v in vehicles], time_limit=args.time_limit)
+            elapsed = time.perf_counter() - start
+
+            # Same instance through the public entry point must reproduce the solution
+            again = optimize_school_routes(stops, vehicles, distance_matrix=matrix, time_limit=args.time_limit)
+            assert raw["timed_out"] or round(raw["cost"], 2) == again["totalDistanceKm"]
+
+            gain = (1 - raw["cost"] / raw["initial_cost"]) * 100 if raw["initial_cost"] else 0
+            print(f"{name:>8} {seed:>4} {n_stops:>5} {n_vehicles:>4} {raw['initial_cost']:>9.1f} "
+                  f"{raw['cost']:>9.1f} {gain:>7.1f} {elapsed:>8.3f} {len(raw['unassigned']):>10}")
+            results.append({
+                "instance": name, "seed": seed, "stops": n_stops, "vehicles": n_vehicles,
+                "nn_cost_km": raw["initial_cost"], "cost_km": raw["cost"],
+                "solve_seconds": elapsed, "timed_out": raw["timed_out"],
+                "unassigned": len(raw["unassigned"]),
+            })
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/route_stops.py
+"""
+Route stop lookups before and after RouteStop: loading a route's stops as
+arrays (Route row + JSON parse vs the stop cache) and "which routes pass
+near this point" (scan every Route and parse its JSON vs the indexed
+bounding-box query on RouteStop).
+
+    python -m benchmarks.route_stops --routes 2000 --stops 30
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def seed(engine, rng, routes, stops):
+    from sqlalchemy import insert
+    from models import Route
+
+    with engine.begin() as conn:
+        rows = []
+        for r in range(routes):
+            lat, lon = 17.2 + rng.random() * 0.5, 78.2 + rng.random() * 0.5
+            path = []
+            for i in range(stops):
+                lat += rng.uniform(-0.004, 0.004)
+                lon += rng.uniform(-0.004, 0.004)
+                path.append({"lat": round(lat, 6), "lon": round(lon, 6), "name": f"R{r}-S{i}", "offset_min": i * 2})
+            rows.append({"name": f"Route {r}", "stops": json.dumps(path), "active": True})
+        conn.execute(insert(Route), rows)
+
+
+def old_route_arrays(route_id):
+    # What ETA / OSRM did per load before: fetch the row, parse its JSON
+    from database import get_session
+    from models import Route
+    from utils.geo_batch import stop_coordinates
+
+    with get_session() as s:
+        return stop_coordinates(s.get(Route, route_id).stops)
+
+
+def old_routes_near(lat, lon, radius_km):
+    from sqlmodel import select
+    from database import get_session
+    from models import Route
+    from utils.geo_batch import haversine_one_to_many, stop_coordinates
+
+    found = []
+    with get_session() as s:
+        for route in s.exec(select(Route)):
+            lats, lons = stop_coordinates(route.stops)
+            if len(lats) and haversine_one_to_many(lat, lon, lats, lons).min() <= radius_km:
+                found.append(route.id)
+    return found
+
+
+def timeit(fn, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=2000)
+    parser.add_argument("--stops", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        import database
+        from utils.route_stops import migrate_route_stops, routes_near, stop_cache
+
+        import models  # noqa: F401  registers the tables
+        # Tables only: the RouteStop migration is what's being timed below
+        database.SQLModel.metadata.create_all(database.engine)
+        seed(database.engine, rng, args.routes, args.stops)
+        start = time.perf_counter()
+        converted = migrate_route_stops(database.engine)
+        print(f"{args.routes:,} routes x {args.stops} stops; migrated {converted:,} routes "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        ids = [(rng.randint(1, args.routes),) for _ in range(args.queries)]
+        old = timeit(old_route_arrays, ids)
+        for route_id, in ids:
+            stop_cache.get(route_id)  # warm
+        cached = timeit(stop_cache.get, ids)
+        print(f"  stop arrays for a route   JSON {old:8.3f} ms   cache hit {cached * 1000:8.1f} us")
+
+        points = [(17.2 + rng.random() * 0.5, 78.2 + rng.random() * 0.5, 0.5) for _ in range(args.queries // 4)]
+        old = timeit(old_routes_near, points)
+        new = timeit(routes_near, points)
+        same = all(sorted(old_routes_near(*p)) == sorted(r["route_id"] for r in routes_near(*p)) for p in points[:10])
+        print(f"  routes within 500 m       scan {old:8.2f} ms   indexed   {new:8.2f} ms   same results: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/spatial_index.py
+"""
+Grid index vs brute-force haversine for "buses near this stop" queries.
+
+Brute force is timed on a sample of the queries (it is O(buses) per query)
+and extrapolated to the full query count.
+
+    python -m benchmarks.spatial_index --buses 10000 --queries 100000
+"""
+import argparse
+import random
+import time
+
+from utils.gps_utils import haversine_km
+from utils.spatial_index import GridIndex
+
+# Roughly the Hyderabad metro area
+LAT_RANGE = (17.20, 17.60)
+LNG_RANGE = (78.20, 78.70)
+
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+
+
+def brute_within(points, lat, lng, radius_km):
+    hits = [(bus_id, haversine_km(lat, lng, blat, blng)) for bus_id, (blat, blng) in points.items()]
+    return sorted((h for h in hits if h[1] <= radius_km), key=lambda h: h[1])
+
+
+def brute_nearest(points, lat, lng, k):
+    hits = [(bus_id, haversine_km(lat, lng, blat, blng)) for bus_id, (blat, blng) in points.items()]
+    return sorted(hits, key=lambda h: h[1])[:k]
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(lat, lng) for lat, lng in queries]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--brute-sample", type=int, default=500)
+    parser.add_argument("--radius-m", type=float, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    points = {f"BUS_{i}": random_point(rng) for i in range(args.buses)}
+    queries = [random_point(rng) for _ in range(args.queries)]
+    sample = queries[:args.brute_sample]
+    radius_km = args.radius_m / 1000
+
+    index = GridIndex()
+    start = time.perf_counter()
+    for bus_id, (lat, lng) in points.items():
+        index.update(bus_id, lat, lng)
+    build = time.perf_counter() - start
+    print(f"{args.buses} buses indexed in {build * 1000:.1f} ms "
+          f"({build / args.buses * 1e6:.2f} us/update)")
+
+    for name, grid_fn, brute_fn in (
+            (f"radius {args.radius_m:g} m",
+             lambda lat, lng: index.within(lat, lng, radius_km),
+             lambda lat, lng: brute_within(points, lat, lng, radius_km)),
+            (f"k-nearest k={args.k}",
+             lambda lat, lng: index.nearest(lat, lng, k=args.k),
+             lambda lat, lng: brute_nearest(points, lat, lng, args.k)),
+    ):
+        grid_time, grid_results = timed(grid_fn, queries)
+        brute_time, brute_results = timed(brute_fn, sample)
+        brute_full = brute_time / len(sample) * len(queries)
+        mismatches = sum(
+            [b for b, _ in g] != [b for b, _ in r]
+            for g, r in zip(grid_results[:len(sample)], brute_results)
+        )
+        print(f"{name:>18}: grid {grid_time:8.2f} s ({grid_time / len(queries) * 1e6:8.1f} us/query)  "
+              f"brute ~{brute_full:8.1f} s ({brute_time / len(sample) * 1e6:8.1f} us/query)  "
+              f"speedup x{brute_full / grid_time:7.1f}  mismatches={mismatches}/{len(sample)}")
+
+
+if __name__ == "__main__":
+    main()
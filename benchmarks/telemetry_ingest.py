@@ -0,0 +1,70 @@
+# benchmarks/telemetry_ingest.py
+"""
+Sustained ingest rate of the telemetry sink, and track-query latency.
+
+Feeds pings for N buses as fast as the handler side can record them while the
+sink flushes batches to a scratch SQLite file, then reports handler-side and
+end-to-end (written) pings/sec.
+
+    python -m benchmarks.telemetry_ingest --buses 2000 --pings 500000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from utils.telemetry import TelemetrySink, TelemetryStore, create_telemetry_engine
+
+
+async def ingest(sink, buses, pings, start_ts):
+    rng = random.Random(5)
+    positions = [(17.3 + rng.random() * 0.3, 78.3 + rng.random() * 0.3) for _ in range(buses)]
+    sink.start()
+    record_time = 0.0
+    wall = time.perf_counter()
+    for n in range(pings):
+        bus = n % buses
+        lat, lng = positions[bus]
+        t = time.perf_counter()
+        sink.record(f"BUS_{bus}", lat + n * 1e-7, lng, ts=start_ts + n / buses, speed=30.0, heading=90.0)
+        record_time += time.perf_counter() - t
+        # Yield like a real event loop would between Socket.IO messages
+        if n % 1000 == 0:
+            await asyncio.sleep(0)
+    await sink.stop()
+    return record_time, time.perf_counter() - wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, default=2000)
+    parser.add_argument("--pings", type=int, default=500_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TelemetryStore(create_telemetry_engine(f"sqlite:///{os.path.join(tmp, 'telemetry.db')}"))
+        sink = TelemetrySink(store, batch_size=args.batch_size, flush_seconds=0.5)
+        start_ts = time.time() - 3600
+
+        record_time, wall = asyncio.run(ingest(sink, args.buses, args.pings, start_ts))
+        print(f"recorded {sink.stats['recorded']} pings, written {sink.stats['written']} "
+              f"in {sink.stats['batches']} batches, dropped {sink.stats['dropped']}")
+        print(f"handler side : {args.pings / record_time:12,.0f} pings/s ({record_time / args.pings * 1e6:.2f} us/ping)")
+        print(f"end to end   : {sink.stats['written'] / wall:12,.0f} pings/s sustained")
+
+        duration = args.pings / args.buses
+        queries = 200
+        t = time.perf_counter()
+        total = 0
+        for i in range(queries):
+            window_start = start_ts + random.random() * duration * 0.5
+            total += len(store.track(f"BUS_{i % args.buses}", window_start, window_start + duration * 0.25))
+        elapsed = time.perf_counter() - t
+        print(f"track query  : {elapsed / queries * 1000:.2f} ms/query, {total / queries:.0f} points/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# benchmarks/trip_replay.py
+"""
+Replays a synthetic fleet through ping validation, the trip state machine
+(utils/trip_state.py) and the ETA engine, as mobile_location_update does.
+
+Each bus drives a straight route of stops with acceleration, braking and
+a dwell at every stop, pinging once per --interval with Gaussian GPS noise
+and an occasional jump of hundreds of metres to kilometres. --buses 5000
+at the default 1 s interval is 5k pings/s of traffic.
+
+Reports the cost per ping (validation + tracker alone, and with the ETA
+engine it feeds), the share of one core that costs at the replayed rate,
+and how well the filter did against the true positions: error before and
+after smoothing, jumps caught and missed, good fixes dropped, dwells and
+completed trips found.
+
+    python -m benchmarks.trip_replay --buses 5000 --seconds 180 [--reported-speed]
+"""
+import argparse
+import math
+import random
+import time
+
+from utils.eta import EtaEngine
+from utils.trip_state import M_PER_DEG, TRIP_DWELL_MIN_S, TripTracker, check_ping
+
+ACCEL = 1.0  # m/s^2, both ways
+CRUISE_MPS = 30 / 3.6
+
+
+class SimBus:
+    def __init__(self, rng, i, n_stops, skip):
+        self.bus_id = f"KA01F{i:04d}"
+        self.route_id = i
+        self.lat0 = 12.85 + rng.random() * 0.2
+        self.lng0 = 77.5 + rng.random() * 0.2
+        heading = rng.uniform(0, 2 * math.pi)
+        self.coslat = math.cos(math.radians(self.lat0))
+        self.dlat = math.cos(heading) / M_PER_DEG
+        self.dlng = math.sin(heading) / (M_PER_DEG * self.coslat)
+        self.stops_at = [0.0]
+        for _ in range(n_stops - 1):
+            self.stops_at.append(self.stops_at[-1] + rng.uniform(150, 300))
+        # Stops nobody waits at are driven through at speed
+        self.skipped = {i for i in range(1, n_stops - 1) if rng.random() < skip}
+        self.s = 0.0  # metres along the route
+        self.v = 0.0
+        self.next_stop = 1
+        self.wait = rng.uniform(0, 10)  # at the depot before leaving
+        self.dwell_for = 0.0
+        self.dwells = 0  # intermediate stops where it stood long enough to count
+        self.finished_at = None
+
+    def stops(self):
+        return [{"lat": self.lat0 + s * self.dlat, "lon": self.lng0 + s * self.dlng, "name": f"S{i}"}
+                for i, s in enumerate(self.stops_at)]
+
+    def position(self):
+        return self.lat0 + self.s * self.dlat, self.lng0 + self.s * self.dlng
+
+    def step(self, t, dt, rng):
+        if self.next_stop >= len(self.stops_at):
+            return
+        if self.wait > 0:
+            self.wait -= dt
+            self.dwell_for += dt
+            if self.next_stop > 1 and self.dwell_for - dt < TRIP_DWELL_MIN_S + 2 <= self.dwell_for:
+                self.dwells += 1
+            return
+        target = self.next_stop
+        while target in self.skipped:
+            target += 1
+        remaining = self.stops_at[target] - self.s
+        if self.v * self.v / (2 * ACCEL) >= remaining:
+            self.v = max(self.v - ACCEL * dt, 1.0)
+        else:
+            self.v = min(self.v + ACCEL * dt, CRUISE_MPS)
+        self.s += self.v * dt
+        while self.next_stop < target and self.s >= self.stops_at[self.next_stop]:
+            self.next_stop += 1
+        if self.s >= self.stops_at[target]:
+            self.s = self.stops_at[target]
+            self.v = 0.0
+            self.next_stop = target + 1
+            self.wait = rng.uniform(15, 30)
+            self.dwell_for = 0.0
+            if self.next_stop >= len(self.stops_at):
+                self.finished_at = t
+
+
+def error_m(lat, lng, true_lat, true_lng):
+    dy = (lat - true_lat) * M_PER_DEG
+    dx = (lng - true_lng) * M_PER_DEG * math.cos(math.radians(true_lat))
+    return math.sqrt(dx * dx + dy * dy)
+
+
+def replay(args, with_eta):
+    """
+    Simulates one interval of the fleet at a time and replays its pings in
+    arrival order; only the replay is timed. The same seed gives the same
+    pings on every run.
+    """
+    rng = random.Random(args.seed)
+    buses = [SimBus(rng, i, args.stops, args.skip) for i in range(args.buses)]
+    phase = sorted(((rng.random() * args.interval, bus) for bus in buses), key=lambda p: p[0])
+    noise_deg = args.noise / M_PER_DEG
+
+    eta = EtaEngine(route_loader=lambda route_id: None)
+    for bus in buses:
+        eta.set_route(bus.bus_id, bus.stops(), route_id=bus.route_id)
+    trips = TripTracker(None, eta)
+    eta.on_arrival(trips.record_arrival)
+    on_ping = trips.on_ping
+    on_eta = eta.on_ping
+
+    quality = {"raw": [], "smoothed": [], "jumps": 0, "caught": 0, "leaked": 0, "dropped": 0}
+    elapsed = 0.0
+    pings = 0
+    t = 0.0
+    while t < args.seconds:
+        batch = []
+        for offset, bus in phase:
+            bus.step(t + offset, args.interval, rng)
+            true_lat, true_lng = bus.position()
+            speed = max(bus.v * 3.6 + rng.gauss(0, 1), 0.0) if args.reported_speed else None
+            lat = true_lat + rng.gauss(0, noise_deg)
+            lng = true_lng + rng.gauss(0, noise_deg) / bus.coslat
+            jump = rng.random() < args.jumps
+            if jump:
+                angle, km = rng.uniform(0, 2 * math.pi), rng.uniform(0.3, 5)
+                lat += km * 1000 * math.cos(angle) / M_PER_DEG
+                lng += km * 1000 * math.sin(angle) / (M_PER_DEG * bus.coslat)
+            batch.append((bus.bus_id, bus.route_id, lat, lng, speed, t + offset, true_lat, true_lng, jump))
+
+        fixes = []
+        start = time.perf_counter()
+        for bus_id, route_id, lat, lng, speed, ts, _, _, _ in batch:
+            data = {"bus_id": bus_id, "lat": lat, "lng": lng, "speed": speed, "route_id": route_id}
+            if check_ping(data):
+                fixes.append(None)
+                continue
+            trip = on_ping(bus_id, lat, lng, ts, speed, None, route_id)
+            if trip.rejected:
+                fixes.append(None)
+                continue
+            if with_eta:
+                on_eta(bus_id, trip.lat, trip.lng, ts, speed, route_id)
+            fixes.append((trip.lat, trip.lng))
+        elapsed += time.perf_counter() - start
+        pings += len(batch)
+
+        for (_, _, lat, lng, _, _, true_lat, true_lng, jump), fix in zip(batch, fixes):
+            quality["jumps"] += jump
+            if fix is None:
+                quality["caught" if jump else "dropped"] += 1
+            elif jump:
+                quality["leaked"] += 1
+            else:
+                quality["raw"].append(error_m(lat, lng, true_lat, true_lng))
+                quality["smoothed"].append(error_m(fix[0], fix[1], true_lat, true_lng))
+        t += args.interval
+    return elapsed, pings, trips, buses, quality
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, default=5000)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between pings of one bus")
+    parser.add_argument("--seconds", type=float, default=180, help="simulated time to replay")
+    parser.add_argument("--stops", type=int, default=5, help="stops per route")
+    parser.add_argument("--skip", type=float, default=0.2, help="share of stops driven through")
+    parser.add_argument("--noise", type=float, default=8.0, help="GPS error (1 sigma, metres)")
+    parser.add_argument("--jumps", type=float, default=0.01, help="share of pings that are jumps")
+    parser.add_argument("--reported-speed", action="store_true",
+                        help="pings carry the device's speed (+-1 km/h) instead of leaving it to the filter")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rate = args.buses / args.interval
+    print(f"{args.buses} buses pinging every {args.interval:g} s ({rate:,.0f} pings/s), "
+          f"{args.seconds:g} s simulated")
+
+    for label, with_eta in (("validate + trip tracker", False), ("validate + trip tracker + ETA engine", True)):
+        elapsed, pings, trips, buses, quality = replay(args, with_eta)
+        us = elapsed / pings * 1e6
+        print(f"  {label:38s} {us:6.2f} us/ping  {pings / elapsed:9,.0f} pings/s  "
+              f"{us * rate / 1e4:5.1f}% of a core at {rate:,.0f}/s")
+
+    def summary(errors):
+        errors.sort()
+        rms = math.sqrt(sum(e * e for e in errors) / len(errors))
+        return f"rms {rms:5.1f} m  p95 {errors[int(len(errors) * 0.95)]:5.1f} m"
+
+    print(f"filter ({pings:,} pings):")
+    print(f"  error, raw fixes        {summary(quality['raw'])}")
+    print(f"  error, smoothed         {summary(quality['smoothed'])}")
+    print(f"  jumps injected {quality['jumps']:,}: caught {quality['caught']:,}, let through {quality['leaked']:,}; "
+          f"good fixes dropped {quality['dropped']:,}")
+    print("trip states:")
+    print(f"  dwells: {trips.stats['dwells']:,} detected, {sum(b.dwells for b in buses):,} in the simulation "
+          f"({sum(len(b.skipped) for b in buses):,} stops driven through)")
+    delays = sorted(trips.get(b.bus_id).since - b.finished_at for b in buses
+                    if b.finished_at is not None and trips.get(b.bus_id).state == "completed")
+    finished = sum(b.finished_at is not None for b in buses)
+    print(f"  completed trips: {trips.stats['completed']:,} detected, {finished:,} in the simulation; "
+          f"median {delays[len(delays) // 2] if delays else float('nan'):.1f} s after the bus stopped"
+          f" ({finished - len(delays)} not yet)")
+    print(f"  states at the end: {trips.counts}")
+
+
+if __name__ == "__main__":
+    main()
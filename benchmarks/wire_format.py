@@ -0,0 +1,134 @@
+# benchmarks/wire_format.py
+"""
+JSON vs the binary wire format (utils/wire.py) for GPS pings and position
+broadcasts.
+
+1. Driver ping: payload bytes, bytes on the wire as Socket.IO packets
+   (a binary payload travels as a placeholder text packet plus the
+   attachment) and encode+decode time.
+2. Broadcast frames of N buses: bytes per position and encode+decode time
+   per position.
+3. Fan-out through a real socketio.AsyncServer (transport stubbed out):
+   server CPU per broadcaster flush and bytes sent per tick for M
+   dashboards in the fleet room, all JSON vs all binary.
+
+    python -m benchmarks.wire_format --buses 2000 --dashboards 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from socketio import packet
+
+from utils.wire import decode_ping, decode_positions, encode_ping, encode_positions
+
+
+def driver_ping(rng, i):
+    return {"bus_id": f"KA01F{i:04d}", "lat": round(12.9 + rng.random() * 0.2, 6),
+            "lng": round(77.5 + rng.random() * 0.2, 6), "speed": round(rng.uniform(0, 60), 1),
+            "heading": round(rng.uniform(0, 360), 1), "route_id": rng.randrange(1, 200)}
+
+
+def wire_bytes(event, payload) -> int:
+    """Engine.IO message bytes for one Socket.IO event (websocket framing not counted)."""
+    encoded = packet.Packet(packet.EVENT, data=[event, payload]).encode()
+    if isinstance(encoded, list):
+        text, *attachments = encoded
+        return 1 + len(text.encode()) + sum(len(a) for a in attachments)
+    return 1 + len(encoded.encode())
+
+
+def best_us(fn, n, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+def ping_costs(rng, n):
+    data = driver_ping(rng, 42)
+    raw_json = json.dumps(data, separators=(",", ":"))
+    raw_binary = encode_ping(**data)
+    json_us = best_us(lambda: json.loads(json.dumps(data, separators=(",", ":"))), n)
+    binary_us = best_us(lambda: decode_ping(encode_ping(**data)), n)
+    print("driver ping (one bus):")
+    print(f"  {'':8s} {'payload':>9s} {'on wire':>9s} {'encode+decode':>14s}")
+    print(f"  {'json':8s} {len(raw_json):7d} B {wire_bytes('mobile_location_update', data):7d} B {json_us:11.2f} us")
+    print(f"  {'binary':8s} {len(raw_binary):7d} B {wire_bytes('mobile_location_update', raw_binary):7d} B "
+          f"{binary_us:11.2f} us")
+
+
+def frame_costs(rng, sizes):
+    print("broadcast frame (per position):")
+    print(f"  {'buses':>6s} {'json B':>8s} {'binary B':>9s} {'json us':>8s} {'binary us':>10s}")
+    now = time.time()
+    for size in sizes:
+        pings = [driver_ping(rng, i) for i in range(size)]
+        received = [(p, now - rng.random() * 0.5) for p in pings]
+        payload = {"ts": now, "positions": pings}
+        frame = encode_positions(received, now)
+        assert len(decode_positions(frame)[1]) == size
+        n = max(1, 20000 // size)
+        json_us = best_us(lambda: json.loads(json.dumps(payload, separators=(",", ":"))), n) / size
+        binary_us = best_us(lambda: decode_positions(encode_positions(received, now)), n) / size
+        print(f"  {size:6d} {wire_bytes('bus_locations', payload) / size:8.1f} "
+              f"{wire_bytes('bus_locations', frame) / size:9.1f} {json_us:8.2f} {binary_us:10.2f}")
+
+
+async def fanout(args, wire_format):
+    import socketio
+    from utils.broadcast import FLEET_ROOM, LocationBroadcaster, wire_room
+
+    sio = socketio.AsyncServer(async_mode="asgi")
+    sent = {"packets": 0, "bytes": 0}
+
+    async def fake_send(eio_sid, pkt):
+        sent["packets"] += 1
+        data = pkt.data
+        sent["bytes"] += len(data) if isinstance(data, bytes) else 1 + len(data.encode())
+
+    sio._send_eio_packet = fake_send
+    for i in range(args.dashboards):
+        sid = await sio.manager.connect(f"eio-{i}", "/")
+        await sio.enter_room(sid, wire_room(FLEET_ROOM, wire_format))
+
+    rng = random.Random(7)
+    pings = [driver_ping(rng, i) for i in range(args.buses)]
+    broadcaster = LocationBroadcaster(sio)
+    cpu = []
+    for _ in range(args.ticks):
+        for p in pings:
+            broadcaster.push(p)
+        start = time.process_time()
+        await broadcaster.flush()
+        cpu.append(time.process_time() - start)
+    cpu.sort()
+    return cpu[len(cpu) // 2] * 1000, sent["bytes"] / args.ticks, sent["packets"] / args.ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buses", type=int, default=2000)
+    parser.add_argument("--dashboards", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--pings", type=int, default=50000, help="iterations for the per-ping timing")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    ping_costs(rng, args.pings)
+    frame_costs(rng, (1, 10, 100, 1000, args.buses))
+    print(f"fan-out: {args.buses} buses per tick to {args.dashboards} fleet dashboards "
+          f"(median of {args.ticks} ticks)")
+    for wire_format in ("json", "binary"):
+        cpu_ms, sent, packets = asyncio.run(fanout(args, wire_format))
+        print(f"  {wire_format:8s} cpu {cpu_ms:7.2f} ms/tick  {sent / 1e6:7.2f} MB/tick "
+              f"({sent / args.dashboards / args.buses:5.1f} B per position per client)  {packets:,.0f} packets")
+
+
+if __name__ == "__main__":
+    main()
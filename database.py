@@ -1,12 +1,99 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os
+import time
+
+from utils.metrics import db_sessions, instrument_engine
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./transport.db")
-engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+
+# Pool sizing for the request path; SQLite file DBs use a queue pool too
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _async_url(url: str) -> str:
+    # Same database through an asyncio driver
+    for sync, driver in (("sqlite://", "sqlite+aiosqlite://"),
+                         ("postgresql://", "postgresql+asyncpg://"),
+                         ("postgres://", "postgresql+asyncpg://"),
+                         ("mysql://", "mysql+aiomysql://")):
+        if url.startswith(sync):
+            return driver + url[len(sync):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+
+def _pool_args(url: str) -> dict:
+    if ":memory:" in url:
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT, "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True}
+
+
+def _sqlite_pragmas(dbapi_conn, _):
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe with WAL
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-20000")
+    cur.close()
+
+
+engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+                       **_pool_args(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **_pool_args(ASYNC_DATABASE_URL))
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _sqlite_pragmas)
+
+    # pysqlite defers BEGIN until the first write, which breaks SAVEPOINT (bulk imports
+    # use them); let SQLAlchemy emit BEGIN itself, as the SQLAlchemy docs recommend
+    @event.listens_for(engine, "connect")
+    def _sqlite_autocommit_off(dbapi_conn, _):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# Statement timings for /metrics
+instrument_engine(engine, "app")
+instrument_engine(async_engine.sync_engine, "app")
+
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 def init_db():
-    from models import Driver, Student, Route, Lead, Alert, Vehicle
+    from models import Driver, Student, Route, RouteStop, Lead, Alert, Vehicle, Expense, \
+        Payment, PaymentEvent
+    from utils.route_stops import migrate_route_stops
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, so add indexes introduced later
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # Routes saved before RouteStop existed only have their stops as JSON
+    migrate_route_stops(engine)
 
 def get_session():
     return Session(engine)
+
+async def get_async_session():
+    # FastAPI dependency: one session per request, closed when the response is done
+    start = time.perf_counter()
+    async with async_session_maker() as session:
+        try:
+            yield session
+        finally:
+            db_sessions.observe(time.perf_counter() - start)
@@ -1,16 +1,79 @@
 
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import socketio
-from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from routers import finance, routes, chat, drivers, analytics, alerts, students, transport_parent, \
-    payment, trip_tracking, osrm_route
+    payment, trip_tracking, osrm_route, fleet, jobs, telemetry as telemetry_router, metrics as metrics_router
+from database import init_db, async_engine
+from utils.broadcast import LocationBroadcaster, subscription_rooms, client_manager, is_position_room, \
+    wire_room, BINARY_ROOM_PREFIX
+from utils.spatial_index import bus_index
+from utils.osrm_client import osrm
+from utils.telemetry import telemetry
+from utils.eta import eta_engine
+from utils.parent_feed import ParentFeed
+from utils.pagination import CURSOR_HEADER
+from utils.live_state import live_state
+from utils.scheduler import scheduler
+from utils.fleet_jobs import register_fleet_jobs
+from utils.notification_utils import notifier
+from ai import close_llm_client
+from utils.fleet_rollups import fleet_rollups
+from utils.payment_events import payment_events
+from utils.route_stops import stop_cache
+from utils.metrics import METRICS_ENABLED, RequestMetrics, metrics, timed_event
+from utils.wire import WIRE_FORMATS, WIRE_JSON, WIRE_VERSION, decode_ping
+from utils.trip_state import TRIP_STATES, TripTracker, check_ping, reported
+
+# LOG_LEVEL=DEBUG logs every ping; the default keeps logging off the hot path
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per OSRM/Razorpay call otherwise
+log = logging.getLogger("transport")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create any missing tables before serving requests
+    init_db()
+
+    # Start the batched location fan-out, telemetry writer, pooled OSRM client, job scheduler,
+    # notification queue and payment event workers with the event loop
+    broadcaster.start()
+    parent_feed.start()
+    trips.start()
+    telemetry.start()
+    fleet_rollups.start()
+    await live_state.start()
+    await osrm.start()
+    await scheduler.start()
+    notifier.start()
+    payment_events.start()
+    yield
+    await scheduler.stop()
+    await payment_events.stop()
+    await notifier.stop()
+    await broadcaster.stop()
+    await parent_feed.stop()
+    await trips.stop()
+    await telemetry.stop()
+    await fleet_rollups.stop()
+    await live_state.stop()
+    await osrm.close()
+    await close_llm_client()
+    await payment.rzp_client.close()
+    await async_engine.dispose()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 router = APIRouter(prefix="/api/transport/trip", tags=["Trip Tracking"])
-# Include all routers (if you have other API routes)
-app.include_router(router)
+# Include all routers (if you have other API routes); the trip router is included once its routes exist
 app.include_router(finance.router)
 app.include_router(routes.router)
 app.include_router(drivers.router)
@@ -22,11 +85,16 @@ app.include_router(students.router)
 app.include_router(transport_parent.router)
 app.include_router(payment.router)
 app.include_router(osrm_route.router)
+app.include_router(fleet.router)
+app.include_router(telemetry_router.router)
+app.include_router(jobs.router)
+app.include_router(metrics_router.router)
 # ===================== SOCKET.IO SERVER =====================
 # Initialize socket.io server with CORS configuration for WebSocket
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins="*",  # Allow only the frontend to connect
+    client_manager=client_manager(),  # Redis pub/sub when SIO_MESSAGE_QUEUE is set, so workers share rooms
 )
 
 
@@ -41,56 +109,250 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CURSOR_HEADER],  # so browsers can read the next-page cursor
 )
+if METRICS_ENABLED:
+    # Outermost, so the latency includes the other middleware
+    app.add_middleware(RequestMetrics)
 socket_app = socketio.ASGIApp(sio,other_asgi_app=app)
 
+# Buffers the latest ping per bus and emits one batched frame per tick to subscribed rooms
+broadcaster = LocationBroadcaster(sio)
+# Shared per-bus delta frames for parents, replacing polling of the tracking endpoint
+parent_feed = ParentFeed(sio, eta_engine)
+# Per-bus trip state (scheduled / started / at_stop / completed / offline), ping filtering and smoothing
+trips = TripTracker(sio, eta_engine)
 
 
-# In-memory storage for tracking bus locations (for simplicity)
-bus_locations = {}
-scheduler = BackgroundScheduler()
-scheduler.configure({'apscheduler.daemon': False})
-scheduler.configure({'apscheduler.daemonic': False})
-scheduler.start()
+
+# Latest position per bus; shared between workers when LIVE_STATE_URL / SIO_MESSAGE_QUEUE is set.
+# Each sync also feeds buses reporting to other workers into the local spatial index.
+live_state.on_sync(bus_index.sync)
+# ...and answers ETA and trip-state reads for those buses from the snapshots stored with them
+if live_state.shared:
+    eta_engine.shared = trips.shared = live_state
+# Licence, service and stale-bus checks; on a cluster only the elected leader runs them
+register_fleet_jobs(scheduler)
+# Stop arrivals feed on-time % and delay in the analytics rollups
+eta_engine.on_arrival(fleet_rollups.record_arrival)
+# ...and tell the trip state machine which stop a bus is at
+eta_engine.on_arrival(trips.record_arrival)
+
+# Read by GET /metrics at scrape time only
+metrics.gauge("queue_depth", "Items waiting in in-process queues", lambda: {
+    "broadcast": broadcaster.pending, "parent_feed": parent_feed.pending, "trips": trips.pending,
+    "telemetry": telemetry.pending, "rollups": fleet_rollups.pending, "notifications": notifier.pending,
+    "payment_events": payment_events.pending,
+}, ("queue",))
+metrics.gauge("live_buses", "Buses with a known position", lambda: len(live_state))
+metrics.gauge("trip_states", "Buses per trip state", lambda: dict(trips.counts), ("state",))
+pings_rejected = metrics.counter("pings_rejected", "Location updates dropped by validation", ("reason",))
+for _name, _component in (("broadcast", broadcaster), ("parent_feed", parent_feed), ("trips", trips),
+                          ("telemetry", telemetry), ("rollups", fleet_rollups), ("notifications", notifier),
+                          ("payment_events", payment_events),
+                          ("osrm", osrm), ("razorpay", payment.rzp_client), ("stop_cache", stop_cache),
+                          ("live_state", live_state)):
+    metrics.stats(_name, lambda c=_component: getattr(c, "stats", {}))
 
 # Handle mobile location updates from frontend (driver's device)
 @sio.event
+@timed_event
 async def mobile_location_update(sid, data):
-    print(f"Received location from mobile: {data}")  # Debugging log
+    if isinstance(data, (bytes, bytearray)):
+        # Compact drivers send utils/wire.py pings; the rest of the handler sees the same dict
+        try:
+            data = decode_ping(data)
+        except ValueError:
+            pings_rejected.inc("bad_frame")
+            return
+    log.debug("Received location from mobile: %s", data)
+
+    # Check if data contains the expected fields, as numbers in range
+    reason = check_ping(data)
+    if reason:
+        pings_rejected.inc(reason)
+        log.debug("Invalid location data received from %s: %s", sid, reason)
+        return
+
+    bus_id = data["bus_id"]
+    if bus_sids.get(sid) != bus_id:
+        bus_sids[sid] = bus_id
+        bus_connections[bus_id] = sid
+    now = time.time()
+    speed = reported(data.get("speed"))
 
-    # Check if data contains the expected fields
-    if not data.get("bus_id") or not data.get("lat") or not data.get("lng"):
-        print("Error: Invalid location data received.")
+    # Drop GPS jumps and smooth jitter; everything below sees the filtered position
+    trip = trips.on_ping(bus_id, data["lat"], data["lng"], now, speed, reported(data.get("accuracy")),
+                         data.get("route_id"))
+    if trip.rejected:
+        pings_rejected.inc(trip.rejected)
         return
+    lat = data["lat"] = trip.lat
+    lng = data["lng"] = trip.lng
 
-    bus_id = data.get("bus_id")
-    lat = data.get("lat") +1
-    lng = data.get("lng") +1
+    bus_index.update(bus_id, lat, lng)
 
-    # Store or update the bus's location in-memory
-    bus_locations[bus_id] = {"lat": lat, "lng": lng}
+    # Append to trip history; written in batches off the event loop
+    telemetry.record(bus_id, lat, lng, speed=speed, heading=reported(data.get("heading")))
 
-    # Broadcast the updated location to all connected clients (e.g., admin dashboard)
-    await sio.emit("mobile_location_update", data)
+    # Recompute this bus's ETAs now so parent lookups are O(1)
+    state = eta_engine.on_ping(bus_id, lat, lng, now, speed_kmph=speed, route_id=data.get("route_id"))
+    # Store or update the bus's location in the live state. When it is shared, the ETA and
+    # trip state go with it so other workers can answer tracking and trip-state requests
+    position = {"lat": lat, "lng": lng, "ts": now}
+    if live_state.shared:
+        position["eta"] = eta_engine.published(bus_id)
+        position["trip"] = trips.snapshot(bus_id)
+    live_state.set(bus_id, position)
+    # Per bus / route / day analytics deltas, upserted in the background
+    fleet_rollups.record_ping(bus_id, lat, lng, state.ts, state.route_id)
+    parent_feed.mark(bus_id)
+
+    # Queue the location for the next batched broadcast to subscribed dashboards
+    broadcaster.push(data)
+
+
+def _format_error(wire):
+    if wire not in WIRE_FORMATS:
+        return {"status": "error", "detail": f"format must be one of {', '.join(WIRE_FORMATS)}"}
+    return None
+
+
+# Negotiated payload format per connected client; absent means JSON
+wire_formats = {}
+# Bus each driver connection reports for, and the connection each bus last reported on,
+# so a disconnect cleans up after its bus unless the driver already reconnected
+bus_sids = {}
+bus_connections = {}
+
+
+async def _set_wire_format(sid, wire: str):
+    previous = wire_formats.get(sid, WIRE_JSON)
+    wire_formats[sid] = wire
+    if previous == wire:
+        return
+    # Move existing subscriptions to the rooms of the new format
+    for room in sio.rooms(sid):
+        if is_position_room(room):
+            await sio.leave_room(sid, room)
+            await sio.enter_room(sid, wire_room(room.removeprefix(BINARY_ROOM_PREFIX), wire))
+
+
+# Dashboards choose how positions reach them: {"format": "binary"} for utils/wire.py frames
+# (bytes), JSON otherwise. Can also be passed along with subscribe.
+@sio.event
+@timed_event
+async def wire_format(sid, data=None):
+    wire = (data or {}).get("format", WIRE_JSON)
+    error = _format_error(wire)
+    if error:
+        return error
+    await _set_wire_format(sid, wire)
+    return {"status": "ok", "format": wire, "version": WIRE_VERSION}
+
+
+# Dashboards subscribe to a bus, route or school ({"route_id": 5}); no filter means the whole fleet
+@sio.event
+@timed_event
+async def subscribe(sid, data=None):
+    wire = (data or {}).get("format")
+    if wire is not None:
+        error = _format_error(wire)
+        if error:
+            return error
+        await _set_wire_format(sid, wire)
+    else:
+        wire = wire_formats.get(sid, WIRE_JSON)
+    rooms = subscription_rooms(data)
+    for room in rooms:
+        await sio.enter_room(sid, wire_room(room, wire))
+    return {"status": "subscribed", "rooms": rooms, "format": wire}
+
+
+@sio.event
+@timed_event
+async def unsubscribe(sid, data=None):
+    rooms = subscription_rooms(data)
+    for room in rooms:
+        for wire in WIRE_FORMATS:
+            await sio.leave_room(sid, wire_room(room, wire))
+    return {"status": "unsubscribed", "rooms": rooms}
+
+
+# Parents subscribe once per student ({"student_id": "STU12345"}) and get a snapshot back,
+# then "tracking_update" deltas for the student's bus
+@sio.event
+@timed_event
+async def parent_subscribe(sid, data=None):
+    student_id = (data or {}).get("student_id")
+    try:
+        snapshot = transport_parent.build_tracking_info(student_id)
+    except HTTPException as e:
+        return {"status": "error", "detail": e.detail}
+    bus_id = transport_parent.STUDENTS[student_id]["bus_id"]
+    await parent_feed.subscribe(sid, bus_id, snapshot)
+    return {"status": "subscribed", "snapshot": snapshot}
+
+
+@sio.event
+@timed_event
+async def parent_unsubscribe(sid, data=None):
+    student = transport_parent.STUDENTS.get((data or {}).get("student_id"))
+    if student:
+        await parent_feed.unsubscribe(sid, student["bus_id"])
+    return {"status": "unsubscribed"}
 
 
 # Notify when a bus starts the trip
 @router.post("/notify_start")
 async def notify_trip_start(bus_id: str):
+    trips.start_trip(bus_id)
     # Notify all clients when a bus starts its trip
     await sio.emit("trip_started", {"bus_id": bus_id, "message": "Trip has started!"})
+    # And a push to the parents of every student on this bus, sent in batches by the notifier
+    students = [sid for sid, s in transport_parent.STUDENTS.items() if s["bus_id"] == bus_id]
+    notifier.notify_many(students, "Trip started", f"Bus {bus_id} has started the trip.", {"bus_id": bus_id})
     return {"status": "success", "message": f"Bus {bus_id} has started the trip."}
 
+
+@router.get("/states")
+async def get_trip_states(state: Optional[str] = Query(None, description=", ".join(TRIP_STATES))):
+    """Trip state of every bus (on every worker with a shared live state), optionally only those in one state."""
+    if state is not None and state not in TRIP_STATES:
+        raise HTTPException(status_code=422, detail=f"state must be one of {', '.join(TRIP_STATES)}")
+    return {"counts": trips.fleet_counts(), "trips": trips.all(state)}
+
+
+@router.get("/{bus_id}/state")
+async def get_trip_state(bus_id: str):
+    snapshot = trips.snapshot(bus_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Bus not seen")
+    return snapshot
+
+
+app.include_router(router)
+
 @app.get("/")
 def read_root():
     return {"message": "Hello World"}
 
 # Handle disconnects (optional cleanup)
 @sio.event
-async def disconnect(sid):
-    print(f"Device disconnected: {sid}")
-    # Remove bus from in-memory storage
-    bus_locations.pop(sid, None)
+@timed_event
+async def disconnect(sid, reason=None):
+    log.debug("Device disconnected: %s (%s)", sid, reason)
+    wire_formats.pop(sid, None)
+    # Remove the driver's bus from the live state; dashboards and parents have no bus
+    bus_id = bus_sids.pop(sid, None)
+    if bus_id is not None and bus_connections.get(bus_id) == sid:
+        del bus_connections[bus_id]
+        trips.mark_offline(bus_id)
+        live_state.remove(bus_id)
+        bus_index.remove(bus_id)
+        # No stale ETAs or delay status for a bus that stopped reporting
+        eta_engine.remove(bus_id)
+        parent_feed.mark(bus_id)
 # ===================== START SERVER =====================
 if __name__ == "__main__":
     import uvicorn
@@ -1,13 +1,14 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
-from datetime import datetime
+from sqlalchemy import Index
+from datetime import date, datetime, time
 
 class Driver(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     phone: Optional[str]
     license_number: Optional[str]
-    license_expiry: Optional[datetime]
+    license_expiry: Optional[datetime] = Field(default=None, index=True)
     training_records: Optional[str]  # JSON string or text
     behavior_score: Optional[float] = 0.0
 
@@ -15,15 +16,15 @@ class Vehicle(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     reg_no: str
     capacity: Optional[int] = 0
-    last_service_date: Optional[datetime]
+    last_service_date: Optional[datetime] = Field(default=None, index=True)
 
 class Student(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    roll_no: Optional[str]
+    roll_no: Optional[str] = Field(default=None, index=True)
     parent_contact: Optional[str]
-    route_id: Optional[int] = Field(default=None, foreign_key="route.id")
-    rfid_tag: Optional[str]
+    route_id: Optional[int] = Field(default=None, foreign_key="route.id", index=True)
+    rfid_tag: Optional[str] = Field(default=None, index=True)
     face_model_ref: Optional[str]
     # attendance stored elsewhere / or aggregated
 
@@ -31,18 +32,80 @@ class Route(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     stops: Optional[str]  # JSON array text: [{"lat":..,"lon":..,"name":..}]
-    assigned_vehicle_id: Optional[int] = Field(default=None, foreign_key="vehicle.id")
-    assigned_driver_id: Optional[int] = Field(default=None, foreign_key="driver.id")
-    estimated_time_min: Optional[int]
+    assigned_vehicle_id: Optional[int] = Field(default=None, foreign_key="vehicle.id", index=True)
+    assigned_driver_id: Optional[int] = Field(default=None, foreign_key="driver.id", index=True)
+    estimated_time_min: Optional[int] = None
     active: bool = True
 
+class RouteStop(SQLModel, table=True):
+    # One row per stop, in order; Route.stops keeps the JSON as submitted
+    __table_args__ = (Index("ix_routestop_route_seq", "route_id", "seq", unique=True),
+                      Index("ix_routestop_lat_lon", "lat", "lon"))
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    route_id: int = Field(foreign_key="route.id")
+    seq: int
+    lat: float
+    lon: float
+    name: Optional[str] = None
+    offset_min: Optional[float] = None  # minutes after trip start
+    scheduled_time: Optional[time] = None
+
 class Alert(SQLModel, table=True):
+    # Listing is newest first, optionally per type; both walk these indexes
+    __table_args__ = (Index("ix_alert_type_created_id", "alert_type", "created_at", "id"),
+                      Index("ix_alert_created_id", "created_at", "id"))
+
     id: Optional[int] = Field(default=None, primary_key=True)
     alert_type: str
     message: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     meta_info: Optional[str]
 
+class Expense(SQLModel, table=True):
+    # Listed newest first, optionally per vehicle; totals per vehicle / category
+    # over a date range are answered from these covering indexes alone
+    __table_args__ = (Index("ix_expense_spent_on_id", "spent_on", "id", "amount"),
+                      Index("ix_expense_vehicle_spent_on", "vehicle_number", "spent_on", "amount"),
+                      Index("ix_expense_category_spent_on", "category", "spent_on", "amount"))
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    vehicle_number: str  # Vehicle.reg_no; cost per km matches it to the bus_id in telemetry
+    category: str
+    amount: float
+    spent_on: date
+    notes: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Payment(SQLModel, table=True):
+    # One row per Razorpay payment, written by the payment event workers
+    id: Optional[int] = Field(default=None, primary_key=True)
+    payment_id: str = Field(index=True, unique=True)
+    order_id: Optional[str] = Field(default=None, index=True)
+    student_id: Optional[str] = Field(default=None, index=True)
+    amount: Optional[int] = None  # paise
+    currency: Optional[str] = None
+    method: Optional[str] = None
+    status: str
+    last_event: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PaymentEvent(SQLModel, table=True):
+    # Durable queue of webhook / verify events; unprocessed rows are picked up in id order
+    __table_args__ = (Index("ix_paymentevent_processed_id", "processed_at", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_id: str = Field(index=True, unique=True)
+    event: str
+    payload: str
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    claimed_by: Optional[str] = None
+    claimed_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
 # Simple lead example for CRM-like functionality
 class Lead(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
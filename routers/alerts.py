@@ -1,10 +1,39 @@
-from fastapi import APIRouter
-from database import get_session
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session, async_session_maker
 from models import Alert
+from utils.pagination import MAX_PAGE_SIZE, ndjson, paginate
+
+router = APIRouter(prefix="/api/transport/alerts", tags=["Alerts"])
 
-router = APIRouter()
+# Newest first; id breaks ties between alerts created in the same instant
+ORDER = [Alert.created_at, Alert.id]
 
 @router.get("/")
-def list_alerts():
-    with get_session() as s:
-        return s.exec(select(Alert)).all()
+async def list_alerts(
+        response: Response,
+        alert_type: Optional[str] = None,
+        since: Optional[datetime] = Query(None, description="Only alerts created at or after this time"),
+        until: Optional[datetime] = Query(None, description="Only alerts created before this time"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: Literal["json", "ndjson"] = "json",
+        s: AsyncSession = Depends(get_async_session),
+):
+    """Alerts newest first; the next page's cursor is in X-Next-Cursor. format=ndjson streams every match."""
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    stmt = select(Alert)
+    if alert_type is not None:
+        stmt = stmt.where(Alert.alert_type == alert_type)
+    if since is not None:
+        stmt = stmt.where(Alert.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Alert.created_at < until)
+    if format == "ndjson":
+        return ndjson(async_session_maker, stmt, ORDER, cursor, limit, descending=True)
+    return await paginate(s, stmt, ORDER, cursor, limit, response, descending=True)
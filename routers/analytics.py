@@ -1,9 +1,33 @@
-from fastapi import APIRouter
-from typing import Dict
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlmodel import func, select
+
+from database import get_session
+from models import Route
+from utils.fleet_rollups import day_range, fleet_rollups
 
 router = APIRouter()
 
 @router.get("/lead-summary")
-def lead_summary():
-    # placeholder sample summary
-    return {"total_routes": 12, "on_time_pct": 92, "avg_delay_min": 6}
+def lead_summary(
+        start: Optional[date] = Query(None, description="First UTC day, defaults to 6 days before end"),
+        end: Optional[date] = Query(None, description="Last UTC day, defaults to today"),
+        group_by: Literal["none", "bus", "route", "day"] = "none",
+        route_id: Optional[int] = None,
+        bus_id: Optional[str] = None,
+):
+    """
+    Fleet KPIs from the per bus / route / day rollups: on-time % and average
+    delay over scheduled stop arrivals, distance driven, and utilization
+    (hours in service over FLEET_SERVICE_HOURS per bus per day).
+    Figures lag live pings by up to ROLLUP_FLUSH_SECONDS.
+    """
+    start, end = day_range(start, end)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    with get_session() as s:
+        total_routes = s.exec(select(func.count()).select_from(Route)).one()
+    return {"total_routes": total_routes,
+            **fleet_rollups.summary(start, end, group_by, route_id=route_id, bus_id=bus_id)}
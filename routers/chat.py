@@ -1,18 +1,25 @@
 # routes/ai_chat.py
+import json
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
-from ai import call_llm_for_chat, CHAT_PROMPT
+from ai import call_llm_for_chat, stream_llm_for_chat, CHAT_PROMPT
+from utils.chat_context import chat_cache, context_builder, estimate_tokens
 
 router = APIRouter(prefix="/api/ai", tags=["AI"])
 
 class ChatRequest(BaseModel):
     message: str
     context: Optional[str] = ""
+    stream: bool = False  # reply as Server-Sent Events instead of one JSON body
 
 class ChatResponse(BaseModel):
     reply: str
     raw: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    context_tokens: Optional[int] = None
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -20,14 +27,66 @@ async def chat(req: ChatRequest):
     """
     Handles AI chat requests for Transport Management System.
     Uses Groq (or mock) backend defined in ai.py.
+
+    Repeated questions are answered from a short-lived cache. Otherwise the
+    prompt carries route, alert and live-delay summaries from the DB, kept
+    within the context token budget.
+
+    With "stream": true the reply arrives as text/event-stream: one
+    `data: {"delta": "..."}` event per chunk, then `data: [DONE]`.
     """
+    key = chat_cache.key(req.message, req.context)
+    hit = chat_cache.get(key)
+    if hit is not None:
+        if req.stream:
+            return _event_stream(_replay(hit["reply"]))
+        return ChatResponse(reply=hit["reply"], raw={"cached": True, "tokens_saved": hit["tokens"]}, cached=True)
+
     # Build formatted prompt
-    prompt = CHAT_PROMPT.format(context=req.context or "General Transport Context", prompt=req.message)
+    context, context_tokens = await context_builder.build(req.message, req.context)
+    prompt = CHAT_PROMPT.format(context=context or "General Transport Context", prompt=req.message)
+
+    if req.stream:
+        return _event_stream(_sse(prompt, key))
 
     # Call the AI
     result = await call_llm_for_chat(prompt)
 
     # Extract main reply
     reply_text = result.get("text", "[Error: No reply generated]")
+    if "text" in result:
+        usage = (result.get("raw") or {}).get("usage") or {}
+        chat_cache.put(key, reply_text, usage.get("total_tokens") or estimate_tokens(prompt + reply_text))
+
+    return ChatResponse(reply=reply_text, raw=result.get("raw"), context_tokens=context_tokens)
+
+
+@router.get("/chat/stats")
+async def chat_stats():
+    """Reply cache hit rate and LLM tokens saved by it."""
+    return chat_cache.stats()
+
+
+def _event_stream(events):
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def _replay(reply: str):
+    yield f"data: {json.dumps({'delta': reply, 'cached': True})}\n\n"
+    yield "data: [DONE]\n\n"
+
 
-    return ChatResponse(reply=reply_text, raw=result.get("raw"))
+async def _sse(prompt: str, key: str):
+    parts = []
+    try:
+        async for delta in stream_llm_for_chat(prompt):
+            parts.append(delta)
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    else:
+        reply = "".join(parts)
+        chat_cache.put(key, reply, estimate_tokens(prompt + reply))
+    yield "data: [DONE]\n\n"
@@ -1,18 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from database import get_session
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session, async_session_maker
 from models import Driver
 from schemas import DriverCreate, DriverRead
+from utils.bulk_import import bulk_import
+from utils.pagination import MAX_PAGE_SIZE, ndjson, paginate
 
-router = APIRouter()
+router = APIRouter(prefix="/api/transport/drivers", tags=["Drivers"])
 
 @router.post("/", response_model=DriverRead)
-def create_driver(payload: DriverCreate):
-    with get_session() as s:
-        d = Driver(**payload.dict())
-        s.add(d); s.commit(); s.refresh(d)
-        return d
+async def create_driver(payload: DriverCreate, s: AsyncSession = Depends(get_async_session)):
+    d = Driver.model_validate(payload.dict())
+    s.add(d); await s.commit(); await s.refresh(d)
+    return d
+
+@router.post("/bulk")
+async def bulk_import_drivers(
+        request: Request,
+        format: Optional[Literal["csv", "jsonl"]] = Query(None, description="Defaults from Content-Type"),
+        upsert_on: Optional[Literal["license_number", "phone"]] = Query(None, description="Update rows that already have this value"),
+        all_or_nothing: bool = False,
+):
+    """Import a CSV (with header row) or JSON-lines request body; returns counts and per-row errors."""
+    return await bulk_import(request, DriverCreate, Driver, format, upsert_on, all_or_nothing)
 
 @router.get("/", response_model=list[DriverRead])
-def list_drivers():
-    with get_session() as s:
-        return s.exec(select(Driver)).all()
+async def list_drivers(
+        response: Response,
+        license_expiring_before: Optional[datetime] = None,
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: Literal["json", "ndjson"] = "json",
+        s: AsyncSession = Depends(get_async_session),
+):
+    """Drivers by id; the next page's cursor is in X-Next-Cursor. format=ndjson streams every match."""
+    stmt = select(Driver)
+    if license_expiring_before is not None:
+        stmt = stmt.where(Driver.license_expiry < license_expiring_before)
+    if format == "ndjson":
+        return ndjson(async_session_maker, stmt, [Driver.id], cursor, limit)
+    return await paginate(s, stmt, [Driver.id], cursor, limit, response)
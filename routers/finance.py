@@ -1,70 +1,91 @@
+from datetime import date
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import BaseModel, ConfigDict, Field
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session
+from models import Expense
+from utils.expense_ledger import cost_per_km, expense_filters, expense_totals
+from utils.fleet_rollups import day_range
+from utils.pagination import MAX_PAGE_SIZE, paginate
 
 router = APIRouter()
 
-class Expense(BaseModel):
+# Newest first; id breaks ties between expenses on the same day
+ORDER = [Expense.spent_on, Expense.id]
+
+
+class ExpenseIn(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     vehicleNumber: str
     category: str
     amount: float
-    date: str
-    notes: str | None = None
-
-# 🧾 Mock data for testing (pre-filled)
-expenses = [
-    Expense(
-        vehicleNumber="TS09AB1234",
-        category="Fuel",
-        amount=4200.50,
-        date="2025-11-01",
-        notes="Diesel refill - 60L"
-    ),
-    Expense(
-        vehicleNumber="TS09AB5678",
-        category="Maintenance",
-        amount=8500.00,
-        date="2025-10-28",
-        notes="Brake pad and oil change"
-    ),
-    Expense(
-        vehicleNumber="TS09AB7890",
-        category="Tyres",
-        amount=12500.00,
-        date="2025-10-20",
-        notes="Replaced 2 rear tyres"
-    ),
-    Expense(
-        vehicleNumber="TS09AB1234",
-        category="Insurance",
-        amount=18000.00,
-        date="2025-09-15",
-        notes="Annual insurance renewal"
-    ),
-    Expense(
-        vehicleNumber="TS09AB5678",
-        category="Other",
-        amount=1500.00,
-        date="2025-11-02",
-        notes="Driver uniform and cleaning supplies"
-    ),
-    Expense(
-        vehicleNumber="TS09AB9876",
-        category="Fuel",
-        amount=3900.00,
-        date="2025-11-03",
-        notes="Diesel refill - 55L"
-    ),
-]
+    spent_on: date = Field(alias="date")
+    notes: Optional[str] = None
+
+
+class ExpenseOut(ExpenseIn):
+    id: int
+
+
+def _out(row: Expense) -> ExpenseOut:
+    return ExpenseOut(id=row.id, vehicleNumber=row.vehicle_number, category=row.category,
+                      amount=row.amount, spent_on=row.spent_on, notes=row.notes)
+
 
 @router.get("/api/transport/finance")
-def get_expenses() -> List[Expense]:
-    """Return all mock transport expenses."""
-    return expenses
+async def get_expenses(
+        response: Response,
+        vehicle: Optional[str] = None,
+        category: Optional[str] = None,
+        start: Optional[date] = Query(None, description="Only expenses on or after this day"),
+        end: Optional[date] = Query(None, description="Only expenses on or before this day"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        s: AsyncSession = Depends(get_async_session),
+) -> List[ExpenseOut]:
+    """Expenses newest first; the next page's cursor is in X-Next-Cursor."""
+    stmt = select(Expense).where(*expense_filters(start, end, vehicle, category))
+    rows = await paginate(s, stmt, ORDER, cursor, limit, response, descending=True)
+    return [_out(row) for row in rows]
+
 
 @router.post("/api/transport/finance/add")
-def add_expense(exp: Expense):
+async def add_expense(exp: ExpenseIn, s: AsyncSession = Depends(get_async_session)):
     """Add a new expense record."""
-    expenses.append(exp)
-    return {"message": "Expense added successfully", "data": exp}
+    row = Expense(vehicle_number=exp.vehicleNumber, category=exp.category, amount=exp.amount,
+                  spent_on=exp.spent_on, notes=exp.notes)
+    s.add(row)
+    await s.commit()
+    return {"message": "Expense added successfully", "data": _out(row)}
+
+
+@router.get("/api/transport/finance/summary")
+def expense_summary(
+        group_by: Literal["vehicle", "category", "month"] = "vehicle",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        vehicle: Optional[str] = None,
+        category: Optional[str] = None,
+):
+    """Total and count of expenses per vehicle, category or month."""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return expense_totals(group_by, start, end, vehicle=vehicle, category=category)
+
+
+@router.get("/api/transport/finance/cost-per-km")
+def expense_cost_per_km(
+        start: Optional[date] = Query(None, description="First UTC day, defaults to 29 days before end"),
+        end: Optional[date] = Query(None, description="Last UTC day, defaults to today"),
+        vehicle: Optional[str] = None,
+):
+    """Expenses over distance driven (from the telemetry rollups), per vehicle and fleet-wide."""
+    start, end = day_range(start, end, default_days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return cost_per_km(start, end, vehicle=vehicle)
@@ -0,0 +1,43 @@
+# routers/fleet.py
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.eta import eta_engine
+from utils.spatial_index import nearby_buses, buses_within
+
+router = APIRouter(prefix="/api/transport/fleet", tags=["Fleet"])
+
+
+@router.get("/nearby")
+async def get_nearby_buses(
+        lat: float = Query(...),
+        lng: float = Query(...),
+        k: int = Query(5, ge=1, le=100),
+        radius_m: Optional[float] = Query(None, gt=0),
+):
+    """
+    Nearest live buses to a point (e.g. a stop or a parent's location).
+    With radius_m set, only buses inside that circle are returned.
+    """
+    radius_km = radius_m / 1000 if radius_m else None
+    return {"buses": nearby_buses(lat, lng, k=k, radius_km=radius_km)}
+
+
+@router.get("/geofence")
+async def get_buses_in_geofence(
+        lat: float = Query(...),
+        lng: float = Query(...),
+        radius_m: float = Query(500, gt=0),
+):
+    """All live buses inside a circular geofence, nearest first."""
+    return {"buses": buses_within(lat, lng, radius_m / 1000)}
+
+
+@router.get("/{bus_id}/next-stop")
+async def get_next_stop(bus_id: str):
+    """The stop a live bus is heading to, with its ETA in minutes."""
+    result = eta_engine.next_stop(bus_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Bus not live")
+    return result
@@ -0,0 +1,12 @@
+# routers/jobs.py
+from fastapi import APIRouter
+
+from utils.scheduler import scheduler
+
+router = APIRouter(prefix="/api/transport/jobs", tags=["Scheduled Jobs"])
+
+
+@router.get("/")
+async def get_job_metrics():
+    """Per-job run counts, timings (ms), overruns and last result; leader says whether this worker runs them."""
+    return scheduler.metrics()
@@ -0,0 +1,42 @@
+# routers/metrics.py
+import asyncio
+import threading
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import CONTENT_TYPE, METRICS_ENABLED, PROFILER_ENABLED, SamplingProfiler, metrics
+
+router = APIRouter(tags=["Metrics"])
+
+_profiling = asyncio.Lock()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition: latency histograms, queue depths and component counters."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/metrics/profile", include_in_schema=False)
+async def get_profile(seconds: float = Query(10, gt=0, le=120), interval_ms: float = Query(5, ge=1, le=1000),
+                      top: int = Query(200, ge=1)):
+    """
+    Samples the event-loop thread for `seconds` and returns folded stacks
+    (flamegraph.pl / speedscope input). Needs PROFILER_ENABLED.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    if _profiling.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profiling:
+        # This handler runs on the loop thread, which is the one serving sockets and requests
+        profiler = SamplingProfiler(threading.get_ident(), interval=interval_ms / 1000)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    return PlainTextResponse(f"# {profiler.samples} samples every {interval_ms:g} ms\n" + profiler.folded(top))
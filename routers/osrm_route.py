@@ -1,10 +1,29 @@
 # backend/routes/osrm_route.py
-from fastapi import APIRouter, Query
-import httpx
+import asyncio
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from utils.osrm_client import osrm, OsrmError
+from utils.route_stops import stop_cache
 
 router = APIRouter(prefix="/api/osrm", tags=["OSRM Routing"])
 
-OSRM_BASE_URL = "https://router.project-osrm.org"
+OSRM_TABLE_MAX_POINTS = 1000
+
+
+class TableRequest(BaseModel):
+    coordinates: Optional[List[Tuple[float, float]]] = None  # [[lat, lng], ...]
+    route_id: Optional[int] = None
+
+
+def _route_points(route_id: int):
+    shape = stop_cache.get(route_id)
+    if shape is None:
+        return None
+    return list(zip(shape.lats.tolist(), shape.lons.tolist()))
+
 
 @router.get("/route")
 async def get_route(
@@ -14,28 +33,42 @@ async def get_route(
         end_lng: float = Query(...),
 ):
     """
-    Get route between two coordinates using OSRM (public server).
+    Get route between two coordinates using OSRM (OSRM_BASE_URL, public server by default).
+    Served from the shared route cache when the same leg was requested recently.
     """
     try:
-        url = (
-            f"{OSRM_BASE_URL}/route/v1/driving/"
-            f"{start_lng},{start_lat};{end_lng},{end_lat}"
-            f"?overview=full&geometries=geojson"
-        )
-
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            data = response.json()
-
-        if data.get("code") != "Ok":
-            return {"error": "OSRM failed", "details": data}
-
-        route = data["routes"][0]
-        return {
-            "distance_km": round(route["distance"] / 1000, 2),
-            "duration_min": round(route["duration"] / 60, 2),
-            "geometry": route["geometry"],
-        }
-
+        return await osrm.route(start_lat, start_lng, end_lat, end_lng)
+    except OsrmError as e:
+        return {"error": str(e), "details": e.details}
     except Exception as e:
         return {"error": str(e)}
+
+
+@router.post("/table")
+async def get_table(req: TableRequest):
+    """
+    Duration/distance matrix between many points, or between the stops of a Route.
+    Uses one OSRM table call per block, the shared route cache, and a haversine
+    estimate when OSRM is unavailable.
+    """
+    if req.route_id is not None:
+        points = await asyncio.to_thread(_route_points, req.route_id)
+        if points is None:
+            raise HTTPException(status_code=404, detail="Route not found or has no stops")
+    elif req.coordinates:
+        points = req.coordinates
+    else:
+        raise HTTPException(status_code=400, detail="Provide coordinates or route_id")
+
+    if len(points) < 2:
+        raise HTTPException(status_code=400, detail="At least two points are required")
+    if len(points) > OSRM_TABLE_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {OSRM_TABLE_MAX_POINTS} points are supported")
+
+    return await osrm.table(points)
+
+
+@router.get("/stats")
+async def get_osrm_stats():
+    """Cache hit rate, collapsed requests and upstream latency for the OSRM client."""
+    return osrm.metrics()
@@ -2,10 +2,18 @@
 import os
 import hmac
 import hashlib
-from fastapi import APIRouter, HTTPException, Request, Header
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Header
 from pydantic import BaseModel
 from typing import Dict, Any
 from dotenv import load_dotenv
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session
+from models import Payment
+from utils.payment_events import event_key, payment_events
+from utils.razorpay_client import RazorpayClient, RazorpayError
 
 load_dotenv()
 
@@ -13,11 +21,15 @@ RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
 RZP_WEBHOOK_SECRET = os.getenv("RZP_WEBHOOK_SECRET", "")
 
-if not (RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET):
-    raise RuntimeError("RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET must be set in env")
+# Pooled async client with timeouts; its connection pool is opened on the
+# first order and closed by the app lifespan
+rzp_client = RazorpayClient(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)
+
 
-import razorpay
-rzp_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+def require_razorpay():
+    # Checked per request so the app (and every other router) still starts without keys
+    if not (RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET):
+        raise HTTPException(status_code=503, detail="Payments are not configured")
 
 router = APIRouter(prefix="/api/transport", tags=["transport-payments"])
 
@@ -29,8 +41,8 @@ class CreateOrderRequest(BaseModel):
     receipt: str = None  # optional
 
 # frontend will call this to create order
-@router.post("/opt/{studentId}")
-def create_order(studentId: str, body: CreateOrderRequest):
+@router.post("/opt/{studentId}", dependencies=[Depends(require_razorpay)])
+async def create_order(studentId: str, body: CreateOrderRequest):
     # compute amount in paise (Razorpay uses smallest currency unit)
     amount_paise = int(round(body.planAmount * 100))
     receipt_id = body.receipt or f"transport_{studentId}_{os.urandom(4).hex()}"
@@ -45,9 +57,11 @@ def create_order(studentId: str, body: CreateOrderRequest):
         },
     }
     try:
-        order = rzp_client.order.create(data=order_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Razorpay order creation failed: {e}")
+        order = await rzp_client.create_order(order_data)
+    except RazorpayError as e:
+        # Our request was rejected (4xx) vs Razorpay being slow or down
+        status = 502 if e.status_code is None or e.status_code >= 500 else 400
+        raise HTTPException(status_code=status, detail=f"Razorpay order creation failed: {e}")
 
     # Return order details to frontend
     return {
@@ -69,8 +83,8 @@ class VerifyPayload(BaseModel):
     studentId: str
     planAmount: float
 
-@router.post("/verify_payment")
-def verify_payment(payload: VerifyPayload):
+@router.post("/verify_payment", dependencies=[Depends(require_razorpay)])
+async def verify_payment(payload: VerifyPayload):
     # Verify signature per Razorpay docs
     generated_signature = hmac.new(
         bytes(RAZORPAY_KEY_SECRET, "utf-8"),
@@ -78,20 +92,25 @@ def verify_payment(payload: VerifyPayload):
         digestmod=hashlib.sha256,
     ).hexdigest()
 
-    if generated_signature != payload.razorpay_signature:
+    if not hmac.compare_digest(generated_signature, payload.razorpay_signature):
         raise HTTPException(status_code=400, detail="Invalid payment signature")
 
-    # At this point payment is verified. Persist in DB:
-    # - mark student as opted (isOpted=True)
-    # - store payment record: payment id, order id, amount, method, timestamp
-    # For demo, return success
-    # TODO: replace with actual DB save logic
+    # Recorded through the same queue as webhooks; a later payment.captured moves it forward
+    event = {"event": "payment.verified", "payload": {"payment": {"entity": {
+        "id": payload.razorpay_payment_id,
+        "order_id": payload.razorpay_order_id,
+        "status": "verified",
+        "amount": int(round(payload.planAmount * 100)),
+        "notes": {"studentId": payload.studentId},
+    }}}}
+    await payment_events.put(f"verify:{payload.razorpay_payment_id}", event["event"], json.dumps(event))
 
     return {"success": True, "message": "Payment verified and opt-in completed"}
 
 # Razorpay webhook receiver (optional): verify header and signature
 @router.post("/webhook")
-async def rzp_webhook(request: Request, x_razorpay_signature: str = Header(None)):
+async def rzp_webhook(request: Request, x_razorpay_signature: str = Header(None),
+                      x_razorpay_event_id: str = Header(None)):
     body = await request.body()
     # verify signature
     if not RZP_WEBHOOK_SECRET:
@@ -103,11 +122,34 @@ async def rzp_webhook(request: Request, x_razorpay_signature: str = Header(None)
         digestmod=hashlib.sha256
     ).hexdigest()
 
-    if generated != x_razorpay_signature:
+    if not hmac.compare_digest(generated, x_razorpay_signature or ""):
         raise HTTPException(status_code=400, detail="Webhook signature mismatch")
 
-    # process webhook JSON
-    event = await request.json()
-    # example: handle payment.captured event
-    # TODO: process event -> update DB
-    return {"received": True, "event": event.get("event")}
+    # Parse the bytes already read; request.json() would decode the body again
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body is not JSON")
+    if not isinstance(event, dict):
+        # A 5xx would make Razorpay retry it forever
+        raise HTTPException(status_code=400, detail="Webhook body is not a JSON object")
+
+    # Acknowledge once the event is durably queued; workers update payments in batches.
+    # Razorpay retries reuse the event id, so they are acknowledged without queueing twice.
+    event_id = x_razorpay_event_id or event_key(event, body)
+    fresh = await payment_events.put(event_id, event.get("event") or "", body.decode("utf-8"))
+    return {"received": True, "event": event.get("event"), "duplicate": not fresh}
+
+
+@router.get("/payments/queue")
+async def payment_queue_stats():
+    """Webhook queue counters and acknowledgement latency."""
+    return {**payment_events.metrics(), "razorpay": rzp_client.metrics()}
+
+
+@router.get("/payments/{payment_id}")
+async def get_payment(payment_id: str, s: AsyncSession = Depends(get_async_session)):
+    payment = (await s.exec(select(Payment).where(Payment.payment_id == payment_id))).first()
+    if payment is None:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return payment
@@ -1,20 +1,120 @@
-from fastapi import APIRouter
-from select import select
+import asyncio
+import json
+from typing import Any, Dict, List, Literal, Optional
 
-from database import get_session
-from models import Route
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import delete, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session, async_session_maker
+from models import Route, RouteStop
 from schemas import RouteCreate, RouteRead
+from utils.bulk_import import bulk_import
+from utils.pagination import MAX_PAGE_SIZE, ndjson, paginate
+from utils.route_stops import replace_route_stops, routes_near, stop_cache, stop_rows
+
+router = APIRouter(prefix="/api/transport/routes", tags=["Routes"])
+
+def _checked_stop_rows(route_id, stops) -> List[Dict[str, Any]]:
+    try:
+        return stop_rows(route_id, stops)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid stops: {e}")
+
+
+async def _write_stops(s: AsyncSession, route_id: int, rows: List[Dict[str, Any]]):
+    await s.exec(delete(RouteStop).where(RouteStop.route_id == route_id))
+    if rows:
+        await s.exec(insert(RouteStop), params=rows)
 
-router = APIRouter()
 
 @router.post("/", response_model=RouteRead)
-def create_route(payload: RouteCreate):
-    with get_session() as s:
-        r = Route(**payload.dict())
-        s.add(r); s.commit(); s.refresh(r)
-        return r
+async def create_route(payload: RouteCreate, s: AsyncSession = Depends(get_async_session)):
+    r = Route.model_validate(payload.dict())
+    rows = _checked_stop_rows(None, r.stops)
+    s.add(r); await s.flush()
+    await _write_stops(s, r.id, [{**row, "route_id": r.id} for row in rows])
+    await s.commit(); await s.refresh(r)
+    stop_cache.invalidate([r.id])
+    return r
+
+@router.put("/{route_id}/stops")
+async def replace_stops(route_id: int, stops: List[Dict[str, Any]] = Body(...),
+                        s: AsyncSession = Depends(get_async_session)):
+    """Replace a route's stops ([{"lat", "lon", "name", "offset_min", "scheduled_time"}, ...]) in order."""
+    r = await s.get(Route, route_id)
+    if r is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    rows = _checked_stop_rows(route_id, stops)
+    r.stops = json.dumps(stops)
+    s.add(r)
+    await _write_stops(s, route_id, rows)
+    await s.commit()
+    # Cached arrays and ETA engine copies reload from the new rows
+    stop_cache.invalidate([route_id])
+    return {"route_id": route_id, "stops": len(rows)}
+
+@router.get("/{route_id}/stops")
+async def get_stops(route_id: int):
+    """Stops of a route in order, from the shared stop cache."""
+    shape = await asyncio.to_thread(stop_cache.get, route_id)
+    if shape is None:
+        raise HTTPException(status_code=404, detail="Route not found or has no stops")
+    return {"route_id": route_id, "stops": [
+        {"seq": i, "name": shape.names[i], "lat": lat, "lon": lon, "offset_min": shape.scheduled[i]}
+        for i, (lat, lon) in enumerate(zip(shape.lats.tolist(), shape.lons.tolist()))
+    ]}
+
+@router.get("/near")
+async def get_routes_near(
+        lat: float = Query(...),
+        lng: float = Query(...),
+        radius_m: float = Query(500, gt=0, le=50000),
+        limit: int = Query(50, ge=1, le=500),
+):
+    """Routes with a stop within radius_m of a point, nearest first, with that stop."""
+    return {"routes": await asyncio.to_thread(routes_near, lat, lng, radius_m / 1000, limit)}
+
+@router.post("/bulk")
+async def bulk_import_routes(
+        request: Request,
+        format: Optional[Literal["csv", "jsonl"]] = Query(None, description="Defaults from Content-Type"),
+        upsert_on: Optional[Literal["name"]] = Query(None, description="Update rows that already have this value"),
+        all_or_nothing: bool = False,
+):
+    """Import a CSV (with header row) or JSON-lines request body; returns counts and per-row errors."""
+    written = []
+
+    def sync_stops(conn, rows):
+        for route_id, values in rows:
+            replace_route_stops(conn, route_id, values["stops"])
+            written.append(route_id)
+
+    report = await bulk_import(request, RouteCreate, Route, format, upsert_on, all_or_nothing,
+                               check=lambda values: stop_rows(None, values["stops"]), on_written=sync_stops)
+    stop_cache.invalidate(written)
+    return report
 
 @router.get("/", response_model=list[RouteRead])
-def list_routes():
-    with get_session() as s:
-        return s.exec(select(Route)).all()
+async def list_routes(
+        response: Response,
+        active: Optional[bool] = None,
+        driver_id: Optional[int] = None,
+        vehicle_id: Optional[int] = None,
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: Literal["json", "ndjson"] = "json",
+        s: AsyncSession = Depends(get_async_session),
+):
+    """Routes by id; the next page's cursor is in X-Next-Cursor. format=ndjson streams every match."""
+    stmt = select(Route)
+    if active is not None:
+        stmt = stmt.where(Route.active == active)
+    if driver_id is not None:
+        stmt = stmt.where(Route.assigned_driver_id == driver_id)
+    if vehicle_id is not None:
+        stmt = stmt.where(Route.assigned_vehicle_id == vehicle_id)
+    if format == "ndjson":
+        return ndjson(async_session_maker, stmt, [Route.id], cursor, limit)
+    return await paginate(s, stmt, [Route.id], cursor, limit, response)
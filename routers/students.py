@@ -1,18 +1,48 @@
-from fastapi import APIRouter
-from database import get_session
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session, async_session_maker
 from models import Student
 from schemas import StudentCreate, StudentRead
+from utils.bulk_import import bulk_import
+from utils.pagination import MAX_PAGE_SIZE, ndjson, paginate
 
-router = APIRouter()
+router = APIRouter(prefix="/api/transport/students", tags=["Students"])
 
 @router.post("/", response_model=StudentRead)
-def create_student(payload: StudentCreate):
-    with get_session() as s:
-        st = Student(**payload.dict())
-        s.add(st); s.commit(); s.refresh(st)
-        return st
+async def create_student(payload: StudentCreate, s: AsyncSession = Depends(get_async_session)):
+    st = Student.model_validate(payload.dict())
+    s.add(st); await s.commit(); await s.refresh(st)
+    return st
+
+@router.post("/bulk")
+async def bulk_import_students(
+        request: Request,
+        format: Optional[Literal["csv", "jsonl"]] = Query(None, description="Defaults from Content-Type"),
+        upsert_on: Optional[Literal["roll_no", "rfid_tag"]] = Query(None, description="Update rows that already have this value"),
+        all_or_nothing: bool = False,
+):
+    """Import a CSV (with header row) or JSON-lines request body; returns counts and per-row errors."""
+    return await bulk_import(request, StudentCreate, Student, format, upsert_on, all_or_nothing)
 
 @router.get("/", response_model=list[StudentRead])
-def list_students():
-    with get_session() as s:
-        return s.exec(select(Student)).all()
+async def list_students(
+        response: Response,
+        route_id: Optional[int] = None,
+        roll_no: Optional[str] = None,
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: Literal["json", "ndjson"] = "json",
+        s: AsyncSession = Depends(get_async_session),
+):
+    """Students by id; the next page's cursor is in X-Next-Cursor. format=ndjson streams every match."""
+    stmt = select(Student)
+    if route_id is not None:
+        stmt = stmt.where(Student.route_id == route_id)
+    if roll_no is not None:
+        stmt = stmt.where(Student.roll_no == roll_no)
+    if format == "ndjson":
+        return ndjson(async_session_maker, stmt, [Student.id], cursor, limit)
+    return await paginate(s, stmt, [Student.id], cursor, limit, response)
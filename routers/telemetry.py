@@ -0,0 +1,38 @@
+# routers/telemetry.py
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.telemetry import telemetry
+
+router = APIRouter(prefix="/api/transport/telemetry", tags=["Trip Telemetry"])
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@router.get("/{bus_id}/track")
+async def get_bus_track(
+        bus_id: str,
+        start: Optional[datetime] = Query(None, description="ISO time, defaults to one hour ago"),
+        end: Optional[datetime] = Query(None, description="ISO time, defaults to now"),
+        limit: int = Query(10000, ge=1, le=100000),
+):
+    """Recorded GPS track of one bus for a time window, oldest point first."""
+    end_ts = _epoch(end) if end else datetime.now(timezone.utc).timestamp()
+    start_ts = _epoch(start) if start else end_ts - timedelta(hours=1).total_seconds()
+    if start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    points = await telemetry.track(bus_id, start_ts, end_ts, limit)
+    return {"bus_id": bus_id, "start": start_ts, "end": end_ts, "count": len(points), "points": points}
+
+
+@router.get("/stats")
+async def get_telemetry_stats():
+    """Ingest counters and the number of pings waiting to be written."""
+    return {**telemetry.stats, "pending": telemetry.pending}
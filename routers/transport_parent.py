@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
-from datetime import datetime, timedelta
-import random
+from datetime import datetime
+
+from utils.eta import eta_engine
 
 router = APIRouter(prefix="/api/transport/parent", tags=["Parent Tracking"])
 
@@ -46,9 +47,8 @@ BUSES = {
 }
 
 
-@router.get("/tracking/{student_id}")
-async def get_tracking_info(student_id: str):
-    """Return live tracking data for a given student."""
+def build_tracking_info(student_id: str) -> dict:
+    """Full tracking payload for a student (HTTP endpoint and push-channel snapshot)."""
     student = STUDENTS.get(student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -57,17 +57,20 @@ async def get_tracking_info(student_id: str):
     if not bus:
         raise HTTPException(status_code=404, detail="Bus not found")
 
-    # Simulate dynamic location drift and ETA calculation
-    lat_offset = random.uniform(-0.002, 0.002)
-    lng_offset = random.uniform(-0.002, 0.002)
-    current_location = {
-        "lat": bus["location"]["lat"] + lat_offset,
-        "lng": bus["location"]["lng"] + lng_offset,
-    }
-
-    # Random ETA simulation (10–25 min)
-    eta = random.randint(10, 25)
-    status = random.choice(["On Time", "Delayed", "Arrived"])
+    # Position, speed and ETA are kept up to date by the ETA engine on every ping,
+    # so this is a dictionary lookup rather than a computation
+    live = eta_engine.get(student["bus_id"])
+    if live is not None:
+        current_location = {"lat": live.lat, "lng": live.lng}
+        speed = round(live.speed_kmph, 1) if live.speed_kmph is not None else None
+        eta = eta_engine.eta_minutes(student["bus_id"], student.get("stop_index"))
+        eta = round(eta) if eta is not None else None
+        status = live.status
+    else:
+        current_location = bus["location"]
+        speed = 0
+        eta = None
+        status = "Not Started"
 
     return {
         "student": {
@@ -79,11 +82,18 @@ async def get_tracking_info(student_id: str):
             "busNumber": bus["busNumber"],
             "model": bus["model"],
             "location": current_location,
-            "speed": bus["speed"],
+            "speed": speed,
         },
         "driver": bus["driver"],
         "route": student["route"],
         "status": status,
         "eta": eta,
+        "stop_index": student.get("stop_index"),
         "timestamp": datetime.utcnow().isoformat(),
     }
+
+
+@router.get("/tracking/{student_id}")
+async def get_tracking_info(student_id: str):
+    """Return live tracking data for a given student."""
+    return build_tracking_info(student_id)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
 
 class DriverCreate(BaseModel):
     name: str
@@ -10,6 +11,7 @@ class DriverCreate(BaseModel):
 
 class DriverRead(DriverCreate):
     id: int
+    license_expiry: Optional[datetime]  # stored as a datetime, accepted as a string on create
     behavior_score: Optional[float] = 0.0
 
 class StudentCreate(BaseModel):
@@ -0,0 +1,168 @@
+# utils/broadcast.py
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import METRICS_ENABLED, emit_fanout, recipients
+from utils.wire import WIRE_BINARY, encode_positions
+
+log = logging.getLogger(__name__)
+
+# How often buffered positions are flushed to subscribers (milliseconds)
+BROADCAST_TICK_MS = int(os.getenv("BROADCAST_TICK_MS", "500"))
+BROADCAST_EVENT = "bus_locations"
+
+# Room used by dashboards that want every bus (subscribe with no filter)
+FLEET_ROOM = "fleet"
+# Clients that negotiated the binary format sit in a twin of each room, e.g. "bin:route:5"
+BINARY_ROOM_PREFIX = "bin:"
+POSITION_ROOM_KINDS = ("bus", "route", "school")
+
+# redis://host:6379/0 relays emits between workers; empty means a single process
+SIO_MESSAGE_QUEUE = os.getenv("SIO_MESSAGE_QUEUE", "")
+SIO_CHANNEL = os.getenv("SIO_CHANNEL", "transport-socketio")
+
+
+def client_manager(url: str = SIO_MESSAGE_QUEUE):
+    """Socket.IO client manager: in-process by default, Redis pub/sub when a queue URL is set."""
+    if not url:
+        return None  # AsyncServer's own AsyncManager
+    import socketio
+    return socketio.AsyncRedisManager(url, channel=SIO_CHANNEL)
+
+
+def has_subscribers(sio, room: str) -> bool:
+    """
+    Whether emitting to room can reach anyone. Only answerable locally: behind a
+    message queue the listeners may sit on another worker, so always emit.
+    """
+    from socketio.async_pubsub_manager import AsyncPubSubManager
+
+    if isinstance(sio.manager, AsyncPubSubManager):
+        return True
+    return bool(sio.manager.rooms.get("/", {}).get(room))
+
+
+def room_for(kind: str, value: Any) -> str:
+    return f"{kind}:{value}"
+
+
+def rooms_for_position(data: Dict[str, Any]) -> List[str]:
+    """Socket.IO rooms that should receive a position update."""
+    rooms = [FLEET_ROOM, room_for("bus", data["bus_id"])]
+    if data.get("route_id") is not None:
+        rooms.append(room_for("route", data["route_id"]))
+    if data.get("school_id") is not None:
+        rooms.append(room_for("school", data["school_id"]))
+    return rooms
+
+
+def wire_room(room: str, wire_format: str) -> str:
+    """The room a client with this wire format joins to receive `room`'s positions."""
+    return BINARY_ROOM_PREFIX + room if wire_format == WIRE_BINARY else room
+
+
+def is_position_room(room: str) -> bool:
+    room = room[len(BINARY_ROOM_PREFIX):] if room.startswith(BINARY_ROOM_PREFIX) else room
+    return room == FLEET_ROOM or room.split(":", 1)[0] in POSITION_ROOM_KINDS
+
+
+def subscription_rooms(data: Optional[Dict[str, Any]]) -> List[str]:
+    """Rooms a client joins for a `subscribe` payload like {"route_id": 5}."""
+    data = data or {}
+    rooms = [room_for(kind, data[key])
+             for kind, key in (("bus", "bus_id"), ("route", "route_id"), ("school", "school_id"))
+             if data.get(key) is not None]
+    return rooms or [FLEET_ROOM]
+
+
+class LocationBroadcaster:
+    """
+    Coalesces GPS pings and fans them out once per tick.
+
+    Only the latest position per bus is kept between ticks, and each room gets
+    a single batched frame containing the buses it subscribed to: the JSON
+    dicts for its JSON clients and one binary frame (utils/wire.py) for
+    the clients in its binary twin.
+    """
+
+    def __init__(self, sio, tick_ms: int = BROADCAST_TICK_MS, event: str = BROADCAST_EVENT):
+        self.sio = sio
+        self.tick = tick_ms / 1000
+        self.event = event
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._received: Dict[Any, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"pings": 0, "superseded": 0, "frames": 0, "binary_frames": 0, "flushes": 0}
+
+    def push(self, data: Dict[str, Any]):
+        # Called from the ping handler: O(1), never awaits
+        self.stats["pings"] += 1
+        if data["bus_id"] in self._pending:
+            self.stats["superseded"] += 1
+        self._pending[data["bus_id"]] = data
+        self._received[data["bus_id"]] = time.time()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        received, self._received = self._received, {}
+
+        frames: Dict[str, List[Dict[str, Any]]] = {}
+        for data in pending.values():
+            for room in rooms_for_position(data):
+                frames.setdefault(room, []).append(data)
+
+        sent_at = time.time()
+        emitted = 0
+        for room, positions in frames.items():
+            if has_subscribers(self.sio, room):
+                await self.sio.emit(self.event, {"ts": sent_at, "positions": positions}, room=room)
+                emitted += 1
+                self._observe_fanout(room, self.event)
+            binary_room = wire_room(room, WIRE_BINARY)
+            if has_subscribers(self.sio, binary_room):
+                frame = encode_positions([(data, received[data["bus_id"]]) for data in positions], sent_at)
+                await self.sio.emit(self.event, frame, room=binary_room)
+                emitted += 1
+                self.stats["binary_frames"] += 1
+                self._observe_fanout(binary_room, f"{self.event}:{WIRE_BINARY}")
+
+        self.stats["flushes"] += 1
+        self.stats["frames"] += emitted
+        return emitted
+
+    def _observe_fanout(self, room: str, label: str):
+        if METRICS_ENABLED:
+            reached = recipients(self.sio, room)
+            if reached is not None:
+                emit_fanout.observe(reached, label)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("Broadcast flush failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
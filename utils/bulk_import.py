@@ -0,0 +1,209 @@
+# utils/bulk_import.py
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import DBAPIError
+
+from database import engine
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+# Uploads above this are spooled to disk instead of memory
+IMPORT_SPOOL_BYTES = int(os.getenv("IMPORT_SPOOL_BYTES", str(4 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+FORMATS = {"text/csv": "csv", "application/x-ndjson": "jsonl", "application/jsonl": "jsonl",
+           "application/json": "jsonl"}
+
+
+class _Rollback(Exception):
+    pass
+
+
+async def spool_body(request: Request):
+    """Copy the request body to a temp file as it arrives, never holding it all in memory."""
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def detect_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in FORMATS:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    return FORMATS[content_type]
+
+
+def iter_records(spool, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line number, record) pairs; unparseable JSON lines come back as the exception."""
+    text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Blank cells mean "not set" rather than an empty string
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in record.items() if k}
+        return
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+
+def _validate(record, schema: Type[BaseModel], model, check=None) -> Dict[str, Any]:
+    if isinstance(record, Exception):
+        raise ValueError(f"Invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    # The Create schemas declare Optional fields without defaults; a missing column means None
+    item = schema.model_validate({f: record.get(f) for f in schema.model_fields})
+    values = item.model_dump()
+    # Columns the schema doesn't carry (e.g. Route.estimated_time_min) start out empty
+    for name, field in model.model_fields.items():
+        if name not in values and field.is_required():
+            values[name] = None
+    # Through the table model so strings become datetimes and model defaults apply
+    values = model.model_validate(values).model_dump(exclude={"id"})
+    if check is not None:
+        try:
+            check(values)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid value: {e}")
+    return values
+
+
+def _error(report: Dict[str, Any], row: int, message):
+    report["failed"] += 1
+    if len(report["errors"]) < IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": row, "error": message})
+
+
+def _write_batch(conn, model, batch: List[Tuple[int, Dict[str, Any]]], upsert_on: Optional[str],
+                 report: Dict[str, Any], on_written=None):
+    table = model.__table__
+    inserts, updates = batch, []
+    if upsert_on:
+        # Last occurrence of a key in the batch wins, as row-by-row upserts would
+        inserts, latest = [], {}
+        for row, values in batch:
+            key = values.get(upsert_on)
+            if key is None:
+                inserts.append((row, values))
+            else:
+                report["duplicates"] += key in latest
+                latest[key] = (row, values)
+        existing = dict(conn.execute(
+            select(table.c[upsert_on], table.c.id).where(table.c[upsert_on].in_(list(latest)))
+        ).all()) if latest else {}
+        for key, (row, values) in latest.items():
+            if key in existing:
+                updates.append((row, {"_id": existing[key], **{f"_{c}": v for c, v in values.items()}}))
+            else:
+                inserts.append((row, values))
+
+    def write(rows_in, rows_up):
+        if rows_in:
+            params = [v for _, v in rows_in]
+            if on_written is None:
+                conn.execute(insert(table), params)
+            else:
+                ids = conn.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                                   params).scalars().all()
+                on_written(conn, list(zip(ids, params)))
+        if rows_up:
+            columns = [k[1:] for k in rows_up[0][1] if k != "_id"]
+            stmt = update(table).where(table.c.id == bindparam("_id")).values(
+                {c: bindparam(f"_{c}") for c in columns})
+            conn.execute(stmt, [v for _, v in rows_up])
+            if on_written is not None:
+                on_written(conn, [(v["_id"], {c: v[f"_{c}"] for c in columns}) for _, v in rows_up])
+
+    try:
+        with conn.begin_nested():
+            write(inserts, updates)
+        report["inserted"] += len(inserts)
+        report["updated"] += len(updates)
+        return
+    except DBAPIError:
+        pass
+    # Something in the batch broke a constraint (e.g. an unknown route_id); redo it
+    # row by row so the report points at the offending rows and the rest still go in
+    for kind, rows in (("inserted", inserts), ("updated", updates)):
+        for row, values in rows:
+            try:
+                with conn.begin_nested():
+                    if kind == "inserted":
+                        write([(row, values)], [])
+                    else:
+                        write([], [(row, values)])
+                report[kind] += 1
+            except DBAPIError as e:
+                _error(report, row, str(e.orig))
+
+
+def import_rows(spool, fmt: str, schema: Type[BaseModel], model, upsert_on: Optional[str] = None,
+                all_or_nothing: bool = False, batch_size: int = IMPORT_BATCH_SIZE,
+                check: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                on_written: Optional[Callable[[Any, List[Tuple[int, Dict[str, Any]]]], Any]] = None) -> Dict[str, Any]:
+    """
+    Validate and write every record of an upload in one transaction, batch_size
+    rows per INSERT. Invalid rows are reported and skipped; with all_or_nothing
+    any failure rolls the whole import back. check(values) can reject a row with
+    ValueError; on_written(conn, [(id, values)]) runs in the same transaction
+    for rows that were written (e.g. to fill dependent tables).
+    """
+    report = {"received": 0, "inserted": 0, "updated": 0, "duplicates": 0, "failed": 0, "errors": []}
+    try:
+        with engine.begin() as conn:
+            batch = []
+            for row, record in iter_records(spool, fmt):
+                report["received"] += 1
+                try:
+                    batch.append((row, _validate(record, schema, model, check)))
+                except ValidationError as e:
+                    _error(report, row, [{"field": ".".join(map(str, err["loc"])), "message": err["msg"]}
+                                         for err in e.errors()])
+                except ValueError as e:
+                    _error(report, row, str(e))
+                if len(batch) >= batch_size:
+                    _write_batch(conn, model, batch, upsert_on, report, on_written)
+                    batch = []
+            if batch:
+                _write_batch(conn, model, batch, upsert_on, report, on_written)
+            if all_or_nothing and report["failed"]:
+                raise _Rollback()
+    except _Rollback:
+        report["inserted"] = report["updated"] = 0
+        report["rolled_back"] = True
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8")
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {e}")
+    finally:
+        spool.close()
+    # Batches that fell back to row-by-row report their DB errors after validation errors
+    report["errors"].sort(key=lambda e: e["row"])
+    return report
+
+
+async def bulk_import(request: Request, schema: Type[BaseModel], model, fmt: Optional[str] = None,
+                      upsert_on: Optional[str] = None, all_or_nothing: bool = False,
+                      check=None, on_written=None) -> Dict[str, Any]:
+    """Entry point for the /bulk endpoints: spool the body, then parse and write off the event loop."""
+    fmt = detect_format(request, fmt)
+    spool = await spool_body(request)
+    return await asyncio.to_thread(import_rows, spool, fmt, schema, model, upsert_on, all_or_nothing,
+                                   IMPORT_BATCH_SIZE, check, on_written)
@@ -0,0 +1,215 @@
+# utils/chat_context.py
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from utils.cache import TTLCache
+
+# Context sent with each chat prompt is trimmed to about this many tokens
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "600"))
+# DB summaries are rebuilt at most this often
+CHAT_CONTEXT_REFRESH_S = float(os.getenv("CHAT_CONTEXT_REFRESH_S", "30"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+# Answers include live data, so they are only reused for a short while
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "120"))
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did of on in at to for from by with and or
+what which who whom where when how why me my i we our us you your it its this that these those
+there please show tell give list can could would should any all currently right now today
+""".split())
+
+# Question keywords that make a section more relevant than the others
+SECTION_KEYWORDS = {
+    "delays": {"late", "delay", "delayed", "eta", "running", "behind", "schedule", "arrive", "arrival"},
+    "alerts": {"alert", "alerts", "licence", "license", "service", "stale", "expiry", "expired", "warning"},
+    "routes": {"route", "routes", "stop", "stops", "driver", "drivers", "vehicle", "vehicles", "assigned"},
+}
+ROUTE_REF = re.compile(r"\broute\s*#?\s*(\d+)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Cache key form of a question: lower case, punctuation, filler words and
+    plurals dropped, word order ignored. Numbers stay with the word before
+    them ("bus:5", "route:12"), so "Which buses are late?" and "late bus"
+    share an entry but "bus 5 on route 12" and "bus 12 on route 5" don't.
+    """
+    terms = set()
+    noun = None
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if word in STOPWORDS:
+            continue
+        if word.isdigit():
+            if noun is not None:
+                terms.discard(noun)
+                terms.add(f"{noun}:{word}")
+            else:
+                terms.add(word)
+            continue
+        noun = _stem(word)
+        terms.add(noun)
+    return " ".join(sorted(terms))
+
+
+# ---- DB summaries (run in a worker thread) ----
+def routes_summary() -> List[str]:
+    from database import engine
+    from models import Driver, Route, RouteStop, Vehicle
+
+    stops = (select(RouteStop.route_id, func.count().label("n"))
+             .group_by(RouteStop.route_id).subquery())
+    stmt = (select(Route.id, Route.name, Route.active, stops.c.n, Vehicle.reg_no, Driver.name.label("driver"))
+            .outerjoin(stops, stops.c.route_id == Route.id)
+            .outerjoin(Vehicle, Vehicle.id == Route.assigned_vehicle_id)
+            .outerjoin(Driver, Driver.id == Route.assigned_driver_id)
+            .order_by(Route.id))
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    lines = [f"{len(rows)} routes, {sum(1 for r in rows if r.active)} active."]
+    for r in rows:
+        lines.append(f"Route {r.id} {r.name}: {r.n or 0} stops, bus {r.reg_no or '-'}, driver {r.driver or '-'}"
+                     f"{'' if r.active else ' (inactive)'}")
+    return lines
+
+
+def route_detail(route_id: int) -> List[str]:
+    from utils.route_stops import stop_cache
+
+    shape = stop_cache.get(route_id)
+    if shape is None:
+        return [f"Route {route_id}: no stops on record."]
+    stops = ", ".join(f"{name}" + (f" (+{offset:g} min)" if offset is not None else "")
+                      for name, offset in zip(shape.names, shape.scheduled))
+    return [f"Route {route_id} stops in order: {stops}."]
+
+
+def alerts_summary(hours: float = 24, latest: int = 10) -> List[str]:
+    from database import engine
+    from models import Alert
+
+    since = datetime.utcnow() - timedelta(hours=hours)
+    with engine.connect() as conn:
+        counts = conn.execute(select(Alert.alert_type, func.count()).where(Alert.created_at >= since)
+                              .group_by(Alert.alert_type)).all()
+        recent = conn.execute(select(Alert.alert_type, Alert.message, Alert.created_at)
+                              .where(Alert.created_at >= since)
+                              .order_by(Alert.created_at.desc(), Alert.id.desc()).limit(latest)).all()
+    if not counts:
+        return [f"No alerts in the last {hours:g} h."]
+    lines = [f"Alerts in the last {hours:g} h: " + ", ".join(f"{n} {t}" for t, n in counts) + "."]
+    lines += [f"{a.created_at:%H:%M} {a.alert_type}: {a.message}" for a in recent]
+    return lines
+
+
+def delays_summary() -> List[str]:
+    # In-memory, so read on the event loop next to the ping handler
+    from utils.eta import eta_engine
+    from utils.live_state import live_state
+
+    late = eta_engine.delayed()
+    lines = [f"{len(live_state)} buses reporting live, {len(late)} delayed."]
+    for d in late:
+        stop = d["stop"]["name"] if d.get("stop") else "end of route"
+        eta = f" in {d['eta_min']:g} min" if d.get("eta_min") is not None else ""
+        lines.append(f"Bus {d['bus_id']} (route {d['route_id']}) delayed, next stop {stop}{eta}")
+    return lines
+
+
+class ContextBuilder:
+    """
+    Compact, data-backed context for a chat prompt. Summaries come from a few
+    aggregate queries and are cached for CHAT_CONTEXT_REFRESH_S. Sections the
+    question is about go first, and lines are added until the token budget
+    is spent.
+    """
+
+    def __init__(self, budget_tokens: int = CHAT_CONTEXT_TOKENS, refresh_s: float = CHAT_CONTEXT_REFRESH_S):
+        self.budget = budget_tokens
+        self._summaries = TTLCache(maxsize=256, ttl=refresh_s)
+
+    async def _summary(self, key, loader, *args) -> List[str]:
+        lines = self._summaries.get(key)
+        if lines is None:
+            lines = await asyncio.to_thread(loader, *args)
+            self._summaries.set(key, lines)
+        return lines
+
+    def invalidate(self):
+        self._summaries.clear()
+
+    async def build(self, message: str, client_context: Optional[str] = None) -> Tuple[str, int]:
+        """Context text for this question and its estimated token count."""
+        words = set(re.findall(r"[a-z]+", message.lower()))
+        ranked = sorted(SECTION_KEYWORDS, key=lambda s: -len(words & SECTION_KEYWORDS[s]))
+
+        sections: List[List[str]] = []
+        if client_context:
+            sections.append([client_context.strip()])
+        for route_id in dict.fromkeys(int(n) for n in ROUTE_REF.findall(message)):
+            sections.append(await self._summary(("route", route_id), route_detail, route_id))
+        for name in ranked:
+            if name == "delays":
+                sections.append(delays_summary())
+            elif name == "alerts":
+                sections.append(await self._summary("alerts", alerts_summary))
+            else:
+                sections.append(await self._summary("routes", routes_summary))
+
+        out, used = [], 0
+        for lines in sections:
+            for line in lines:
+                cost = estimate_tokens(line) + 1
+                if used + cost > self.budget:
+                    break
+                out.append(line)
+                used += cost
+        return "\n".join(out), used
+
+
+class ChatCache:
+    """TTL / LRU cache of chat replies keyed on the normalized question and client context."""
+
+    def __init__(self, maxsize: int = CHAT_CACHE_SIZE, ttl: float = CHAT_CACHE_TTL):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.requests = 0
+        self.tokens_saved = 0
+
+    @staticmethod
+    def key(message: str, client_context: Optional[str] = None) -> str:
+        return f"{normalize_prompt(message)}|{normalize_prompt(client_context or '')}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self.requests += 1
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.tokens_saved += entry["tokens"]
+        return entry
+
+    def put(self, key: str, reply: str, tokens: int):
+        self.cache.set(key, {"reply": reply, "tokens": tokens})
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "requests": self.requests, "tokens_saved": self.tokens_saved,
+                "tokens_saved_per_request": round(self.tokens_saved / self.requests, 1) if self.requests else 0.0}
+
+
+context_builder = ContextBuilder()
+chat_cache = ChatCache()
@@ -0,0 +1,301 @@
+# utils/eta.py
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.geo_batch import haversine_one_to_many
+from utils.gps_utils import haversine_km
+from utils.route_stops import RouteShape, stop_cache
+
+ETA_DEFAULT_SPEED_KMPH = float(os.getenv("ETA_DEFAULT_SPEED_KMPH", "20"))
+# Floor so a bus waiting at a light doesn't produce an infinite ETA
+ETA_MIN_SPEED_KMPH = float(os.getenv("ETA_MIN_SPEED_KMPH", "8"))
+ETA_SPEED_SMOOTHING = float(os.getenv("ETA_SPEED_SMOOTHING", "0.2"))
+ETA_ARRIVAL_RADIUS_KM = float(os.getenv("ETA_ARRIVAL_RADIUS_M", "60")) / 1000
+ETA_STOP_DWELL_MIN = float(os.getenv("ETA_STOP_DWELL_MIN", "0.5"))
+ETA_DELAY_THRESHOLD_MIN = float(os.getenv("ETA_DELAY_THRESHOLD_MIN", "5"))
+
+
+class BusEta:
+    __slots__ = ("bus_id", "route_id", "lat", "lng", "ts", "speed_kmph", "next_stop",
+                 "etas", "trip_start", "status", "updated_at")
+
+    def __init__(self, bus_id):
+        self.bus_id = bus_id
+        self.route_id = None
+        self.lat = self.lng = None
+        self.ts = None
+        self.speed_kmph = None
+        self.next_stop = 0
+        self.etas: List[float] = []
+        self.trip_start = None
+        self.status = "Not Started"
+        self.updated_at = None
+
+
+class EtaEngine:
+    """
+    Incremental ETA per bus.
+
+    Each ping updates the bus's smoothed speed and its progress along the
+    route, then recomputes minutes-to-arrival for every remaining stop. Reads
+    (parent tracking, dashboards) just return the stored result.
+    """
+
+    def __init__(self, route_loader: Optional[Callable[[Any], Any]] = None):
+        # Returns a RouteShape or a raw stop list; defaults to the shared RouteStop cache
+        self.route_loader = route_loader or stop_cache.get
+        self._routes: Dict[Any, Optional[RouteShape]] = {}  # None: loaded, route has no stops
+        self._bus_routes: Dict[Any, Any] = {}
+        self._loading: Dict[Any, asyncio.Future] = {}
+        self._buses: Dict[Any, BusEta] = {}
+        self._arrival_listeners: List[Callable[[Any, Any, int, float, Optional[float]], None]] = []
+        # Shared live state when workers split the pings: reads for buses reporting to another
+        # worker fall back to the snapshot that worker stored with the position (see published())
+        self.shared = None
+
+    def on_arrival(self, listener: Callable[[Any, Any, int, float, Optional[float]], None]):
+        """Called as (bus_id, route_id, stop_seq, ts, delay_min) for each stop a bus reaches or passes."""
+        self._arrival_listeners.append(listener)
+
+    # ---- routes ----
+    def set_route(self, bus_id, stops, route_id=None):
+        """Attach a stop list to a bus directly (also used for routes loaded from the DB)."""
+        key = route_id if route_id is not None else ("bus", bus_id)
+        self._routes[key] = RouteShape(stops)
+        self._bus_routes[bus_id] = key
+        state = self._buses.get(bus_id)
+        if state is not None:
+            state.route_id = key
+            state.next_stop = 0
+
+    def invalidate_route(self, route_id):
+        self._routes.pop(route_id, None)
+        # A load still in flight may carry the old stops; done() drops it
+        self._loading.pop(route_id, None)
+
+    def route_shape(self, route_id) -> Optional[RouteShape]:
+        """The loaded stops of a route (None until its first load finishes)."""
+        return self._routes.get(route_id)
+
+    def _ensure_route(self, route_id):
+        # Loaded once in a worker thread; ETAs start on the next ping after it arrives
+        if route_id in self._routes or route_id in self._loading:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        future = loop.run_in_executor(None, self.route_loader, route_id)
+        self._loading[route_id] = future
+
+        def done(f):
+            if self._loading.get(route_id) is not f:
+                return
+            self._loading.pop(route_id)
+            # Cancelled (shutdown) or failed loads are retried on a later ping
+            if f.cancelled() or f.exception() is not None:
+                return
+            result = f.result()
+            if not result:
+                # Kept as None, so a route without stops isn't reloaded on every ping
+                result = None
+            elif not isinstance(result, RouteShape):
+                result = RouteShape(result)
+            self._routes[route_id] = result
+
+        future.add_done_callback(done)
+
+    # ---- pings ----
+    def on_ping(self, bus_id, lat: float, lng: float, ts: Optional[float] = None,
+                speed_kmph: Optional[float] = None, route_id=None) -> BusEta:
+        ts = ts or time.time()
+        state = self._buses.get(bus_id)
+        if state is None:
+            state = self._buses[bus_id] = BusEta(bus_id)
+
+        if route_id is not None and self._bus_routes.get(bus_id) != route_id:
+            self._bus_routes[bus_id] = route_id
+            state.next_stop = 0
+            state.trip_start = ts
+        route_key = self._bus_routes.get(bus_id)
+        if route_key is not None:
+            self._ensure_route(route_key)
+        state.route_id = route_key
+
+        self._update_speed(state, lat, lng, ts, speed_kmph)
+        state.lat, state.lng, state.ts = lat, lng, ts
+        if state.trip_start is None:
+            state.trip_start = ts
+
+        shape = self._routes.get(route_key)
+        if shape is not None and len(shape):
+            self._update_etas(state, shape, ts)
+        state.updated_at = ts
+        return state
+
+    def _update_speed(self, state: BusEta, lat, lng, ts, reported):
+        observed = reported
+        if observed is None and state.ts is not None and ts > state.ts:
+            km = haversine_km(state.lat, state.lng, lat, lng)
+            observed = km / ((ts - state.ts) / 3600)
+        if observed is None:
+            return
+        if state.speed_kmph is None:
+            state.speed_kmph = observed
+        else:
+            state.speed_kmph += ETA_SPEED_SMOOTHING * (observed - state.speed_kmph)
+
+    def _update_etas(self, state: BusEta, shape: RouteShape, ts: float):
+        n = len(shape)
+        if state.next_stop >= n:
+            state.etas = []
+            state.status = "Arrived"
+            return
+
+        # Distances to the upcoming stops only; a bus can't go back along the route
+        upcoming = haversine_one_to_many(state.lat, state.lng,
+                                         shape.lats[state.next_stop:], shape.lons[state.next_stop:])
+        # Advance past stops we reached, and past stops we drove by without a ping near
+        # them: being closer to the following stop than the leg length means we passed it
+        passed = 1 if upcoming[0] <= ETA_ARRIVAL_RADIUS_KM else 0
+        legs = np.diff(shape.cum_km[state.next_stop:])
+        while passed < len(legs) and upcoming[passed + 1] < legs[passed]:
+            passed += 1
+        if passed:
+            if self._arrival_listeners:
+                self._arrived(state, shape, state.next_stop, state.next_stop + passed, ts)
+            state.next_stop += passed
+            upcoming = upcoming[passed:]
+            if state.next_stop >= n:
+                state.etas = []
+                state.status = "Arrived"
+                return
+
+        speed = max(state.speed_kmph or ETA_DEFAULT_SPEED_KMPH, ETA_MIN_SPEED_KMPH)
+        along = shape.cum_km[state.next_stop:] - shape.cum_km[state.next_stop]
+        remaining_km = upcoming[0] + along
+        dwell = np.arange(len(along)) * ETA_STOP_DWELL_MIN
+        state.etas = (remaining_km / speed * 60 + dwell).tolist()
+        state.status = self._status(state, shape, ts)
+
+    def _arrived(self, state: BusEta, shape: RouteShape, first: int, end: int, ts: float):
+        elapsed = (ts - state.trip_start) / 60 if state.trip_start is not None else None
+        for seq in range(first, min(end, len(shape))):
+            scheduled = shape.scheduled[seq]
+            delay = elapsed - scheduled if elapsed is not None and scheduled is not None else None
+            for listener in self._arrival_listeners:
+                listener(state.bus_id, state.route_id, seq, ts, delay)
+
+    def _status(self, state: BusEta, shape: RouteShape, ts: float) -> str:
+        scheduled = shape.scheduled[state.next_stop]
+        if scheduled is None or state.trip_start is None:
+            return "On Time"
+        expected_at = (ts - state.trip_start) / 60 + state.etas[0]
+        return "Delayed" if expected_at - scheduled > ETA_DELAY_THRESHOLD_MIN else "On Time"
+
+    # ---- shared state ----
+    def published(self, bus_id) -> Optional[Dict[str, Any]]:
+        """This bus's ETA state for other workers, stored with its position in the shared live state."""
+        state = self._buses.get(bus_id)
+        if state is None:
+            return None
+        return {"route_id": state.route_id, "speed_kmph": state.speed_kmph, "next_stop": state.next_stop,
+                "stop": self.next_stop(bus_id)["stop"], "etas": [round(e, 2) for e in state.etas],
+                "trip_start": state.trip_start, "status": state.status, "updated_at": state.updated_at}
+
+    def _remote(self, bus_id) -> Optional[Dict[str, Any]]:
+        if self.shared is None:
+            return None
+        position = self.shared.get(bus_id)
+        if not position or not position.get("eta"):
+            return None
+        return {**position["eta"], "lat": position["lat"], "lng": position["lng"], "ts": position["ts"]}
+
+    @staticmethod
+    def _remote_next_stop(bus_id, remote: Dict[str, Any]) -> Dict[str, Any]:
+        return {"bus_id": bus_id, "route_id": remote["route_id"], "stop": remote["stop"],
+                "eta_min": round(remote["etas"][0], 1) if remote["stop"] and remote["etas"] else None,
+                "status": remote["status"]}
+
+    # ---- reads (O(1)) ----
+    def get(self, bus_id) -> Optional[BusEta]:
+        state = self._buses.get(bus_id)
+        if state is None:
+            remote = self._remote(bus_id)
+            if remote is not None:
+                state = BusEta(bus_id)
+                for name in BusEta.__slots__[1:]:
+                    setattr(state, name, remote[name])
+        return state
+
+    def eta_minutes(self, bus_id, stop_index: Optional[int] = None) -> Optional[float]:
+        """Minutes until the bus reaches stop_index (default: the last stop)."""
+        state = self.get(bus_id)
+        if state is None or not state.etas:
+            return None
+        if stop_index is None:
+            return state.etas[-1]
+        offset = stop_index - state.next_stop
+        if offset < 0:
+            return 0.0
+        return state.etas[offset] if offset < len(state.etas) else None
+
+    def next_stop(self, bus_id) -> Optional[Dict[str, Any]]:
+        """The stop a bus is heading to and its ETA, from the last ping."""
+        state = self._buses.get(bus_id)
+        if state is None:
+            remote = self._remote(bus_id)
+            return self._remote_next_stop(bus_id, remote) if remote is not None else None
+        shape = self._routes.get(state.route_id)
+        if shape is None or state.next_stop >= len(shape):
+            return {"bus_id": bus_id, "route_id": state.route_id, "stop": None, "eta_min": None,
+                    "status": state.status}
+        i = state.next_stop
+        return {
+            "bus_id": bus_id,
+            "route_id": state.route_id,
+            "stop": {"seq": i, "name": shape.names[i], "lat": float(shape.lats[i]), "lon": float(shape.lons[i])},
+            "eta_min": round(state.etas[0], 1) if state.etas else None,
+            "status": state.status,
+        }
+
+    def delayed(self) -> List[Dict[str, Any]]:
+        """next_stop() of every bus currently running late."""
+        late = [self.next_stop(bus_id) for bus_id, state in list(self._buses.items()) if state.status == "Delayed"]
+        if self.shared is not None:
+            local = {str(bus_id) for bus_id in self._buses}
+            for bus_id, position in self.shared.all().items():
+                remote = position.get("eta")
+                if remote and remote["status"] == "Delayed" and bus_id not in local:
+                    late.append(self._remote_next_stop(bus_id, remote))
+        return late
+
+    def snapshot(self, bus_id) -> Optional[Dict[str, Any]]:
+        state = self._buses.get(bus_id)
+        if state is None:
+            return None
+        shape = self._routes.get(state.route_id)
+        return {
+            "bus_id": bus_id,
+            "route_id": state.route_id,
+            "location": {"lat": state.lat, "lng": state.lng},
+            "speed": round(state.speed_kmph, 1) if state.speed_kmph is not None else None,
+            "next_stop": state.next_stop,
+            "next_stop_name": shape.names[state.next_stop] if shape and state.next_stop < len(shape) else None,
+            "etas": [round(e, 1) for e in state.etas],
+            "status": state.status,
+            "updated_at": state.updated_at,
+        }
+
+    def remove(self, bus_id):
+        self._buses.pop(bus_id, None)
+
+
+# Shared engine fed by mobile_location_update
+eta_engine = EtaEngine()
+# Edited stops reload on the bus's next ping
+stop_cache.on_invalidate(eta_engine.invalidate_route)
@@ -0,0 +1,73 @@
+# utils/expense_ledger.py
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+
+GROUP_BY = ("vehicle", "category", "month")
+
+
+def month_of(column, dialect: str):
+    # 'YYYY-MM'; SQLite stores dates as ISO text
+    if dialect == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.substr(column, 1, 7)
+
+
+def expense_filters(start: Optional[date] = None, end: Optional[date] = None,
+                    vehicle: Optional[str] = None, category: Optional[str] = None) -> List[Any]:
+    from models import Expense
+
+    where = []
+    if start is not None:
+        where.append(Expense.spent_on >= start)
+    if end is not None:
+        where.append(Expense.spent_on <= end)
+    if vehicle is not None:
+        where.append(Expense.vehicle_number == vehicle)
+    if category is not None:
+        where.append(Expense.category == category)
+    return where
+
+
+def expense_totals(group_by: str, start: Optional[date] = None, end: Optional[date] = None,
+                   vehicle: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+    """Sum and count of expenses per vehicle, category or month, as one GROUP BY."""
+    from database import engine
+    from models import Expense
+
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    with engine.connect() as conn:
+        key = {"vehicle": Expense.vehicle_number, "category": Expense.category,
+               "month": month_of(Expense.spent_on, conn.dialect.name)}[group_by]
+        rows = conn.execute(select(key.label("key"), func.sum(Expense.amount), func.count())
+                            .where(*expense_filters(start, end, vehicle, category))
+                            .group_by(key).order_by(key)).all()
+    groups = [{group_by: k, "total": round(total, 2), "count": n} for k, total, n in rows]
+    return {"group_by": group_by, "start": start, "end": end,
+            "total": round(sum(g["total"] for g in groups), 2), "count": sum(g["count"] for g in groups),
+            "groups": groups}
+
+
+def cost_per_km(start: date, end: date, vehicle: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Expenses per vehicle over distance driven in the same days. Distance
+    comes from the fleet rollups, which live in the telemetry DB, so the
+    two per-vehicle aggregates are joined here rather than in SQL.
+    """
+    from utils.fleet_rollups import fleet_rollups
+
+    spent = {g["vehicle"]: g for g in expense_totals("vehicle", start, end, vehicle=vehicle)["groups"]}
+    driven = {g["bus"]: g["distance_km"]
+              for g in fleet_rollups.summary(start, end, "bus", bus_id=vehicle)["groups"]}
+    vehicles = []
+    for number in sorted(spent.keys() | driven.keys()):
+        total = spent[number]["total"] if number in spent else 0.0
+        km = driven.get(number, 0.0)
+        vehicles.append({"vehicle": number, "total": total, "distance_km": km,
+                         "cost_per_km": round(total / km, 2) if km else None})
+    total = round(sum(v["total"] for v in vehicles), 2)
+    km = round(sum(v["distance_km"] for v in vehicles), 2)
+    return {"start": start, "end": end, "total": total, "distance_km": km,
+            "cost_per_km": round(total / km, 2) if km else None, "vehicles": vehicles}
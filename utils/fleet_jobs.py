@@ -0,0 +1,133 @@
+# utils/fleet_jobs.py
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Set
+
+from sqlalchemy import insert, or_, select
+
+LICENSE_EXPIRY_WARN_DAYS = int(os.getenv("LICENSE_EXPIRY_WARN_DAYS", "30"))
+SERVICE_INTERVAL_DAYS = int(os.getenv("SERVICE_INTERVAL_DAYS", "180"))
+SERVICE_WARN_DAYS = int(os.getenv("SERVICE_WARN_DAYS", "7"))
+STALE_BUS_SECONDS = float(os.getenv("STALE_BUS_SECONDS", "300"))
+# Same licence / service alert is raised again at most this often
+FLEET_ALERT_REPEAT_HOURS = float(os.getenv("FLEET_ALERT_REPEAT_HOURS", "24"))
+
+LICENSE_CHECK_INTERVAL_S = float(os.getenv("LICENSE_CHECK_INTERVAL_S", "3600"))
+SERVICE_CHECK_INTERVAL_S = float(os.getenv("SERVICE_CHECK_INTERVAL_S", "3600"))
+STALE_CHECK_INTERVAL_S = float(os.getenv("STALE_CHECK_INTERVAL_S", "60"))
+
+
+def _alerted_keys(conn, alert_type: str, since: datetime, field: str) -> Set[Any]:
+    """meta_info[field] of every alert of this type raised since `since` (one indexed range scan)."""
+    from models import Alert
+
+    keys = set()
+    rows = conn.execute(select(Alert.meta_info).where(Alert.alert_type == alert_type, Alert.created_at >= since))
+    for meta, in rows:
+        try:
+            keys.add(json.loads(meta)[field])
+        except (TypeError, ValueError, KeyError):
+            continue
+    return keys
+
+
+def _raise_alerts(conn, alert_type: str, field: str, candidates: Iterable[Dict[str, Any]],
+                  since: datetime, now: datetime) -> int:
+    """Insert one Alert per candidate not already alerted since `since`, in a single statement."""
+    from models import Alert
+
+    seen = _alerted_keys(conn, alert_type, since, field)
+    rows = [{"alert_type": alert_type, "message": c.pop("message"), "created_at": now,
+             "meta_info": json.dumps(c, default=str)}
+            for c in candidates if c[field] not in seen]
+    if rows:
+        conn.execute(insert(Alert), rows)
+    return len(rows)
+
+
+def check_license_expiry(now: Optional[datetime] = None) -> int:
+    """Alert on driver licences expired or expiring within LICENSE_EXPIRY_WARN_DAYS."""
+    from database import engine
+    from models import Driver
+
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(days=LICENSE_EXPIRY_WARN_DAYS)
+    with engine.begin() as conn:
+        due = conn.execute(
+            select(Driver.id, Driver.name, Driver.license_number, Driver.license_expiry)
+            .where(Driver.license_expiry.is_not(None), Driver.license_expiry < horizon)
+        ).all()
+        candidates = [{
+            "driver_id": d.id,
+            "license_number": d.license_number,
+            "license_expiry": d.license_expiry.isoformat(),
+            "message": f"Licence of driver {d.name} {'expired' if d.license_expiry < now else 'expires'} "
+                       f"on {d.license_expiry.date().isoformat()}",
+        } for d in due]
+        return _raise_alerts(conn, "license_expiry", "driver_id", candidates,
+                             now - timedelta(hours=FLEET_ALERT_REPEAT_HOURS), now)
+
+
+def check_service_due(now: Optional[datetime] = None) -> int:
+    """Alert on vehicles due a service within SERVICE_WARN_DAYS, or with none on record."""
+    from database import engine
+    from models import Vehicle
+
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=SERVICE_INTERVAL_DAYS - SERVICE_WARN_DAYS)
+    with engine.begin() as conn:
+        due = conn.execute(
+            select(Vehicle.id, Vehicle.reg_no, Vehicle.last_service_date)
+            .where(or_(Vehicle.last_service_date.is_(None), Vehicle.last_service_date < cutoff))
+        ).all()
+        candidates = []
+        for v in due:
+            if v.last_service_date is None:
+                message = f"Vehicle {v.reg_no} has no service on record"
+            else:
+                due_on = v.last_service_date + timedelta(days=SERVICE_INTERVAL_DAYS)
+                message = f"Vehicle {v.reg_no} service {'overdue since' if due_on < now else 'due on'} " \
+                          f"{due_on.date().isoformat()}"
+            candidates.append({"vehicle_id": v.id, "reg_no": v.reg_no, "last_service_date": v.last_service_date,
+                               "message": message})
+        return _raise_alerts(conn, "service_due", "vehicle_id", candidates,
+                             now - timedelta(hours=FLEET_ALERT_REPEAT_HOURS), now)
+
+
+def flag_stale_buses(positions: Dict[str, Dict[str, Any]], now: Optional[float] = None) -> int:
+    """
+    Alert on buses whose last ping is older than STALE_BUS_SECONDS. Alerts
+    are keyed by the last ping, so each silent spell is reported once.
+    """
+    from database import engine
+
+    now = now or time.time()
+    stale = {bus_id: p["ts"] for bus_id, p in positions.items() if now - p.get("ts", now) > STALE_BUS_SECONDS}
+    if not stale:
+        return 0
+    oldest = datetime.utcfromtimestamp(min(stale.values()))
+    candidates = [{
+        "key": f"{bus_id}@{ts:.0f}",
+        "bus_id": bus_id,
+        "last_ping": ts,
+        "message": f"No location from bus {bus_id} for {int((now - ts) // 60)} min",
+    } for bus_id, ts in stale.items()]
+    with engine.begin() as conn:
+        return _raise_alerts(conn, "bus_stale", "key", candidates, oldest, datetime.utcfromtimestamp(now))
+
+
+async def stale_bus_job() -> int:
+    from utils.live_state import live_state
+
+    # Snapshot on the loop; the ping handler keeps writing to it
+    positions = live_state.all()
+    return await asyncio.to_thread(flag_stale_buses, positions)
+
+
+def register_fleet_jobs(scheduler):
+    scheduler.add("license_expiry", LICENSE_CHECK_INTERVAL_S, check_license_expiry, first_delay_s=30)
+    scheduler.add("service_due", SERVICE_CHECK_INTERVAL_S, check_service_due, first_delay_s=60)
+    scheduler.add("stale_buses", STALE_CHECK_INTERVAL_S, stale_bus_job)
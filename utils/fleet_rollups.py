@@ -0,0 +1,338 @@
+# utils/fleet_rollups.py
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (Column, Float, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, distinct,
+                        func, select)
+
+from utils.gps_utils import haversine_km
+
+log = logging.getLogger(__name__)
+
+ROLLUP_FLUSH_SECONDS = float(os.getenv("ROLLUP_FLUSH_SECONDS", "10"))
+# Gaps longer than this between two pings don't count as time in service
+ROLLUP_MAX_GAP_S = float(os.getenv("ROLLUP_MAX_GAP_S", "300"))
+# Faster than this between two pings is a GPS jump, not driving
+ROLLUP_MAX_SPEED_KMPH = float(os.getenv("ROLLUP_MAX_SPEED_KMPH", "120"))
+ROLLUP_MOVING_KMPH = float(os.getenv("ROLLUP_MOVING_KMPH", "3"))
+# Arrivals within this many minutes of schedule count as on time
+ROLLUP_ON_TIME_MIN = float(os.getenv("ROLLUP_ON_TIME_MIN", os.getenv("ETA_DELAY_THRESHOLD_MIN", "5")))
+# Planned service hours per bus per day, the denominator of utilization
+FLEET_SERVICE_HOURS = float(os.getenv("FLEET_SERVICE_HOURS", "8"))
+
+NO_ROUTE = 0
+GROUP_BY = ("none", "bus", "route", "day")
+
+metadata = MetaData()
+
+# One row per UTC day, bus and route; every column is additive so workers can upsert deltas
+bus_day = Table(
+    "fleet_rollup_day", metadata,
+    Column("day", String, nullable=False),
+    Column("bus_id", String, nullable=False),
+    Column("route_id", Integer, nullable=False, default=NO_ROUTE),
+    Column("pings", Integer, nullable=False, default=0),
+    Column("distance_km", Float, nullable=False, default=0),
+    Column("active_s", Float, nullable=False, default=0),
+    Column("moving_s", Float, nullable=False, default=0),
+    Column("first_ts", Float),
+    Column("last_ts", Float),
+    Column("arrivals", Integer, nullable=False, default=0),
+    Column("scheduled_arrivals", Integer, nullable=False, default=0),
+    Column("on_time", Integer, nullable=False, default=0),
+    Column("delay_min_sum", Float, nullable=False, default=0),
+    PrimaryKeyConstraint("day", "bus_id", "route_id"),
+    Index("ix_fleet_rollup_day_route", "route_id", "day"),
+)
+
+ADDITIVE = ("pings", "distance_km", "active_s", "moving_s", "arrivals", "scheduled_arrivals", "on_time",
+            "delay_min_sum")
+
+
+_day_names: Dict[int, str] = {}
+
+
+def utc_day(ts: float) -> str:
+    # Called per ping; formatting once per day number keeps it to a dict lookup
+    n = int(ts // 86400)
+    name = _day_names.get(n)
+    if name is None:
+        name = _day_names[n] = datetime.fromtimestamp(n * 86400, tz=timezone.utc).strftime("%Y-%m-%d")
+    return name
+
+
+def _route_key(route_id) -> int:
+    # The ETA engine keys ad-hoc stop lists by ("bus", id); only real routes are rolled up per route.
+    # JSON drivers may send the id as a string ("5")
+    if isinstance(route_id, str) and route_id.isdigit():
+        return int(route_id)
+    return route_id if isinstance(route_id, int) else NO_ROUTE
+
+
+def _new_delta() -> Dict[str, Any]:
+    return {**{c: 0 for c in ADDITIVE}, "first_ts": None, "last_ts": None}
+
+
+class PingFold:
+    """Per-bus running state turning consecutive pings into distance and time deltas."""
+
+    __slots__ = ("last",)
+
+    def __init__(self):
+        self.last: Dict[str, Tuple[float, float, float]] = {}
+
+    def step(self, delta: Dict[str, Any], bus_id: str, lat: float, lng: float, ts: float):
+        delta["pings"] += 1
+        delta["first_ts"] = ts if delta["first_ts"] is None else min(delta["first_ts"], ts)
+        delta["last_ts"] = ts if delta["last_ts"] is None else max(delta["last_ts"], ts)
+        prev = self.last.get(bus_id)
+        if prev is not None and prev[2] >= ts:
+            return  # out of order or duplicate: counted, but no movement
+        self.last[bus_id] = (lat, lng, ts)
+        if prev is None:
+            return
+        gap = ts - prev[2]
+        if gap > ROLLUP_MAX_GAP_S:
+            return
+        km = haversine_km(prev[0], prev[1], lat, lng)
+        kmph = km / gap * 3600
+        if kmph > ROLLUP_MAX_SPEED_KMPH:
+            return
+        delta["distance_km"] += km
+        delta["active_s"] += gap
+        if kmph >= ROLLUP_MOVING_KMPH:
+            delta["moving_s"] += gap
+
+
+class FleetRollups:
+    """
+    Per bus / route / day aggregates for fleet analytics, kept up to date as
+    pings and stop arrivals come in.
+
+    The ping handler and the ETA engine feed record_ping / record_arrival,
+    which only update an in-memory delta. A background task upserts the
+    deltas every ROLLUP_FLUSH_SECONDS by adding them to the stored row.
+    Dashboard queries group the small rollup table and never read the raw
+    ping history.
+    """
+
+    def __init__(self, engine=None, flush_seconds: float = ROLLUP_FLUSH_SECONDS):
+        self._engine = engine
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        self._fold = PingFold()
+        self._created = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"pings": 0, "arrivals": 0, "flushes": 0, "rows_upserted": 0, "errors": 0, "unknown_routes": 0}
+
+    @property
+    def engine(self):
+        # Next to the raw pings; the telemetry engine is created on first use
+        if self._engine is None:
+            from utils.telemetry import telemetry
+            self._engine = telemetry.store.engine
+        return self._engine
+
+    def create_tables(self):
+        if not self._created:
+            metadata.create_all(self.engine)
+            self._created = True
+
+    def _delta(self, ts: float, bus_id, route_id) -> Dict[str, Any]:
+        route_key = _route_key(route_id)
+        if route_key == NO_ROUTE and route_id is not None and not isinstance(route_id, tuple):
+            # Reported but not a route id we can group by; counted under no route
+            self.stats["unknown_routes"] += 1
+            log.debug("Bus %s reported route %r, rolled up without a route", bus_id, route_id)
+        key = (utc_day(ts), str(bus_id), route_key)
+        delta = self._pending.get(key)
+        if delta is None:
+            delta = self._pending[key] = _new_delta()
+        return delta
+
+    def record_ping(self, bus_id, lat: float, lng: float, ts: float, route_id=None):
+        self._fold.step(self._delta(ts, bus_id, route_id), str(bus_id), lat, lng, ts)
+        self.stats["pings"] += 1
+
+    def record_arrival(self, bus_id, route_id, seq: int, ts: float, delay_min: Optional[float]):
+        delta = self._delta(ts, bus_id, route_id)
+        delta["arrivals"] += 1
+        if delay_min is not None:
+            delta["scheduled_arrivals"] += 1
+            delta["delay_min_sum"] += max(delay_min, 0.0)
+            if delay_min <= ROLLUP_ON_TIME_MIN:
+                delta["on_time"] += 1
+        self.stats["arrivals"] += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # ---- writes ----
+    def _upsert(self, conn, rows: List[Dict[str, Any]]):
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            least, greatest = func.least, func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            least, greatest = func.min, func.max  # two-argument min/max are scalar in SQLite
+        stmt = insert(bus_day)
+        ex = stmt.excluded
+        set_ = {c: bus_day.c[c] + ex[c] for c in ADDITIVE}
+        for name, pick in (("first_ts", least), ("last_ts", greatest)):
+            stored, new = bus_day.c[name], ex[name]
+            set_[name] = pick(func.coalesce(stored, new), func.coalesce(new, stored))
+        conn.execute(stmt.on_conflict_do_update(index_elements=["day", "bus_id", "route_id"], set_=set_), rows)
+
+    def write(self, pending: Dict[Tuple[str, str, int], Dict[str, Any]]) -> int:
+        self.create_tables()
+        rows = [{"day": day, "bus_id": bus_id, "route_id": route_id, **delta}
+                for (day, bus_id, route_id), delta in pending.items()]
+        with self.engine.begin() as conn:
+            self._upsert(conn, rows)
+        return len(rows)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            try:
+                written = await asyncio.to_thread(self.write, pending)
+            except Exception as e:
+                log.warning("Rollup flush failed (%d rows): %s", len(pending), e)
+                self.stats["errors"] += 1
+                # Merge back so nothing is lost; newer deltas are simply added
+                for key, delta in pending.items():
+                    current = self._pending.setdefault(key, _new_delta())
+                    for c in ADDITIVE:
+                        current[c] += delta[c]
+                    for c, pick in (("first_ts", min), ("last_ts", max)):
+                        values = [v for v in (current[c], delta[c]) if v is not None]
+                        current[c] = pick(values) if values else None
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["rows_upserted"] += written
+            return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # ---- backfill from raw history ----
+    def scan_raw(self, store, start_ts: float, end_ts: float) -> Dict[Tuple[str, str, int], Dict[str, Any]]:
+        """Rollup deltas recomputed from raw pings (no route or arrival data in them)."""
+        from utils.telemetry import _partition_days
+
+        out: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        with store.engine.connect() as conn:
+            for name in _partition_days(start_ts, end_ts):
+                table = store._table(name, create=False)
+                if table is None:
+                    continue
+                fold = PingFold()
+                rows = conn.execute(select(table.c.bus_id, table.c.lat, table.c.lng, table.c.ts)
+                                    .where(table.c.ts >= start_ts, table.c.ts <= end_ts)
+                                    .order_by(table.c.bus_id, table.c.ts))
+                for bus_id, lat, lng, ts in rows:
+                    key = (utc_day(ts), bus_id, NO_ROUTE)
+                    delta = out.get(key)
+                    if delta is None:
+                        delta = out[key] = _new_delta()
+                    fold.step(delta, bus_id, lat, lng, ts)
+        return out
+
+    def backfill(self, store, start_day: date, end_day: date) -> int:
+        """Build rollups for days in [start_day, end_day] that have raw pings but no rollup rows yet."""
+        self.create_tables()
+        with self.engine.connect() as conn:
+            have = set(conn.execute(select(distinct(bus_day.c.day))
+                                    .where(bus_day.c.day.between(start_day.isoformat(), end_day.isoformat()))).scalars())
+        written = 0
+        day = start_day
+        while day <= end_day:
+            if day.isoformat() not in have:
+                start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+                deltas = self.scan_raw(store, start, start + 86400 - 1e-6)
+                if deltas:
+                    written += self.write(deltas)
+            day += timedelta(days=1)
+        return written
+
+    # ---- reads ----
+    def summary(self, start_day: date, end_day: date, group_by: str = "none",
+                route_id: Optional[int] = None, bus_id: Optional[str] = None) -> Dict[str, Any]:
+        """Fleet KPIs over [start_day, end_day] (UTC), overall and per group_by bucket."""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        self.create_tables()
+        c = bus_day.c
+        measures = [func.sum(c[name]).label(name) for name in ADDITIVE] + [
+            func.count(distinct(c.bus_id)).label("buses"),
+            func.count(distinct(c.bus_id + "|" + c.day)).label("bus_days"),
+        ]
+        where = [c.day >= start_day.isoformat(), c.day <= end_day.isoformat()]
+        if route_id is not None:
+            where.append(c.route_id == route_id)
+        if bus_id is not None:
+            where.append(c.bus_id == bus_id)
+
+        days = (end_day - start_day).days + 1
+        with self.engine.connect() as conn:
+            total = conn.execute(select(*measures).where(*where)).one()
+            groups = []
+            if group_by != "none":
+                column = {"bus": c.bus_id, "route": c.route_id, "day": c.day}[group_by]
+                for row in conn.execute(select(column.label("key"), *measures).where(*where)
+                                        .group_by(column).order_by(column)):
+                    groups.append({group_by: row.key, **_kpis(row, 1 if group_by == "day" else days)})
+        return {"start": start_day.isoformat(), "end": end_day.isoformat(), "group_by": group_by,
+                **_kpis(total, days), "groups": groups}
+
+
+def _kpis(row, days: int) -> Dict[str, Any]:
+    scheduled = row.scheduled_arrivals or 0
+    active_s = row.active_s or 0.0
+    # Service capacity: every bus that ran in the window, for every day of it
+    capacity_s = (row.buses or 0) * days * FLEET_SERVICE_HOURS * 3600
+    return {
+        "buses": row.buses or 0,
+        "bus_days": row.bus_days or 0,
+        "pings": row.pings or 0,
+        "distance_km": round(row.distance_km or 0.0, 2),
+        "active_hours": round(active_s / 3600, 2),
+        "moving_hours": round((row.moving_s or 0.0) / 3600, 2),
+        "arrivals": row.arrivals or 0,
+        "on_time_pct": round(100 * (row.on_time or 0) / scheduled, 1) if scheduled else None,
+        "avg_delay_min": round((row.delay_min_sum or 0.0) / scheduled, 2) if scheduled else None,
+        "utilization_pct": round(100 * active_s / capacity_s, 1) if capacity_s else None,
+    }
+
+
+def day_range(start: Optional[date], end: Optional[date], default_days: int = 7) -> Tuple[date, date]:
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=default_days - 1)
+    return start, end
+
+
+# Fed by the ping handler and the ETA engine's arrivals; flushed by the lifespan
+fleet_rollups = FleetRollups()
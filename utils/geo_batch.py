@@ -0,0 +1,92 @@
+# utils/geo_batch.py
+import json
+from typing import Any, Dict, List, Sequence, Union
+
+import numpy as np
+
+from utils.gps_utils import EARTH_RADIUS_KM
+
+# Route.stops is stored as JSON text: [{"lat":..,"lon":..,"name":..}]
+StopsLike = Union[str, Sequence[Dict[str, Any]], None]
+
+
+def _dtype(dtype):
+    # Accept np.float32, "float32", np.dtype(...) alike
+    return np.dtype(dtype).type
+
+
+def _arr(values, dtype):
+    return np.asarray(values, dtype=dtype)
+
+
+def _haversine(lat1, lon1, lat2, lon2, dtype):
+    # All inputs are already radians of the requested dtype and broadcastable
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return (dtype(EARTH_RADIUS_KM) * c).astype(dtype, copy=False)
+
+
+def haversine_pairwise(lat1, lon1, lat2, lon2, dtype=np.float64) -> np.ndarray:
+    """Element-wise distance (km) between two equally shaped arrays of points."""
+    dtype = _dtype(dtype)
+    return _haversine(np.radians(_arr(lat1, dtype)), np.radians(_arr(lon1, dtype)),
+                      np.radians(_arr(lat2, dtype)), np.radians(_arr(lon2, dtype)), dtype)
+
+
+def haversine_one_to_many(lat, lon, lats, lons, dtype=np.float64) -> np.ndarray:
+    """Distance (km) from one point to every point in lats/lons."""
+    dtype = _dtype(dtype)
+    return _haversine(np.radians(dtype(lat)), np.radians(dtype(lon)),
+                      np.radians(_arr(lats, dtype)), np.radians(_arr(lons, dtype)), dtype)
+
+
+def haversine_matrix(lats1, lons1, lats2=None, lons2=None, dtype=np.float64) -> np.ndarray:
+    """
+    N x M distance matrix (km) between two point sets.
+    With only the first set given, returns the symmetric N x N matrix.
+    """
+    dtype = _dtype(dtype)
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+    lat1 = np.radians(_arr(lats1, dtype))[:, None]
+    lon1 = np.radians(_arr(lons1, dtype))[:, None]
+    lat2 = np.radians(_arr(lats2, dtype))[None, :]
+    lon2 = np.radians(_arr(lons2, dtype))[None, :]
+    return _haversine(lat1, lon1, lat2, lon2, dtype)
+
+
+def parse_stops(stops: StopsLike) -> List[Dict[str, Any]]:
+    """Accept Route.stops JSON text or an already parsed list."""
+    if not stops:
+        return []
+    if isinstance(stops, str):
+        stops = json.loads(stops)
+    return list(stops)
+
+
+def stop_coordinates(stops: StopsLike, dtype=np.float64):
+    """(lats, lons) arrays for a stop list; accepts "lon" or "lng" keys."""
+    dtype = _dtype(dtype)
+    stops = parse_stops(stops)
+    lats = _arr([s["lat"] for s in stops], dtype)
+    lons = _arr([s["lon"] if "lon" in s else s["lng"] for s in stops], dtype)
+    return lats, lons
+
+
+def route_leg_km(stops: StopsLike, dtype=np.float64) -> np.ndarray:
+    """Length of each leg between consecutive stops (n - 1 values)."""
+    dtype = _dtype(dtype)
+    lats, lons = stop_coordinates(stops, dtype)
+    if len(lats) < 2:
+        return np.zeros(0, dtype=dtype)
+    return haversine_pairwise(lats[:-1], lons[:-1], lats[1:], lons[1:], dtype)
+
+
+def route_cumulative_km(stops: StopsLike, dtype=np.float64) -> np.ndarray:
+    """Distance along the route from the first stop to each stop (starts at 0)."""
+    legs = route_leg_km(stops, dtype)
+    cumulative = np.zeros(len(legs) + 1, dtype=dtype)
+    np.cumsum(legs, out=cumulative[1:])
+    return cumulative
@@ -1,9 +1,18 @@
 import math
 
+EARTH_RADIUS_KM = 6371
+
 def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371
+    # Scalar fast path for a single pair; use utils.geo_batch for many points at once
+    R = EARTH_RADIUS_KM
     dlat = math.radians(lat2-lat1)
     dlon = math.radians(lon2-lon1)
     a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R*c
+
+
+def haversine_many_km(lat, lon, lats, lons):
+    # Thin wrapper: one point against many, returned as a plain list
+    from utils.geo_batch import haversine_one_to_many
+    return haversine_one_to_many(lat, lon, lats, lons).tolist()
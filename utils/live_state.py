@@ -0,0 +1,155 @@
+# utils/live_state.py
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# redis://host:6379/0 shares bus positions between workers; empty keeps them in-process
+LIVE_STATE_URL = os.getenv("LIVE_STATE_URL", os.getenv("SIO_MESSAGE_QUEUE", ""))
+LIVE_STATE_KEY = os.getenv("LIVE_STATE_KEY", "transport:bus_positions")
+LIVE_STATE_SYNC_MS = int(os.getenv("LIVE_STATE_SYNC_MS", "500"))
+
+
+class LiveState:
+    """
+    Latest known position per bus. This base class keeps them in the process,
+    which is all a single worker needs. Reads and writes are plain dict
+    operations so the ping handler never waits on them.
+    """
+
+    # Whether other workers see these positions (and the ETA/trip snapshots stored with them)
+    shared = False
+
+    def __init__(self):
+        self._positions: Dict[str, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[Dict[str, Dict[str, Any]]], None]] = []
+
+    def set(self, bus_id, position: Dict[str, Any]):
+        self._positions[str(bus_id)] = position
+
+    def remove(self, bus_id):
+        self._positions.pop(str(bus_id), None)
+
+    def get(self, bus_id) -> Optional[Dict[str, Any]]:
+        return self._positions.get(str(bus_id))
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def on_sync(self, listener: Callable[[Dict[str, Dict[str, Any]]], None]):
+        """Called with every position after each sync with the shared store."""
+        self._listeners.append(listener)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class RedisLiveState(LiveState):
+    """
+    LiveState shared through one Redis hash (bus id -> JSON position).
+
+    Writes are buffered and sent once per tick in a single pipeline, which also
+    pulls the whole hash back. Reads stay local and synchronous, and they
+    include buses reporting to other workers, at most one tick stale.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, key: str = LIVE_STATE_KEY, sync_ms: int = LIVE_STATE_SYNC_MS):
+        super().__init__()
+        self.url = url
+        self.key = key
+        self.tick = sync_ms / 1000
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._removed: set = set()
+        self._redis = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"syncs": 0, "written": 0, "errors": 0}
+
+    def set(self, bus_id, position: Dict[str, Any]):
+        super().set(bus_id, position)
+        self._dirty[str(bus_id)] = position
+        self._removed.discard(str(bus_id))
+
+    def remove(self, bus_id):
+        super().remove(bus_id)
+        self._dirty.pop(str(bus_id), None)
+        self._removed.add(str(bus_id))
+
+    async def sync(self):
+        dirty, self._dirty = self._dirty, {}
+        removed, self._removed = self._removed, set()
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                if dirty:
+                    pipe.hset(self.key, mapping={k: json.dumps(v) for k, v in dirty.items()})
+                if removed:
+                    pipe.hdel(self.key, *removed)
+                pipe.hgetall(self.key)
+                shared = (await pipe.execute())[-1]
+        except Exception:
+            # Keep the writes for the next tick unless they've been superseded since
+            self._dirty = {**dirty, **self._dirty}
+            self._removed |= removed - set(self._dirty)
+            self.stats["errors"] += 1
+            raise
+
+        positions = {k.decode() if isinstance(k, bytes) else k: json.loads(v) for k, v in shared.items()}
+        # Pings that arrived during the round trip are newer than what came back
+        positions.update(self._dirty)
+        for bus_id in self._removed:
+            positions.pop(bus_id, None)
+        self._positions = positions
+        self.stats["syncs"] += 1
+        self.stats["written"] += len(dirty)
+        for listener in self._listeners:
+            listener(positions)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.sync()
+            except Exception as e:
+                log.warning("Live state sync failed: %s", e)
+
+    async def start(self):
+        from redis import asyncio as aioredis
+
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(self.url)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._redis is not None:
+            try:
+                await self.sync()
+            except Exception as e:
+                log.warning("Live state sync failed: %s", e)
+            await self._redis.aclose()
+            self._redis = None
+
+
+def create_live_state(url: str = LIVE_STATE_URL) -> LiveState:
+    return RedisLiveState(url) if url else LiveState()
+
+
+# Replaces the module-level bus_locations dict in main
+live_state = create_live_state()
@@ -0,0 +1,321 @@
+# utils/metrics.py
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "transport")
+# Exposes stack samples of the running app, so off unless asked for
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Seconds: sub-millisecond socket handlers up to slow upstream calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+# Counts: buses per frame, recipients per emit, rows per batch
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Bucketed observations per label set, rendered as a Prometheus histogram.
+    observe() is a bisect and three increments; series are created on first use.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()  # DB timings are observed from worker threads
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, name: str) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(counts), total, n) for labels, (counts, total, n) in self._series.items()]
+        for labels, counts, total, n in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                yield f"{name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{name}_sum{_labels(self.labels, labels)} {total!r}"
+            yield f"{name}_count{_labels(self.labels, labels)} {n}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, name: str) -> Iterable[str]:
+        for labels, value in sorted(self._values.items()):
+            yield f"{name}_total{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge:
+    """
+    Read at scrape time from a callback, so nothing runs on the hot path.
+    fn returns a number, or {label value: number} when the gauge has one label.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def render(self, name: str) -> Iterable[str]:
+        value = self.fn()
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                if v is not None:
+                    yield f"{name}{_labels(self.labels, (key,))} {_number(v)}"
+        elif value is not None:
+            yield f"{name} {_number(value)}"
+
+
+class StatsCounters:
+    """A component's existing `stats` dict of running totals, exported as counters."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, fn: Callable[[], Dict[str, Any]]):
+        self.name = name
+        self.help = f"{name} counters"
+        self.fn = fn
+
+    def render(self, name: str) -> Iterable[str]:
+        for key, value in sorted(self.fn().items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{name}_total{_labels(('counter',), (key,))} {_number(value)}"
+
+
+class Registry:
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+
+    def _add(self, metric):
+        # Modules are imported once, but benchmarks re-create components; keep the first
+        return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help, fn, labels)
+        self._metrics[name] = metric
+        return metric
+
+    def stats(self, name: str, fn: Callable[[], Dict[str, Any]]) -> StatsCounters:
+        metric = StatsCounters(name, fn)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            full = f"{self.prefix}_{name}" if self.prefix else name
+            try:
+                samples = list(metric.render(full))
+            except Exception as e:
+                # One broken callback shouldn't take the whole scrape down
+                lines.append(f"# {full}: {type(e).__name__}: {e}")
+                continue
+            lines.append(f"# HELP {full} {metric.help}")
+            lines.append(f"# TYPE {full} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry rendered by GET /metrics
+metrics = Registry()
+
+http_requests = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                                  ("method", "route", "status"))
+sio_events = metrics.histogram("sio_event_duration_seconds", "Socket.IO handler duration by event", ("event",))
+sio_errors = metrics.counter("sio_event_errors", "Socket.IO handlers that raised", ("event",))
+emit_fanout = metrics.histogram("sio_emit_recipients", "Local clients reached per emit", ("event",),
+                                buckets=SIZE_BUCKETS)
+db_queries = metrics.histogram("db_query_duration_seconds", "Statement execution time", ("db", "statement"))
+db_sessions = metrics.histogram("db_session_duration_seconds", "Request-scoped DB session lifetime")
+upstream_calls = metrics.histogram("upstream_request_duration_seconds", "Outbound API call latency",
+                                   ("service", "outcome"))
+
+
+class RequestMetrics:
+    """
+    ASGI middleware timing every HTTP request into http_requests. Labelled
+    with the matched route template (/api/transport/payments/{payment_id}),
+    not the raw path, so the series count stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope it was handed
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.observe(time.perf_counter() - start, scope["method"], route, str(status))
+
+
+def timed_event(handler):
+    """Wrap a Socket.IO handler so its duration and failures land in sio_events / sio_errors."""
+    if not METRICS_ENABLED:
+        return handler
+    event = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return await handler(*args)
+        except Exception:
+            sio_errors.inc(event)
+            raise
+        finally:
+            sio_events.observe(time.perf_counter() - start, event)
+
+    return wrapper
+
+
+def recipients(sio, room: str) -> Optional[int]:
+    """Clients in room on this worker; None behind a message queue, where other workers have more."""
+    from socketio.async_pubsub_manager import AsyncPubSubManager
+
+    if isinstance(sio.manager, AsyncPubSubManager):
+        return None
+    return len(sio.manager.rooms.get("/", {}).get(room) or ())
+
+
+def observe_upstream(service: str, start: float, ok: bool = True):
+    upstream_calls.observe(time.perf_counter() - start, service, "ok" if ok else "error")
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement run on engine (sync engine, or async_engine.sync_engine)."""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _done(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement else "other"
+        db_queries.observe(time.perf_counter() - conn.info["query_start"].pop(), name, verb)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        # after_cursor_execute never runs for a failed statement
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every interval and counts identical
+    stacks, in the folded "a;b;c count" format flamegraph.pl and speedscope
+    read. Sampling runs on its own thread; the profiled thread does nothing
+    extra.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self, top: Optional[int] = None) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common(top))
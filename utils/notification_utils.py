@@ -1,4 +1,353 @@
+# utils/notification_utils.py
+import asyncio
+import logging
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "50000"))
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "100"))
+# How long a worker waits for a partial batch to fill before sending it
+NOTIFY_BATCH_WAIT_MS = int(os.getenv("NOTIFY_BATCH_WAIT_MS", "20"))
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "4"))
+NOTIFY_RETRY_BASE_MS = int(os.getenv("NOTIFY_RETRY_BASE_MS", "500"))
+# Identical (target, title, message) within this window is sent once
+NOTIFY_DEDUP_WINDOW_S = float(os.getenv("NOTIFY_DEDUP_WINDOW_S", "300"))
+# Per-recipient token bucket: sustained messages per minute and burst size
+NOTIFY_RATE_PER_MIN = float(os.getenv("NOTIFY_RATE_PER_MIN", "10"))
+NOTIFY_RATE_BURST = int(os.getenv("NOTIFY_RATE_BURST", "5"))
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL")  # unset = log only
+NOTIFY_TIMEOUT = float(os.getenv("NOTIFY_TIMEOUT", "10"))
+
+
+class Notification:
+    __slots__ = ("target", "title", "message", "metadata", "provider", "enqueued_at", "attempts")
+
+    def __init__(self, target, title: str, message: str, metadata: Optional[Dict[str, Any]] = None,
+                 provider: str = "push"):
+        self.target = target
+        self.title = title
+        self.message = message
+        self.metadata = metadata
+        self.provider = provider
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"target": self.target, "title": self.title, "message": self.message, "metadata": self.metadata}
+
+
+class Provider(ABC):
+    """
+    Outbound channel adapter (FCM, OneSignal, an SMS gateway, ...). send_batch
+    gets up to batch_size notifications and returns one entry per item: None
+    when delivered, or the exception to retry it with. Raising fails the
+    whole batch.
+    """
+
+    batch_size = NOTIFY_BATCH_SIZE
+
+    @abstractmethod
+    async def send_batch(self, batch: List[Notification]) -> List[Optional[Exception]]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class LogProvider(Provider):
+    """What send_push_notification always did: log it."""
+
+    async def send_batch(self, batch):
+        for n in batch:
+            log.info("SEND PUSH -> %s %s %s", n.target, n.title, n.message)
+        return [None] * len(batch)
+
+
+class WebhookProvider(Provider):
+    """POSTs each batch as {"notifications": [...]} to a relay over one pooled connection."""
+
+    def __init__(self, url: str, timeout: float = NOTIFY_TIMEOUT, max_connections: int = NOTIFY_CONCURRENCY):
+        import httpx
+
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    async def send_batch(self, batch):
+        resp = await self._client.post(self.url, json={"notifications": [n.as_dict() for n in batch]})
+        resp.raise_for_status()
+        # The relay may report per-item failures as {"failed": [index, ...]}
+        failed = set((resp.json() or {}).get("failed", [])) if resp.content else set()
+        return [RuntimeError("rejected by provider") if i in failed else None for i in range(len(batch))]
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FakeProvider(Provider):
+    """In-memory provider for tests and benchmarks: fixed latency per batch and random failures."""
+
+    def __init__(self, latency_ms: float = 0, failure_rate: float = 0.0, batch_size: int = NOTIFY_BATCH_SIZE,
+                 seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.sent: List[Notification] = []
+        self.batches = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_batch(self, batch):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self.batches += 1
+            results = []
+            for n in batch:
+                if self.rng.random() < self.failure_rate:
+                    results.append(RuntimeError("provider temporarily unavailable"))
+                else:
+                    self.sent.append(n)
+                    results.append(None)
+            return results
+        finally:
+            self.in_flight -= 1
+
+
+class NotificationDispatcher:
+    """
+    Async outbound queue in front of the providers.
+
+    notify() never blocks: it drops duplicates and rate-limited messages up
+    front, then queues the rest. One worker per provider drains its queue
+    in batches. Up to `concurrency` batches are in flight at once. Failed
+    items are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, providers: Optional[Dict[str, Provider]] = None, queue_size: int = NOTIFY_QUEUE_SIZE,
+                 concurrency: int = NOTIFY_CONCURRENCY, batch_wait_ms: int = NOTIFY_BATCH_WAIT_MS,
+                 max_retries: int = NOTIFY_MAX_RETRIES, retry_base_ms: int = NOTIFY_RETRY_BASE_MS,
+                 dedup_window_s: float = NOTIFY_DEDUP_WINDOW_S, rate_per_min: float = NOTIFY_RATE_PER_MIN,
+                 rate_burst: int = NOTIFY_RATE_BURST):
+        self.providers = providers or {"push": WebhookProvider(NOTIFY_WEBHOOK_URL) if NOTIFY_WEBHOOK_URL
+                                       else LogProvider()}
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_retries = max_retries
+        self.retry_base = retry_base_ms / 1000
+        self.dedup_window = dedup_window_s
+        self.rate = rate_per_min / 60
+        self.burst = rate_burst
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._sending: set = set()
+        self._retrying: set = set()
+        self._unfinished = 0  # queued, in a batch or waiting to retry
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._recent: Dict[Tuple[Any, str, str], float] = {}
+        self._buckets: Dict[Any, Tuple[float, float]] = {}  # target -> (tokens, updated_at)
+        self._latencies = deque(maxlen=5000)
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retried": 0, "deduped": 0, "rate_limited": 0,
+                      "dropped": 0, "batches": 0}
+
+    def add_provider(self, name: str, provider: Provider):
+        self.providers[name] = provider
+        if self._loop is not None:
+            self._start_worker(name)
+
+    def _is_duplicate(self, key, now: float) -> bool:
+        if len(self._recent) > 4 * self.queue_size:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+        last = self._recent.get(key)
+        return last is not None and now - last < self.dedup_window
+
+    def _take_token(self, target, now: float) -> bool:
+        if len(self._buckets) > 4 * self.queue_size:
+            # Buckets that have refilled are the same as no bucket
+            self._buckets = {k: (tokens, t) for k, (tokens, t) in self._buckets.items()
+                             if tokens + (now - t) * self.rate < self.burst}
+        tokens, updated = self._buckets.get(target, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[target] = (tokens, now)
+            return False
+        self._buckets[target] = (tokens - 1, now)
+        return True
+
+    def notify(self, target, title: str, message: str, metadata: Optional[Dict[str, Any]] = None,
+               provider: str = "push") -> bool:
+        """Queue one notification; False if it was a duplicate, rate-limited or the queue is full."""
+        if provider not in self.providers:
+            raise KeyError(f"unknown notification provider {provider!r}")
+        now = time.monotonic()
+        key = (target, title, message)
+        if self.dedup_window and self._is_duplicate(key, now):
+            self.stats["deduped"] += 1
+            return False
+        if self.rate and not self._take_token(target, now):
+            self.stats["rate_limited"] += 1
+            return False
+        queue = self._queue(provider)
+        try:
+            queue.put_nowait(Notification(target, title, message, metadata, provider))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        # Only what was actually queued suppresses repeats; a dropped or rate-limited one can be retried
+        if self.dedup_window:
+            self._recent[key] = now
+        self.stats["queued"] += 1
+        self._unfinished += 1
+        return True
+
+    def notify_many(self, targets: Iterable[Any], title: str, message: str,
+                    metadata: Optional[Dict[str, Any]] = None, provider: str = "push") -> int:
+        """Same message to many recipients (e.g. every parent on a delayed route); returns how many were queued."""
+        return sum(self.notify(t, title, message, metadata, provider) for t in targets)
+
+    def _queue(self, provider: str) -> asyncio.Queue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            queue = self._queues[provider] = asyncio.Queue(maxsize=self.queue_size)
+        return queue
+
+    async def _next_batch(self, queue: asyncio.Queue, size: int) -> List[Notification]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _work(self, name: str):
+        provider = self.providers[name]
+        queue = self._queue(name)
+        while True:
+            batch = await self._next_batch(queue, provider.batch_size)
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._send(provider, batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, provider: Provider, batch: List[Notification]):
+        try:
+            try:
+                results = await provider.send_batch(batch)
+            except Exception as e:
+                results = [e] * len(batch)
+        finally:
+            self._semaphore.release()
+        self.stats["batches"] += 1
+        now = time.monotonic()
+        for n, error in zip(batch, results):
+            n.attempts += 1
+            if error is None:
+                self.stats["sent"] += 1
+                self._unfinished -= 1
+                self._latencies.append(now - n.enqueued_at)
+            elif n.attempts > self.max_retries:
+                self.stats["failed"] += 1
+                self._unfinished -= 1
+                log.warning("Notification to %s failed after %d attempts: %s", n.target, n.attempts, error)
+            else:
+                self.stats["retried"] += 1
+                delay = self.retry_base * 2 ** (n.attempts - 1) * random.uniform(0.5, 1.5)
+                task = asyncio.create_task(self._retry_later(n, delay))
+                self._retrying.add(task)
+                task.add_done_callback(self._retrying.discard)
+
+    async def _retry_later(self, n: Notification, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self._queue(n.provider).put_nowait(n)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            self._unfinished -= 1
+
+    def _start_worker(self, name: str):
+        self._workers.append(asyncio.create_task(self._work(name)))
+
+    def start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            for name in self.providers:
+                self._start_worker(name)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until everything queued (including pending retries) has been sent or given up on."""
+        async def idle():
+            while self._unfinished:
+                await asyncio.sleep(0.005)
+        await asyncio.wait_for(idle(), timeout)
+
+    async def stop(self, timeout: float = 10):
+        if self._loop is None:
+            return
+        try:
+            await self.drain(timeout)
+        except asyncio.TimeoutError:
+            log.warning("Notifications: stopping with %d not yet sent", self._unfinished)
+        for task in self._workers + list(self._sending) + list(self._retrying):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._sending, *self._retrying, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+        for provider in self.providers.values():
+            await provider.close()
+
+    @property
+    def pending(self) -> int:
+        return self._unfinished
+
+    def latency_percentiles(self) -> Dict[str, Optional[float]]:
+        """Queue-to-delivered latency in ms over the recent window."""
+        samples = sorted(self._latencies)
+        if not samples:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+        pick = lambda q: round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 2)
+        return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+# Shared dispatcher, started by the app lifespan
+notifier = NotificationDispatcher()
+
+
 def send_push_notification(target, title, message, metadata=None):
-    # Placeholder: hook into FCM / OneSignal / local SMS provider
-    print("SEND PUSH ->", target, title, message)
-    return True
+    """
+    Queue a push notification; returns without waiting for delivery. Safe to
+    call from worker threads (it hands over to the event loop). False means
+    it was dropped: duplicate, rate-limited or queue full.
+    """
+    loop = notifier._loop
+    if loop is not None and not _on_loop(loop):
+        loop.call_soon_threadsafe(notifier.notify, target, title, message, metadata)
+        return True
+    return notifier.notify(target, title, message, metadata)
+
+
+def _on_loop(loop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
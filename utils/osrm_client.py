@@ -0,0 +1,256 @@
+# utils/osrm_client.py
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.cache import TTLCache
+from utils.geo_batch import haversine_matrix
+from utils.metrics import observe_upstream
+
+if TYPE_CHECKING:
+    import httpx
+
+log = logging.getLogger(__name__)
+
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
+OSRM_TIMEOUT = float(os.getenv("OSRM_TIMEOUT", "10"))
+OSRM_MAX_CONNECTIONS = int(os.getenv("OSRM_MAX_CONNECTIONS", "20"))
+OSRM_CACHE_SIZE = int(os.getenv("OSRM_CACHE_SIZE", "100000"))
+OSRM_CACHE_TTL = int(os.getenv("OSRM_CACHE_TTL", str(24 * 3600)))
+OSRM_CACHE_PATH = os.getenv("OSRM_CACHE_PATH")  # unset = memory only
+# 4 decimals is ~11 m, well inside a bus stop
+OSRM_COORD_PRECISION = int(os.getenv("OSRM_COORD_PRECISION", "4"))
+# Coordinates the server accepts in one table request (osrm-routed --max-table-size)
+OSRM_MAX_TABLE_SIZE = int(os.getenv("OSRM_MAX_TABLE_SIZE", "100"))
+# Table requests are split into blocks of at most this many sources/destinations; a block
+# sends its sources plus its destinations, so more than half the server limit gets rejected
+OSRM_TABLE_CHUNK = int(os.getenv("OSRM_TABLE_CHUNK", str(OSRM_MAX_TABLE_SIZE // 2)))
+OSRM_TABLE_CONCURRENCY = int(os.getenv("OSRM_TABLE_CONCURRENCY", "4"))
+# Used when OSRM is unreachable: straight-line distance stretched to road distance
+OSRM_FALLBACK_ROAD_FACTOR = float(os.getenv("OSRM_FALLBACK_ROAD_FACTOR", "1.3"))
+OSRM_FALLBACK_SPEED_KMPH = float(os.getenv("OSRM_FALLBACK_SPEED_KMPH", "25"))
+
+
+class OsrmError(Exception):
+    def __init__(self, message: str, details: Any = None):
+        super().__init__(message)
+        self.details = details
+
+
+class OsrmClient:
+    """
+    Shared OSRM client: one pooled httpx.AsyncClient for the app lifetime,
+    a TTL/LRU cache of routes keyed on rounded coordinates, and collapsing of
+    identical in-flight requests into a single upstream call.
+    """
+
+    def __init__(self, base_url: str = OSRM_BASE_URL, cache_size: int = OSRM_CACHE_SIZE,
+                 cache_ttl: float = OSRM_CACHE_TTL, cache_path: Optional[str] = OSRM_CACHE_PATH,
+                 precision: int = OSRM_COORD_PRECISION):
+        self.base_url = base_url.rstrip("/")
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.cache_path = cache_path
+        self.precision = precision
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._latencies = deque(maxlen=2000)
+        self.stats = {"requests": 0, "upstream_calls": 0, "collapsed": 0, "errors": 0,
+                      "table_requests": 0, "table_fallbacks": 0}
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # Created on first use: works outside the app lifespan and keeps
+        # httpx out of the import path of a cold start
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=OSRM_TIMEOUT,
+                limits=httpx.Limits(max_connections=OSRM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=OSRM_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    async def start(self):
+        if self.cache_path:
+            try:
+                loaded = self.cache.load(self.cache_path)
+                log.info("OSRM cache: loaded %d routes from %s", loaded, self.cache_path)
+            except Exception as e:
+                log.warning("OSRM cache: could not load %s: %s", self.cache_path, e)
+
+    async def close(self):
+        if self.cache_path:
+            try:
+                self.cache.dump(self.cache_path)
+            except Exception as e:
+                log.warning("OSRM cache: could not save %s: %s", self.cache_path, e)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _coord(self, lat: float, lng: float) -> str:
+        # OSRM wants lng,lat; rounding makes nearby requests share a cache entry
+        p = self.precision
+        return f"{round(lng, p)},{round(lat, p)}"
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["upstream_calls"] += 1
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(path, params=params)
+            data = response.json()
+        except Exception:
+            self.stats["errors"] += 1
+            observe_upstream("osrm", start, ok=False)
+            raise
+        finally:
+            self._latencies.append((time.perf_counter() - start) * 1000)
+        observe_upstream("osrm", start, ok=data.get("code") == "Ok")
+        if data.get("code") != "Ok":
+            self.stats["errors"] += 1
+            raise OsrmError("OSRM failed", data)
+        return data
+
+    async def _collapse(self, key: str, fetch):
+        """Run fetch() once for all concurrent callers asking for the same key."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["collapsed"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fetch())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> Dict[str, Any]:
+        """Driving route between two points as {distance_km, duration_min, geometry}."""
+        self.stats["requests"] += 1
+        coords = f"{self._coord(start_lat, start_lng)};{self._coord(end_lat, end_lng)}"
+        key = f"route:{coords}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            data = await self._get(f"/route/v1/driving/{coords}", {"overview": "full", "geometries": "geojson"})
+            route = data["routes"][0]
+            result = {
+                "distance_km": round(route["distance"] / 1000, 2),
+                "duration_min": round(route["duration"] / 60, 2),
+                "geometry": route["geometry"],
+            }
+            self.cache.set(key, result)
+            self.cache.set(self._leg_key(self._coord(start_lat, start_lng), self._coord(end_lat, end_lng)),
+                           {"distance_km": result["distance_km"], "duration_min": result["duration_min"]})
+            return result
+
+        return await self._collapse(key, fetch)
+
+    @staticmethod
+    def _leg_key(origin: str, destination: str) -> str:
+        return f"leg:{origin};{destination}"
+
+    async def table(self, points: Sequence[Tuple[float, float]], chunk: int = OSRM_TABLE_CHUNK,
+                    concurrency: int = OSRM_TABLE_CONCURRENCY) -> Dict[str, Any]:
+        """
+        Duration (min) and distance (km) matrices between all (lat, lng) points.
+
+        Large inputs are split into chunk x chunk blocks fetched concurrently,
+        capped so a block's sources plus destinations fit OSRM_MAX_TABLE_SIZE.
+        Blocks fully covered by cached legs skip the upstream call, and blocks
+        that fail fall back to a haversine estimate, counted in
+        "fallback_blocks" of the result.
+        """
+        self.stats["table_requests"] += 1
+        chunk = max(1, min(chunk, OSRM_MAX_TABLE_SIZE // 2))
+        n = len(points)
+        coords = [self._coord(lat, lng) for lat, lng in points]
+        durations: List[List[Optional[float]]] = [[None] * n for _ in range(n)]
+        distances: List[List[Optional[float]]] = [[None] * n for _ in range(n)]
+        blocks = [list(range(i, min(i + chunk, n))) for i in range(0, n, chunk)]
+        sem = asyncio.Semaphore(concurrency)
+        sources_used = set()
+        fallbacks = 0
+
+        async def fill_block(src: List[int], dst: List[int]):
+            nonlocal fallbacks
+            legs = {(i, j): self.cache.get(self._leg_key(coords[i], coords[j])) for i in src for j in dst}
+            if all(leg is not None for leg in legs.values()):
+                for (i, j), leg in legs.items():
+                    durations[i][j], distances[i][j] = leg["duration_min"], leg["distance_km"]
+                sources_used.add("cache")
+                return
+
+            # One upstream call per block: the union of points, addressed by sources/destinations
+            union = sorted(set(src) | set(dst))
+            pos = {idx: k for k, idx in enumerate(union)}
+            path = "/table/v1/driving/" + ";".join(coords[i] for i in union)
+            params = {
+                "sources": ";".join(str(pos[i]) for i in src),
+                "destinations": ";".join(str(pos[j]) for j in dst),
+                "annotations": "duration,distance",
+            }
+            try:
+                async with sem:
+                    data = await self._collapse(f"table:{path}?{params['sources']}|{params['destinations']}",
+                                                lambda: self._get(path, params))
+            except Exception as e:
+                log.warning("OSRM table block failed, using haversine fallback: %s", e)
+                self.stats["table_fallbacks"] += 1
+                fallbacks += 1
+                self._fill_fallback(points, src, dst, durations, distances)
+                sources_used.add("haversine")
+                return
+
+            for a, i in enumerate(src):
+                for b, j in enumerate(dst):
+                    dur = data["durations"][a][b]
+                    dist = data["distances"][a][b]
+                    if dur is None or dist is None:
+                        continue
+                    durations[i][j] = round(dur / 60, 2)
+                    distances[i][j] = round(dist / 1000, 3)
+                    self.cache.set(self._leg_key(coords[i], coords[j]),
+                                   {"distance_km": distances[i][j], "duration_min": durations[i][j]})
+            sources_used.add("osrm")
+
+        await asyncio.gather(*(fill_block(src, dst) for src in blocks for dst in blocks))
+        return {
+            "durations_min": durations,
+            "distances_km": distances,
+            "source": sources_used.pop() if len(sources_used) == 1 else "mixed",
+            "fallback_blocks": fallbacks,
+        }
+
+    @staticmethod
+    def _fill_fallback(points, src, dst, durations, distances):
+        km = haversine_matrix([points[i][0] for i in src], [points[i][1] for i in src],
+                              [points[j][0] for j in dst], [points[j][1] for j in dst]) * OSRM_FALLBACK_ROAD_FACTOR
+        minutes = km / OSRM_FALLBACK_SPEED_KMPH * 60
+        for a, i in enumerate(src):
+            for b, j in enumerate(dst):
+                distances[i][j] = round(float(km[a][b]), 3)
+                durations[i][j] = round(float(minutes[a][b]), 2)
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def pct(q):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))], 2) if latencies else None
+
+        return {
+            **self.stats,
+            "cache": self.cache.stats(),
+            "inflight": len(self._inflight),
+            "upstream_latency_ms": {"p50": pct(0.5), "p99": pct(0.99), "samples": len(latencies)},
+        }
+
+
+# Shared instance, opened and closed by the app lifespan in main.py
+osrm = OsrmClient()
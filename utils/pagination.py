@@ -0,0 +1,96 @@
+# utils/pagination.py
+import base64
+import json
+import os
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+# Rows pulled from the DB cursor per chunk while streaming NDJSON
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "500"))
+CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = [v.isoformat() if isinstance(v, date) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> List[Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(columns):
+            raise ValueError
+        # Cursor values come back as JSON; restore dates / datetimes so the comparison binds correctly
+        return [_date_type(c).fromisoformat(v) if isinstance(v, str) and _date_type(c) else v
+                for v, c in zip(raw, columns)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _date_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    return python_type if python_type in (date, datetime) else None
+
+
+def keyset(stmt, columns, cursor: Optional[str] = None, descending: bool = False):
+    """
+    Order stmt by columns (the last one must be unique, usually the id) and
+    start after the row the cursor points at. The WHERE clause is a plain
+    row-value comparison spelled out with AND/OR so it works on SQLite too.
+    """
+    stmt = stmt.order_by(*(c.desc() if descending else c.asc() for c in columns))
+    if not cursor:
+        return stmt
+    values = decode_cursor(cursor, columns)
+    clauses = []
+    for i, column in enumerate(columns):
+        after = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*(columns[j] == values[j] for j in range(i)), after))
+    return stmt.where(or_(*clauses))
+
+
+def page_limit(limit: Optional[int]) -> int:
+    return min(limit or PAGE_SIZE, MAX_PAGE_SIZE)
+
+
+async def paginate(s, stmt, columns, cursor: Optional[str], limit: Optional[int],
+                   response: Response, descending: bool = False):
+    """One page of rows; the cursor for the next page goes in the X-Next-Cursor header."""
+    limit = page_limit(limit)
+    # One extra row tells us whether another page exists without a COUNT
+    rows = (await s.exec(keyset(stmt, columns, cursor, descending).limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[CURSOR_HEADER] = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows
+
+
+def ndjson(session_maker, stmt, columns, cursor: Optional[str] = None,
+           limit: Optional[int] = None, descending: bool = False) -> StreamingResponse:
+    """
+    Stream every matching row as one JSON object per line. Rows are read from
+    the DB in STREAM_BATCH chunks and written as they arrive, so memory stays
+    flat however large the table is. Uses its own session: the request-scoped
+    one may be closed before the body is fully sent.
+    """
+    stmt = keyset(stmt, columns, cursor, descending)
+    if limit:
+        stmt = stmt.limit(limit)
+
+    async def rows():
+        async with session_maker() as s:
+            result = await s.stream(stmt.execution_options(yield_per=STREAM_BATCH))
+            async for batch in result.scalars().partitions():
+                yield "".join(row.model_dump_json() + "\n" for row in batch)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
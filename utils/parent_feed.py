@@ -0,0 +1,134 @@
+# utils/parent_feed.py
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+from utils.broadcast import has_subscribers
+from utils.metrics import METRICS_ENABLED, emit_fanout, recipients
+
+log = logging.getLogger(__name__)
+
+PARENT_PUSH_TICK_MS = int(os.getenv("PARENT_PUSH_TICK_MS", "1000"))
+# Minimum gap between two updates for the same bus, whatever the ping rate
+PARENT_PUSH_MIN_INTERVAL = float(os.getenv("PARENT_PUSH_MIN_INTERVAL", "3"))
+UPDATE_EVENT = "tracking_update"
+
+
+def parent_room(bus_id) -> str:
+    return f"parent:{bus_id}"
+
+
+class ParentFeed:
+    """
+    Push channel for parents tracking a student.
+
+    A parent subscribes once and gets a full snapshot; after that each bus
+    room receives only the fields that changed (position, speed, ETAs, status),
+    at most once per PARENT_PUSH_MIN_INTERVAL. Every student on a bus shares
+    the bus's room, so one frame is computed and encoded per bus, not per parent.
+    """
+
+    def __init__(self, sio, eta_engine, tick_ms: int = PARENT_PUSH_TICK_MS,
+                 min_interval: float = PARENT_PUSH_MIN_INTERVAL):
+        self.sio = sio
+        self.eta_engine = eta_engine
+        self.tick = tick_ms / 1000
+        self.min_interval = min_interval
+        self._dirty: Set[Any] = set()
+        self._last_frame: Dict[Any, Dict[str, Any]] = {}
+        self._last_sent: Dict[Any, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"subscribes": 0, "frames": 0, "throttled": 0, "unchanged": 0}
+
+    async def subscribe(self, sid, bus_id, snapshot: Dict[str, Any]):
+        await self.sio.enter_room(sid, parent_room(bus_id))
+        self.stats["subscribes"] += 1
+        # The snapshot already reflects the current state, so the next delta builds on it
+        self._last_frame.setdefault(bus_id, self._frame(bus_id) or {})
+        return snapshot
+
+    async def unsubscribe(self, sid, bus_id):
+        await self.sio.leave_room(sid, parent_room(bus_id))
+
+    def mark(self, bus_id):
+        # Called from the ping handler; the work happens on the next tick
+        self._dirty.add(bus_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def _frame(self, bus_id) -> Optional[Dict[str, Any]]:
+        state = self.eta_engine.get(bus_id)
+        if state is None:
+            return None
+        # Rounded so GPS jitter and sub-minute ETA drift don't count as changes
+        return {
+            "location": {"lat": round(state.lat, 5), "lng": round(state.lng, 5)},
+            "speed": round(state.speed_kmph) if state.speed_kmph is not None else None,
+            "next_stop": state.next_stop,
+            "etas": [round(e) for e in state.etas],
+            "status": state.status,
+        }
+
+    async def flush(self) -> int:
+        now = time.monotonic()
+        sent = 0
+        dirty, self._dirty = self._dirty, set()
+        for bus_id in dirty:
+            # Skip encoding frames nobody listens to (emit serializes before fan-out)
+            if not has_subscribers(self.sio, parent_room(bus_id)):
+                self._last_frame.pop(bus_id, None)
+                continue
+            if now - self._last_sent.get(bus_id, 0) < self.min_interval:
+                # Try again next tick; the delta will fold in everything since
+                self._dirty.add(bus_id)
+                self.stats["throttled"] += 1
+                continue
+
+            frame = self._frame(bus_id)
+            if frame is None:
+                if bus_id not in self._last_frame:
+                    continue
+                # Bus removed from the ETA engine (driver disconnected): tell parents once
+                frame = {"etas": [], "status": "offline"}
+            last = self._last_frame.get(bus_id, {})
+            delta = {k: v for k, v in frame.items() if last.get(k) != v}
+            if not delta:
+                self.stats["unchanged"] += 1
+                continue
+
+            self._last_frame[bus_id] = frame
+            self._last_sent[bus_id] = now
+            await self.sio.emit(UPDATE_EVENT, {"bus_id": bus_id, "ts": time.time(), **delta},
+                                room=parent_room(bus_id))
+            sent += 1
+            if METRICS_ENABLED:
+                reached = recipients(self.sio, parent_room(bus_id))
+                if reached is not None:
+                    emit_fanout.observe(reached, UPDATE_EVENT)
+        self.stats["frames"] += sent
+        return sent
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("Parent feed flush failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
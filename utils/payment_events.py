@@ -0,0 +1,307 @@
+# utils/payment_events.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+log = logging.getLogger(__name__)
+
+PAYMENT_QUEUE_BATCH = int(os.getenv("PAYMENT_QUEUE_BATCH", "500"))
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", "2"))
+# Workers also look this often for events queued by other processes
+PAYMENT_POLL_S = float(os.getenv("PAYMENT_POLL_S", "1"))
+# A claimed batch not finished in this long (worker died) is handed out again
+PAYMENT_CLAIM_LEASE_S = float(os.getenv("PAYMENT_CLAIM_LEASE_S", "60"))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_MAX_ATTEMPTS", "5"))
+
+# Later states win, so a retried or out-of-order webhook never moves a payment back
+STATUS_RANK = {"created": 0, "verified": 1, "authorized": 2, "failed": 2, "captured": 3, "refunded": 4}
+PAYMENT_FIELDS = ("order_id", "student_id", "amount", "currency", "method")
+
+
+def event_key(event: Dict[str, Any], body: bytes) -> str:
+    """Dedup key when the x-razorpay-event-id header is missing: event type plus entity id."""
+    payload = event.get("payload")
+    for name in ("refund", "payment", "order"):
+        wrapper = payload.get(name) if isinstance(payload, dict) else None
+        entity = wrapper.get("entity") if isinstance(wrapper, dict) else None
+        if isinstance(entity, dict) and entity.get("id"):
+            return f"{event.get('event')}:{entity['id']}"
+    return f"{event.get('event')}:{hashlib.sha256(body).hexdigest()[:32]}"
+
+
+def payment_change(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The payment row an event describes, or None for events without a payment entity."""
+    name = event.get("event") or ""
+    entity = ((event.get("payload") or {}).get("payment") or {}).get("entity") or {}
+    if not entity.get("id"):
+        return None
+    status = "refunded" if name.startswith("refund.") else entity.get("status") or name.rsplit(".", 1)[-1]
+    # Razorpay sends notes as [] when empty
+    notes = entity.get("notes") if isinstance(entity.get("notes"), dict) else {}
+    return {"payment_id": entity["id"], "order_id": entity.get("order_id"), "student_id": notes.get("studentId"),
+            "amount": entity.get("amount"), "currency": entity.get("currency"), "method": entity.get("method"),
+            "status": status, "last_event": name}
+
+
+def merge_change(current: Optional[Dict[str, Any]], change: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold a later change into a payment row: known fields fill in, status only moves forward."""
+    if current is None:
+        return dict(change)
+    merged = dict(current)
+    for field in PAYMENT_FIELDS:
+        if change.get(field) is not None:
+            merged[field] = change[field]
+    if STATUS_RANK.get(change["status"], -1) >= STATUS_RANK.get(current["status"], -1):
+        merged["status"], merged["last_event"] = change["status"], change["last_event"]
+    return merged
+
+
+def _rank(column):
+    return case(STATUS_RANK, value=column, else_=-1)
+
+
+class PaymentEventQueue:
+    """
+    Durable queue between the payment endpoints and the payments table.
+
+    put() appends the event to the payment_event table and returns once it
+    is committed, so a 200 to Razorpay means the event survives a restart.
+    Concurrent puts share one transaction (group commit), and an event id
+    already on file is reported as a duplicate instead of queued again.
+
+    Worker tasks claim unprocessed events in id order under a lease, fold
+    them into one change per payment and upsert those in one statement.
+    The upsert only moves a payment's status forward, so redelivered or
+    reordered events and several workers (or processes) are all safe.
+    """
+
+    def __init__(self, engine=None, workers: int = PAYMENT_WORKERS, batch_size: int = PAYMENT_QUEUE_BATCH,
+                 poll_s: float = PAYMENT_POLL_S, lease_s: float = PAYMENT_CLAIM_LEASE_S):
+        self._engine = engine
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_s = poll_s
+        self.lease_s = lease_s
+        self._node = uuid.uuid4().hex[:8]
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._writing = False
+        self._writer_wake: Optional[asyncio.Event] = None
+        self._worker_wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._ack_ms = deque(maxlen=5000)
+        self.stats = {"received": 0, "duplicates": 0, "commits": 0, "processed": 0, "payments_written": 0,
+                      "worker_batches": 0, "bad_events": 0, "errors": 0}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from database import engine
+            self._engine = engine
+        return self._engine
+
+    # ---- enqueue ----
+    def append(self, rows: List[Dict[str, Any]]) -> List[bool]:
+        """Insert events not already on file, in one transaction; True for each one that is new."""
+        from models import PaymentEvent
+
+        table = PaymentEvent.__table__
+        # First copy of an id within the batch; later copies are duplicates whatever the DB says
+        first = {}
+        for i, row in enumerate(rows):
+            first.setdefault(row["event_id"], i)
+        unique = [rows[i] for i in first.values()]
+        with self.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            # Write first: a SELECT before the INSERT would make concurrent SQLite writers deadlock
+            stmt = upsert(table).on_conflict_do_nothing(index_elements=["event_id"]).returning(table.c.event_id)
+            inserted = set(conn.execute(stmt, unique).scalars())
+        return [first[row["event_id"]] == i and row["event_id"] in inserted for i, row in enumerate(rows)]
+
+    async def put(self, event_id: str, event: str, payload: str) -> bool:
+        """Queue an event durably; False if this event id was already received."""
+        start = time.perf_counter()
+        row = {"event_id": event_id, "event": event, "payload": payload, "received_at": datetime.utcnow(),
+               "attempts": 0}
+        self.stats["received"] += 1
+        if self._writer_wake is None:
+            fresh = (await asyncio.to_thread(self.append, [row]))[0]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((row, future))
+            self._writer_wake.set()
+            fresh = await future
+        if not fresh:
+            self.stats["duplicates"] += 1
+        self._ack_ms.append((time.perf_counter() - start) * 1000)
+        return fresh
+
+    async def _writer(self):
+        while True:
+            await self._writer_wake.wait()
+            self._writer_wake.clear()
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                self._writing = True
+                try:
+                    fresh = await asyncio.to_thread(self.append, [row for row, _ in batch])
+                except Exception as e:
+                    # Callers answer 5xx and Razorpay redelivers
+                    self.stats["errors"] += 1
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                finally:
+                    self._writing = False
+                self.stats["commits"] += 1
+                for (_, future), is_new in zip(batch, fresh):
+                    if not future.done():
+                        future.set_result(is_new)
+                if any(fresh) and self._worker_wake is not None:
+                    self._worker_wake.set()
+
+    # ---- processing ----
+    def _claim(self, token: str) -> List[Any]:
+        from models import PaymentEvent
+
+        table = PaymentEvent.__table__
+        now = datetime.utcnow()
+        claimable = and_(table.c.processed_at.is_(None), table.c.attempts < PAYMENT_MAX_ATTEMPTS,
+                         or_(table.c.claimed_at.is_(None), table.c.claimed_at < now - timedelta(seconds=self.lease_s)))
+        ids = select(table.c.id).where(claimable).order_by(table.c.id).limit(self.batch_size)
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id.in_(ids.scalar_subquery()), claimable)
+                         .values(claimed_by=token, claimed_at=now, attempts=table.c.attempts + 1))
+            return conn.execute(select(table.c.id, table.c.event, table.c.payload)
+                                .where(table.c.claimed_by == token, table.c.processed_at.is_(None))
+                                .order_by(table.c.id)).all()
+
+    def _upsert(self, conn, rows: List[Dict[str, Any]]):
+        from models import Payment
+
+        table = Payment.__table__
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(table)
+        ex = stmt.excluded
+        forward = _rank(ex.status) >= _rank(table.c.status)
+        set_ = {field: func.coalesce(ex[field], table.c[field]) for field in PAYMENT_FIELDS}
+        set_.update(status=case((forward, ex.status), else_=table.c.status),
+                    last_event=case((forward, ex.last_event), else_=table.c.last_event),
+                    updated_at=ex.updated_at)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["payment_id"], set_=set_), rows)
+
+    def process_batch(self, token: str) -> int:
+        """Claim and apply one batch of events; returns how many were claimed."""
+        from models import PaymentEvent
+
+        claimed = self._claim(token)
+        if not claimed:
+            return 0
+        changes: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[int, str] = {}
+        for event_row in claimed:
+            try:
+                change = payment_change(json.loads(event_row.payload))
+            except (TypeError, ValueError, AttributeError) as e:
+                errors[event_row.id] = f"bad payload: {e}"
+                continue
+            if change is not None:
+                changes[change["payment_id"]] = merge_change(changes.get(change["payment_id"]), change)
+
+        now = datetime.utcnow()
+        events = PaymentEvent.__table__
+        with self.engine.begin() as conn:
+            if changes:
+                self._upsert(conn, [{**c, "created_at": now, "updated_at": now} for c in changes.values()])
+            done = [r.id for r in claimed if r.id not in errors]
+            if done:
+                conn.execute(update(events).where(events.c.id.in_(done)).values(processed_at=now, error=None))
+            for event_id, error in errors.items():
+                # A payload that doesn't parse never will; keep it for inspection but stop retrying
+                conn.execute(update(events).where(events.c.id == event_id).values(processed_at=now, error=error))
+        self.stats["worker_batches"] += 1
+        self.stats["processed"] += len(claimed)
+        self.stats["payments_written"] += len(changes)
+        self.stats["bad_events"] += len(errors)
+        return len(claimed)
+
+    async def _worker(self, n: int):
+        token = f"{self._node}-{n}"
+        while True:
+            self._worker_wake.clear()
+            try:
+                claimed = await asyncio.to_thread(self.process_batch, token)
+            except Exception as e:
+                # Claimed events stay claimed and are retried once the lease runs out
+                log.warning("Payment worker %s failed: %s", token, e)
+                self.stats["errors"] += 1
+                claimed = 0
+            if not claimed:
+                try:
+                    await asyncio.wait_for(self._worker_wake.wait(), self.poll_s)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        if self._tasks:
+            return
+        self._writer_wake = asyncio.Event()
+        self._worker_wake = asyncio.Event()
+        self._worker_wake.set()  # pick up anything left from the last run
+        self._tasks = [asyncio.create_task(self._writer())]
+        self._tasks += [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        # Let queued puts commit; unprocessed events stay in the table for the next start
+        while self._pending or self._writing:
+            await asyncio.sleep(0.01)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._writer_wake = self._worker_wake = None
+
+    @property
+    def pending(self) -> int:
+        # Received but not yet committed; backlog() counts committed but unprocessed
+        return len(self._pending)
+
+    def backlog(self) -> int:
+        from models import PaymentEvent
+
+        table = PaymentEvent.__table__
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(table)
+                                .where(table.c.processed_at.is_(None),
+                                       table.c.attempts < PAYMENT_MAX_ATTEMPTS)).scalar_one()
+
+    def metrics(self) -> Dict[str, Any]:
+        acks = sorted(self._ack_ms)
+
+        def pct(q):
+            return round(acks[min(len(acks) - 1, int(q * len(acks)))], 2) if acks else None
+
+        return {**self.stats, "pending": len(self._pending), "ack_p50_ms": pct(0.5), "ack_p99_ms": pct(0.99)}
+
+
+# Fed by the payment router; started and stopped by the lifespan
+payment_events = PaymentEventQueue()
@@ -0,0 +1,110 @@
+# utils/razorpay_client.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from utils.metrics import observe_upstream
+
+if TYPE_CHECKING:
+    import httpx
+
+# Point at a local fake (benchmarks/razorpay_stub.py) with RAZORPAY_API_URL
+RAZORPAY_API_URL = os.getenv("RAZORPAY_API_URL", "https://api.razorpay.com/v1")
+RAZORPAY_TIMEOUT = float(os.getenv("RAZORPAY_TIMEOUT", "10"))
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT", "3"))
+RAZORPAY_MAX_CONNECTIONS = int(os.getenv("RAZORPAY_MAX_CONNECTIONS", "50"))
+
+
+class RazorpayError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None, details: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class RazorpayClient:
+    """
+    Razorpay REST calls on one pooled httpx.AsyncClient for the app lifetime.
+    Order creation is not idempotent, so only failed connects are retried
+    (nothing reached Razorpay); timeouts and errors go back to the caller.
+    """
+
+    def __init__(self, key_id: Optional[str] = None, key_secret: Optional[str] = None,
+                 base_url: str = RAZORPAY_API_URL):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.base_url = base_url.rstrip("/")
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._latencies = deque(maxlen=2000)
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0}
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # httpx is imported on the first call, not at app import
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id or "", self.key_secret or ""),
+                timeout=httpx.Timeout(RAZORPAY_TIMEOUT, connect=RAZORPAY_CONNECT_TIMEOUT),
+                # The pool belongs to the transport; AsyncClient(limits=...) is ignored when one is passed
+                transport=httpx.AsyncHTTPTransport(retries=1, limits=httpx.Limits(
+                    max_connections=RAZORPAY_MAX_CONNECTIONS, max_keepalive_connections=RAZORPAY_MAX_CONNECTIONS)),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._slots = None
+
+    async def _post(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        import httpx
+
+        # Callers beyond the pool size wait here: httpx's own pool queue costs
+        # CPU per waiter on every release, which adds up in a payment burst
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(RAZORPAY_MAX_CONNECTIONS)
+        self.stats["requests"] += 1
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                response = await self.client.post(path, json=data)
+        except httpx.TimeoutException as e:
+            self.stats["errors"] += 1
+            self.stats["timeouts"] += 1
+            observe_upstream("razorpay", start, ok=False)
+            raise RazorpayError(f"Razorpay timed out: {type(e).__name__}") from e
+        except httpx.HTTPError as e:
+            self.stats["errors"] += 1
+            observe_upstream("razorpay", start, ok=False)
+            raise RazorpayError(f"Razorpay unreachable: {e}") from e
+        finally:
+            self._latencies.append((time.perf_counter() - start) * 1000)
+        observe_upstream("razorpay", start, ok=response.status_code < 500)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"raw": response.text[:200]}
+        if response.status_code >= 400:
+            self.stats["errors"] += 1
+            error = body.get("error", {}) if isinstance(body, dict) else {}
+            raise RazorpayError(error.get("description") or f"Razorpay returned {response.status_code}",
+                                response.status_code, body)
+        return body
+
+    async def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._post("/orders", data)
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def pct(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else None
+
+        return {**self.stats, "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
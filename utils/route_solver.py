@@ -0,0 +1,234 @@
+# utils/route_solver.py
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.geo_batch import haversine_matrix
+
+ROUTE_AVG_SPEED_KMPH = float(os.getenv("ROUTE_AVG_SPEED_KMPH", "25"))
+ROUTE_STOP_DWELL_MIN = float(os.getenv("ROUTE_STOP_DWELL_MIN", "1"))
+ROUTE_SOLVER_TIME_LIMIT = float(os.getenv("ROUTE_SOLVER_TIME_LIMIT", "2.0"))
+
+EPS = 1e-9
+
+
+def route_cost(dist, route: Sequence[int], depot: int = 0) -> float:
+    """Length of depot -> route -> depot."""
+    if not route:
+        return 0.0
+    cost = dist[depot][route[0]] + dist[route[-1]][depot]
+    for a, b in zip(route, route[1:]):
+        cost += dist[a][b]
+    return cost
+
+
+def nearest_neighbour(dist, demands, capacities, depot=0):
+    """Fill vehicles one at a time with the closest stop that still fits."""
+    unvisited = [i for i in range(len(dist)) if i != depot]
+    routes = []
+    for cap in capacities:
+        route, load, cur = [], 0, depot
+        while unvisited:
+            best, best_d = None, math.inf
+            for j in unvisited:
+                if load + demands[j] <= cap and dist[cur][j] < best_d:
+                    best, best_d = j, dist[cur][j]
+            if best is None:
+                break
+            unvisited.remove(best)
+            route.append(best)
+            load += demands[best]
+            cur = best
+        routes.append(route)
+    return routes, unvisited
+
+
+def two_opt(dist, route, depot, deadline):
+    """Reverse segments while that shortens the tour (symmetric matrix assumed)."""
+    tour = [depot] + list(route) + [depot]
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, len(tour) - 2):
+            a, b = tour[i - 1], tour[i]
+            for k in range(i + 1, len(tour) - 1):
+                c, d = tour[k], tour[k + 1]
+                if dist[a][c] + dist[b][d] - dist[a][b] - dist[c][d] < -EPS:
+                    tour[i:k + 1] = reversed(tour[i:k + 1])
+                    b = tour[i]
+                    improved = True
+    return tour[1:-1]
+
+
+def or_opt(dist, route, depot, deadline):
+    """Move chains of 1-3 stops (optionally reversed) to a cheaper position in the same tour."""
+    tour = [depot] + list(route) + [depot]
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for seg_len in (1, 2, 3):
+            for i in range(1, len(tour) - seg_len):
+                j = i + seg_len
+                prev, nxt = tour[i - 1], tour[j]
+                first, last = tour[i], tour[j - 1]
+                gain = dist[prev][first] + dist[last][nxt] - dist[prev][nxt]
+
+                best_delta, best_p, best_rev = -EPS, None, False
+                for p in range(len(tour) - 1):
+                    if i - 1 <= p <= j - 1:
+                        continue
+                    u, v = tour[p], tour[p + 1]
+                    base = dist[u][v]
+                    delta = dist[u][first] + dist[last][v] - base - gain
+                    if delta < best_delta:
+                        best_delta, best_p, best_rev = delta, p, False
+                    delta = dist[u][last] + dist[first][v] - base - gain
+                    if delta < best_delta:
+                        best_delta, best_p, best_rev = delta, p, True
+
+                if best_p is not None:
+                    seg = tour[i:j]
+                    if best_rev:
+                        seg.reverse()
+                    rest = tour[:i] + tour[j:]
+                    pos = best_p + 1 if best_p < i else best_p + 1 - seg_len
+                    tour = rest[:pos] + seg + rest[pos:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return tour[1:-1]
+
+
+def relocate(dist, routes, loads, demands, capacities, depot, deadline):
+    """Move single stops between vehicles when it lowers total cost and capacity allows."""
+    moved = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for a, ra in enumerate(routes):
+            for i, node in enumerate(ra):
+                prev = ra[i - 1] if i > 0 else depot
+                nxt = ra[i + 1] if i + 1 < len(ra) else depot
+                gain = dist[prev][node] + dist[node][nxt] - dist[prev][nxt]
+
+                best_delta, best_b, best_p = EPS, None, None
+                for b, rb in enumerate(routes):
+                    if b == a or loads[b] + demands[node] > capacities[b]:
+                        continue
+                    tour = [depot] + rb + [depot]
+                    for p in range(len(tour) - 1):
+                        u, v = tour[p], tour[p + 1]
+                        delta = gain - (dist[u][node] + dist[node][v] - dist[u][v])
+                        if delta > best_delta:
+                            best_delta, best_b, best_p = delta, b, p
+
+                if best_b is not None:
+                    ra.pop(i)
+                    routes[best_b].insert(best_p, node)
+                    loads[a] -= demands[node]
+                    loads[best_b] += demands[node]
+                    improved = moved = True
+                    break
+            if improved:
+                break
+    return moved
+
+
+def solve(dist, demands: Sequence[int], capacities: Sequence[float], depot: int = 0,
+          time_limit: float = ROUTE_SOLVER_TIME_LIMIT, max_rounds: int = 20) -> Dict[str, Any]:
+    """
+    Capacitated VRP on a precomputed distance matrix.
+
+    Nearest-neighbour construction, then rounds of 2-opt / Or-opt per vehicle
+    and inter-vehicle relocation until nothing improves, max_rounds is reached
+    or time_limit seconds have passed. Deterministic for a given input.
+    """
+    if hasattr(dist, "tolist"):
+        dist = dist.tolist()
+    deadline = time.perf_counter() + time_limit
+
+    routes, unassigned = nearest_neighbour(dist, demands, capacities, depot)
+    initial_cost = sum(route_cost(dist, r, depot) for r in routes)
+    loads = [sum(demands[n] for n in r) for r in routes]
+
+    for _ in range(max_rounds):
+        before = sum(route_cost(dist, r, depot) for r in routes)
+        for v, route in enumerate(routes):
+            route = two_opt(dist, route, depot, deadline)
+            routes[v] = or_opt(dist, route, depot, deadline)
+        relocate(dist, routes, loads, demands, capacities, depot, deadline)
+        after = sum(route_cost(dist, r, depot) for r in routes)
+        if before - after < EPS or time.perf_counter() >= deadline:
+            break
+
+    return {
+        "routes": routes,
+        "loads": loads,
+        "unassigned": unassigned,
+        "cost": sum(route_cost(dist, r, depot) for r in routes),
+        "initial_cost": initial_cost,
+        "timed_out": time.perf_counter() >= deadline,
+    }
+
+
+def _capacity(vehicle: Dict[str, Any]) -> float:
+    # Vehicle.capacity defaults to 0, which means "not set" rather than "no seats"
+    cap = vehicle.get("capacity")
+    return float(cap) if cap else math.inf
+
+
+def optimize_school_routes(stops: List[Dict[str, Any]], vehicles: Optional[List[Dict[str, Any]]] = None,
+                           live_traffic: Optional[Dict[str, Any]] = None, distance_matrix=None,
+                           time_limit: float = ROUTE_SOLVER_TIME_LIMIT) -> Dict[str, Any]:
+    """
+    Assign stops to vehicles and order them, in the shape optimize_route_via_ai returns.
+
+    The depot (school) is the stop marked "depot": true, or the first stop. It
+    starts and ends every route and is not listed in orderedStops. Stop demand
+    comes from "demand" or "students" (default 1). Vehicle capacity comes from
+    Vehicle.capacity.
+    """
+    vehicles = vehicles or [{"id": "vehicle-1"}]
+    depot = next((i for i, s in enumerate(stops) if s.get("depot")), 0)
+
+    if distance_matrix is None:
+        lats = [s["lat"] for s in stops]
+        lons = [s["lon"] if "lon" in s else s["lng"] for s in stops]
+        distance_matrix = haversine_matrix(lats, lons)
+    demands = [0 if i == depot else int(s.get("demand", s.get("students", 1)) or 0)
+               for i, s in enumerate(stops)]
+    capacities = [_capacity(v) for v in vehicles]
+
+    result = solve(distance_matrix, demands, capacities, depot=depot, time_limit=time_limit)
+    dist = distance_matrix.tolist() if hasattr(distance_matrix, "tolist") else distance_matrix
+
+    speed = ROUTE_AVG_SPEED_KMPH * float((live_traffic or {}).get("speedFactor", 1.0))
+    routes_out = []
+    total_minutes = 0.0
+    for vehicle, route in zip(vehicles, result["routes"]):
+        if not route:
+            continue
+        eta, minutes, cur = [], 0.0, depot
+        for node in route:
+            minutes += dist[cur][node] / speed * 60
+            eta.append({"stopId": stops[node].get("id", node), "etaMinutes": round(minutes, 1)})
+            minutes += ROUTE_STOP_DWELL_MIN
+            cur = node
+        minutes += dist[cur][depot] / speed * 60
+        total_minutes += minutes
+        routes_out.append({
+            "vehicleId": vehicle.get("id"),
+            "orderedStops": [stops[n].get("id", n) for n in route],
+            "etaPerStop": eta,
+            "load": sum(demands[n] for n in route),
+            "distanceKm": round(route_cost(dist, route, depot), 2),
+        })
+
+    return {
+        "routes": routes_out,
+        "estimatedTotalMinutes": round(total_minutes, 1),
+        "totalDistanceKm": round(result["cost"], 2),
+        "unassignedStops": [stops[n].get("id", n) for n in result["unassigned"]],
+    }
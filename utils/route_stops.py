@@ -0,0 +1,198 @@
+# utils/route_stops.py
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from utils.geo_batch import haversine_one_to_many, parse_stops, route_cumulative_km, stop_coordinates
+
+log = logging.getLogger(__name__)
+
+STOP_CACHE_SIZE = int(os.getenv("STOP_CACHE_SIZE", "2048"))
+KM_PER_DEG_LAT = 111.32
+
+
+class RouteShape:
+    """Parsed stops of one route kept as arrays for cheap per-ping maths."""
+
+    def __init__(self, stops):
+        stops = parse_stops(stops)
+        self.stops = stops
+        self.lats, self.lons = stop_coordinates(stops)
+        self.cum_km = route_cumulative_km(stops)
+        self.names = [s.get("name", s.get("id", i)) for i, s in enumerate(stops)]
+        # Optional schedule as minutes after trip start ("offset_min") for delay status
+        self.scheduled = [s.get("offset_min") for s in stops]
+
+    def __len__(self):
+        return len(self.stops)
+
+
+def stop_rows(route_id: int, stops) -> List[Dict[str, Any]]:
+    """RouteStop rows for a stop list in the Route.stops JSON format."""
+    rows = []
+    for seq, s in enumerate(parse_stops(stops)):
+        if not isinstance(s, dict) or "lat" not in s or ("lon" not in s and "lng" not in s):
+            raise ValueError(f"stop {seq} needs lat and lon")
+        scheduled = s.get("scheduled_time", s.get("time"))
+        rows.append({
+            "route_id": route_id,
+            "seq": seq,
+            "lat": float(s["lat"]),
+            "lon": float(s["lon"] if "lon" in s else s["lng"]),
+            "name": s.get("name"),
+            "offset_min": s.get("offset_min"),
+            "scheduled_time": time.fromisoformat(scheduled) if isinstance(scheduled, str) else scheduled,
+        })
+    return rows
+
+
+def replace_route_stops(conn, route_id: int, stops):
+    """Swap a route's RouteStop rows inside the caller's transaction; invalidate after commit."""
+    from models import RouteStop
+
+    conn.execute(delete(RouteStop).where(RouteStop.route_id == route_id))
+    rows = stop_rows(route_id, stops)
+    if rows:
+        conn.execute(insert(RouteStop), rows)
+    return len(rows)
+
+
+def migrate_route_stops(engine) -> int:
+    """
+    Copy Route.stops JSON into RouteStop for routes that have no rows yet.
+    Safe to run on every start; returns the number of routes converted.
+    """
+    from models import Route, RouteStop
+
+    converted = 0
+    with engine.begin() as conn:
+        has_rows = select(RouteStop.route_id).where(RouteStop.route_id == Route.id).exists()
+        pending = conn.execute(select(Route.id, Route.stops).where(Route.stops.is_not(None), ~has_rows)).all()
+        for route_id, stops in pending:
+            try:
+                if replace_route_stops(conn, route_id, stops):
+                    converted += 1
+            except (ValueError, KeyError, TypeError) as e:
+                log.warning("Skipping stops of route %s: %s", route_id, e)
+    return converted
+
+
+def load_route_shape(route_id) -> Optional[RouteShape]:
+    """Stops of a route from RouteStop, in order, or None if it has none."""
+    from database import engine
+    from models import RouteStop
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(RouteStop.lat, RouteStop.lon, RouteStop.name, RouteStop.offset_min)
+            .where(RouteStop.route_id == route_id).order_by(RouteStop.seq)
+        ).all()
+    if not rows:
+        return None
+    return RouteShape([{"lat": lat, "lon": lon, "name": name if name is not None else seq, "offset_min": offset}
+                       for seq, (lat, lon, name, offset) in enumerate(rows)])
+
+
+# Cached in place of a RouteShape for routes without stops, so they aren't queried on every lookup
+_NO_STOPS = object()
+
+
+class StopCache:
+    """
+    LRU of parsed routes (RouteShape arrays) keyed by route id. Loads happen in
+    worker threads, hence the lock. Writers call invalidate() after committing;
+    listeners (the ETA engine) are told so they drop their copy too. Routes
+    with no stops are cached as such until invalidated. Each invalidate bumps
+    the route's generation, and a load that started before it isn't stored.
+    """
+
+    def __init__(self, loader: Callable[[Any], Optional[RouteShape]] = load_route_shape,
+                 maxsize: int = STOP_CACHE_SIZE):
+        self.loader = loader
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Any], None]] = []
+        self._generations: Dict[Any, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, route_id) -> Optional[RouteShape]:
+        with self._lock:
+            shape = self._data.get(route_id)
+            if shape is not None:
+                self._data.move_to_end(route_id)
+                self.stats["hits"] += 1
+                return None if shape is _NO_STOPS else shape
+            self.stats["misses"] += 1
+            generation = self._generations.get(route_id, 0)
+        shape = self.loader(route_id)
+        with self._lock:
+            if self._generations.get(route_id, 0) != generation:
+                # Invalidated while loading: the rows read may predate the edit
+                return shape
+            self._data[route_id] = _NO_STOPS if shape is None else shape
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return shape
+
+    def invalidate(self, route_ids: Iterable[Any]):
+        for route_id in route_ids:
+            with self._lock:
+                self._data.pop(route_id, None)
+                self._generations[route_id] = self._generations.get(route_id, 0) + 1
+                self.stats["invalidations"] += 1
+            for listener in self._listeners:
+                listener(route_id)
+
+    def on_invalidate(self, listener: Callable[[Any], None]):
+        self._listeners.append(listener)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def routes_near(lat: float, lon: float, radius_km: float, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Routes with a stop within radius_km of a point, nearest first. The indexed
+    lat/lon columns cut the candidates to a bounding box; haversine finishes it.
+    """
+    from database import engine
+    from models import Route, RouteStop
+
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(RouteStop.route_id, RouteStop.seq, RouteStop.name, RouteStop.lat, RouteStop.lon)
+            .where(RouteStop.lat.between(lat - dlat, lat + dlat), RouteStop.lon.between(lon - dlon, lon + dlon))
+        ).all()
+        if not rows:
+            return []
+        dist = haversine_one_to_many(lat, lon, np.array([r.lat for r in rows]), np.array([r.lon for r in rows]))
+        nearest: Dict[int, Dict[str, Any]] = {}
+        for row, km in zip(rows, dist.tolist()):
+            if km > radius_km:
+                continue
+            best = nearest.get(row.route_id)
+            if best is None or km < best["distance_km"]:
+                nearest[row.route_id] = {"seq": row.seq, "name": row.name, "lat": row.lat, "lon": row.lon,
+                                         "distance_km": km}
+        if not nearest:
+            return []
+        names = dict(conn.execute(select(Route.id, Route.name).where(Route.id.in_(list(nearest)))).all())
+
+    found = sorted(nearest.items(), key=lambda item: item[1]["distance_km"])[:limit]
+    for _, stop in found:
+        stop["distance_m"] = round(stop.pop("distance_km") * 1000, 1)
+    return [{"route_id": route_id, "name": names.get(route_id), "nearest_stop": stop} for route_id, stop in found]
+
+
+# Shared by the ETA engine, OSRM table requests and the routes router
+stop_cache = StopCache()
@@ -0,0 +1,192 @@
+# utils/scheduler.py
+import asyncio
+import inspect
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+log = logging.getLogger(__name__)
+
+# redis://host:6379/0 elects one worker to run cluster-wide jobs; empty means every process leads
+SCHEDULER_LOCK_URL = os.getenv("SCHEDULER_LOCK_URL", os.getenv("LIVE_STATE_URL", os.getenv("SIO_MESSAGE_QUEUE", "")))
+SCHEDULER_LOCK_KEY = os.getenv("SCHEDULER_LOCK_KEY", "transport:scheduler:leader")
+SCHEDULER_LOCK_TTL_S = float(os.getenv("SCHEDULER_LOCK_TTL_S", "15"))
+
+
+class LocalLeader:
+    """Single process: always the leader."""
+
+    async def acquire(self) -> bool:
+        return True
+
+    async def release(self):
+        pass
+
+
+# Compare-and-act in one step, so a lock that expired and was taken by
+# another worker between the check and the write is never touched
+_EXTEND_IF_OWNER = "if redis.call('get',KEYS[1])==ARGV[1] then return redis.call('pexpire',KEYS[1],ARGV[2]) end return 0"
+_DELETE_IF_OWNER = "if redis.call('get',KEYS[1])==ARGV[1] then return redis.call('del',KEYS[1]) end return 0"
+
+
+class RedisLeader:
+    """
+    Leader lock on one Redis key with a TTL. The holder refreshes it every
+    heartbeat; if it dies the key expires and another worker takes over.
+    """
+
+    def __init__(self, url: str, key: str = SCHEDULER_LOCK_KEY, ttl_s: float = SCHEDULER_LOCK_TTL_S):
+        self.url = url
+        self.key = key
+        self.ttl_ms = int(ttl_s * 1000)
+        self.token = uuid.uuid4().hex
+        self._redis = None
+
+    async def acquire(self) -> bool:
+        if self._redis is None:
+            from redis import asyncio as aioredis
+            self._redis = aioredis.Redis.from_url(self.url)
+        if await self._redis.set(self.key, self.token, nx=True, px=self.ttl_ms):
+            return True
+        # Already ours: extend it
+        return bool(await self._redis.eval(_EXTEND_IF_OWNER, 1, self.key, self.token, self.ttl_ms))
+
+    async def release(self):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.eval(_DELETE_IF_OWNER, 1, self.key, self.token)
+        finally:
+            await self._redis.aclose()
+            self._redis = None
+
+
+class Job:
+    def __init__(self, name: str, interval_s: float, func: Callable[[], Union[Any, Awaitable[Any]]],
+                 leader_only: bool = True, first_delay_s: Optional[float] = None):
+        self.name = name
+        self.interval = interval_s
+        self.func = func
+        self.leader_only = leader_only
+        self.first_delay = interval_s if first_delay_s is None else first_delay_s
+        self.stats: Dict[str, Any] = {
+            "interval_s": interval_s, "runs": 0, "failures": 0, "skipped": 0, "overruns": 0, "missed": 0,
+            "last_ms": None, "max_ms": 0.0, "total_ms": 0.0, "last_run_at": None, "last_result": None,
+            "last_error": None,
+        }
+
+    async def run(self):
+        # Plain functions (blocking DB work) go to a worker thread
+        if inspect.iscoroutinefunction(self.func):
+            return await self.func()
+        return await asyncio.to_thread(self.func)
+
+
+class Scheduler:
+    """
+    Periodic jobs on the app's event loop, started and stopped by the lifespan.
+
+    Each job runs at a fixed rate on its own task. A run that takes longer
+    than the interval counts as an overrun and the slots it covered are
+    skipped rather than run back to back. Leader-only jobs run on one worker
+    of the cluster, chosen through the leader lock.
+    """
+
+    def __init__(self, leader=None, heartbeat_s: Optional[float] = None):
+        self.leader = leader or LocalLeader()
+        self.heartbeat = heartbeat_s or SCHEDULER_LOCK_TTL_S / 3
+        self.is_leader = False
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, interval_s: float, func, leader_only: bool = True,
+            first_delay_s: Optional[float] = None) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"job {name!r} is already scheduled")
+        job = self.jobs[name] = Job(name, interval_s, func, leader_only, first_delay_s)
+        if self._tasks:
+            self._tasks[name] = asyncio.create_task(self._loop(job))
+        return job
+
+    def every(self, interval_s: float, name: Optional[str] = None, **kwargs):
+        """Decorator form of add()."""
+        def register(func):
+            self.add(name or func.__name__, interval_s, func, **kwargs)
+            return func
+        return register
+
+    async def run_job(self, job: Job):
+        started = time.perf_counter()
+        job.stats["last_run_at"] = time.time()
+        try:
+            job.stats["last_result"] = await job.run()
+            job.stats["last_error"] = None
+        except Exception as e:
+            job.stats["failures"] += 1
+            job.stats["last_error"] = str(e)
+            log.warning("Scheduled job %s failed: %s", job.name, e)
+        elapsed = (time.perf_counter() - started) * 1000
+        job.stats["runs"] += 1
+        job.stats["last_ms"] = round(elapsed, 3)
+        job.stats["max_ms"] = round(max(job.stats["max_ms"], elapsed), 3)
+        job.stats["total_ms"] = round(job.stats["total_ms"] + elapsed, 3)
+
+    async def _loop(self, job: Job):
+        loop = asyncio.get_running_loop()
+        next_at = loop.time() + job.first_delay
+        while True:
+            await asyncio.sleep(max(next_at - loop.time(), 0))
+            if job.leader_only and not self.is_leader:
+                job.stats["skipped"] += 1
+            else:
+                await self.run_job(job)
+            next_at += job.interval
+            behind = loop.time() - next_at
+            if behind > 0:
+                missed = int(behind // job.interval) + 1
+                job.stats["overruns"] += 1
+                job.stats["missed"] += missed
+                next_at += missed * job.interval
+
+    async def _elect(self):
+        while True:
+            try:
+                self.is_leader = await self.leader.acquire()
+            except Exception as e:
+                # Can't tell whether another worker holds it, so stand down
+                log.warning("Scheduler leader check failed: %s", e)
+                self.is_leader = False
+            await asyncio.sleep(self.heartbeat)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks["<leader>"] = asyncio.create_task(self._elect())
+        for job in self.jobs.values():
+            self._tasks[job.name] = asyncio.create_task(self._loop(job))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.is_leader = False
+        await self.leader.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        jobs = {}
+        for name, job in self.jobs.items():
+            stats = dict(job.stats)
+            stats["avg_ms"] = round(stats["total_ms"] / stats["runs"], 3) if stats["runs"] else None
+            jobs[name] = stats
+        return {"leader": self.is_leader, "jobs": jobs}
+
+
+def create_scheduler(url: str = SCHEDULER_LOCK_URL) -> Scheduler:
+    return Scheduler(RedisLeader(url) if url else LocalLeader())
+
+
+# Replaces the APScheduler BackgroundScheduler that used to live in main
+scheduler = create_scheduler()
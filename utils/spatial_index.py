@@ -0,0 +1,154 @@
+# utils/spatial_index.py
+import heapq
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from utils.gps_utils import haversine_km
+
+# Grid cell size in degrees (0.01 deg is roughly 1.1 km north-south)
+SPATIAL_CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.01"))
+KM_PER_DEG = 111.195
+
+
+class GridIndex:
+    """
+    Bucket grid over (lat, lng) for live bus positions.
+
+    Updates are O(1); radius and k-nearest queries only look at the cells that
+    can contain a match instead of scanning every bus.
+    """
+
+    def __init__(self, cell_deg: float = SPATIAL_CELL_DEG):
+        self.cell = cell_deg
+        self._cells: Dict[Tuple[int, int], set] = {}
+        self._points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, bus_id):
+        return bus_id in self._points
+
+    def _key(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell))
+
+    def update(self, bus_id, lat: float, lng: float):
+        key = self._key(lat, lng)
+        old = self._points.get(bus_id)
+        if old is not None and old[2] != key:
+            self._discard(bus_id, old[2])
+        if old is None or old[2] != key:
+            self._cells.setdefault(key, set()).add(bus_id)
+        self._points[bus_id] = (lat, lng, key)
+
+    def remove(self, bus_id):
+        old = self._points.pop(bus_id, None)
+        if old is not None:
+            self._discard(bus_id, old[2])
+
+    def sync(self, positions: Dict[str, Dict]):
+        """Make the index match a full snapshot ({bus_id: {"lat": .., "lng": ..}}), e.g. from the shared store."""
+        for bus_id in [b for b in self._points if b not in positions]:
+            self.remove(bus_id)
+        for bus_id, p in positions.items():
+            self.update(bus_id, p["lat"], p["lng"])
+
+    def get(self, bus_id) -> Optional[Tuple[float, float]]:
+        point = self._points.get(bus_id)
+        return (point[0], point[1]) if point else None
+
+    def _discard(self, bus_id, key):
+        bucket = self._cells.get(key)
+        if bucket is not None:
+            bucket.discard(bus_id)
+            if not bucket:
+                del self._cells[key]
+
+    def _cell_km(self, lat: float) -> Tuple[float, float]:
+        # Height and width of one cell in km at this latitude
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        return self.cell * KM_PER_DEG, self.cell * KM_PER_DEG * cos_lat
+
+    def _ring(self, ci: int, cj: int, r: int):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[str, float]]:
+        """All buses within radius_km, nearest first, as (bus_id, distance_km)."""
+        cell_h, cell_w = self._cell_km(lat)
+        ci, cj = self._key(lat, lng)
+        di = int(math.ceil(radius_km / cell_h))
+        dj = int(math.ceil(radius_km / cell_w))
+
+        hits = []
+        for i in range(ci - di, ci + di + 1):
+            for j in range(cj - dj, cj + dj + 1):
+                for bus_id in self._cells.get((i, j), ()):
+                    blat, blng, _ = self._points[bus_id]
+                    d = haversine_km(lat, lng, blat, blng)
+                    if d <= radius_km:
+                        hits.append((bus_id, d))
+        hits.sort(key=lambda h: h[1])
+        return hits
+
+    def nearest(self, lat: float, lng: float, k: int = 5, max_km: Optional[float] = None) -> List[Tuple[str, float]]:
+        """The k closest buses as (bus_id, distance_km), searched ring by ring outwards."""
+        if k <= 0 or not self._points:
+            return []
+        cell_h, cell_w = self._cell_km(lat)
+        ci, cj = self._key(lat, lng)
+
+        best: List[Tuple[float, str]] = []  # max-heap of (-distance, bus_id)
+        seen = 0
+        r = 0
+        while seen < len(self._points):
+            # Anything in ring r is at least (r - 1) whole cells away
+            bound = max(r - 1, 0) * min(cell_h, cell_w)
+            if max_km is not None and bound > max_km:
+                break
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            for key in self._ring(ci, cj, r):
+                for bus_id in self._cells.get(key, ()):
+                    seen += 1
+                    blat, blng, _ = self._points[bus_id]
+                    d = haversine_km(lat, lng, blat, blng)
+                    if max_km is not None and d > max_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, bus_id))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, bus_id))
+            r += 1
+        return sorted(((bus_id, -neg) for neg, bus_id in best), key=lambda h: h[1])
+
+
+# Live positions of all buses, kept up to date by mobile_location_update
+bus_index = GridIndex()
+
+
+def nearby_buses(lat: float, lng: float, k: int = 5, radius_km: Optional[float] = None) -> List[Dict]:
+    """k nearest live buses to a point, optionally limited to radius_km."""
+    hits = bus_index.nearest(lat, lng, k=k, max_km=radius_km)
+    results = []
+    for bus_id, dist in hits:
+        blat, blng = bus_index.get(bus_id)
+        results.append({"bus_id": bus_id, "lat": blat, "lng": blng, "distance_m": round(dist * 1000, 1)})
+    return results
+
+
+def buses_within(lat: float, lng: float, radius_km: float) -> List[Dict]:
+    """Every live bus inside a geofence circle, nearest first."""
+    results = []
+    for bus_id, dist in bus_index.within(lat, lng, radius_km):
+        blat, blng = bus_index.get(bus_id)
+        results.append({"bus_id": bus_id, "lat": blat, "lng": blng, "distance_m": round(dist * 1000, 1)})
+    return results
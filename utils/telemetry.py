@@ -0,0 +1,254 @@
+# utils/telemetry.py
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Column, Float, Index, MetaData, String, Table, create_engine, event, inspect, select
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from utils.metrics import instrument_engine
+
+log = logging.getLogger(__name__)
+
+# Pings go to their own database so bulk writes never hold the main DB lock
+TELEMETRY_DATABASE_URL = os.getenv("TELEMETRY_DATABASE_URL", "sqlite:///./telemetry.db")
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "5000"))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "1.0"))
+# Pings held in memory before the oldest are dropped (DB down or too slow)
+TELEMETRY_MAX_BUFFER = int(os.getenv("TELEMETRY_MAX_BUFFER", "500000"))
+
+PARTITION_PREFIX = "busping_"
+
+
+def partition_name(ts: float) -> str:
+    """One table per UTC day, e.g. busping_20251103."""
+    return PARTITION_PREFIX + datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def _partition_days(start_ts: float, end_ts: float) -> List[str]:
+    names = []
+    day = int(start_ts // 86400) * 86400
+    while day <= end_ts:
+        names.append(partition_name(day))
+        day += 86400
+    return names
+
+
+def _transient(e: Exception) -> bool:
+    """Errors worth retrying the same rows for: a locked or unreachable DB, a dropped connection."""
+    return isinstance(e, OperationalError) or (isinstance(e, DBAPIError) and e.connection_invalidated)
+
+
+def _number(value: Any, optional: bool = False) -> bool:
+    if value is None:
+        return optional
+    return type(value) in (float, int) and math.isfinite(value)
+
+
+def create_telemetry_engine(url: str = TELEMETRY_DATABASE_URL):
+    engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+    if url.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.close()
+    instrument_engine(engine, "telemetry")
+    return engine
+
+
+class TelemetryStore:
+    """
+    Append-only GPS history split into daily partitions.
+
+    Each partition is a narrow table (bus_id, ts, lat, lng, speed, heading)
+    with a (bus_id, ts) index, so one bus's track for a window is an index
+    range scan over at most a couple of tables.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or create_telemetry_engine()
+        self.metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._lock = threading.Lock()
+
+    def _table(self, name: str, create: bool = True) -> Optional[Table]:
+        table = self._tables.get(name)
+        if table is not None:
+            return table
+        with self._lock:
+            if name in self._tables:
+                return self._tables[name]
+            table = Table(
+                name, self.metadata,
+                Column("bus_id", String, nullable=False),
+                Column("ts", Float, nullable=False),
+                Column("lat", Float, nullable=False),
+                Column("lng", Float, nullable=False),
+                Column("speed", Float),
+                Column("heading", Float),
+                Index(f"ix_{name}_bus_ts", "bus_id", "ts"),
+            )
+            if create:
+                table.create(self.engine, checkfirst=True)
+            elif not inspect(self.engine).has_table(name):
+                self.metadata.remove(table)
+                return None
+            self._tables[name] = table
+            return table
+
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        """Bulk insert: one executemany per daily partition, all in one transaction."""
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_day.setdefault(partition_name(row["ts"]), []).append(row)
+        tables = {name: self._table(name) for name in by_day}
+        with self.engine.begin() as conn:
+            for name, day_rows in by_day.items():
+                conn.execute(tables[name].insert(), day_rows)
+        return len(rows)
+
+    def track(self, bus_id: str, start_ts: float, end_ts: float, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Pings for one bus between start_ts and end_ts (epoch seconds), oldest first."""
+        points: List[Dict[str, Any]] = []
+        with self.engine.connect() as conn:
+            for name in _partition_days(start_ts, end_ts):
+                table = self._table(name, create=False)
+                if table is None:
+                    continue
+                stmt = (select(table.c.ts, table.c.lat, table.c.lng, table.c.speed, table.c.heading)
+                        .where(table.c.bus_id == bus_id, table.c.ts >= start_ts, table.c.ts <= end_ts)
+                        .order_by(table.c.ts)
+                        .limit(limit - len(points)))
+                points.extend(dict(r._mapping) for r in conn.execute(stmt))
+                if len(points) >= limit:
+                    break
+        return points
+
+
+class TelemetrySink:
+    """
+    Buffers pings from the Socket.IO handler and writes them in batches from a
+    worker thread. record() is a plain list append and never blocks the loop.
+
+    A batch that fails on a transient error is retried whole on the next
+    flush. Any other failure is retried row by row, and rows that still
+    fail are dropped and counted as rejected so they can't block the rest.
+    """
+
+    def __init__(self, store: Optional[TelemetryStore] = None, batch_size: int = TELEMETRY_BATCH_SIZE,
+                 flush_seconds: float = TELEMETRY_FLUSH_SECONDS, max_buffer: int = TELEMETRY_MAX_BUFFER):
+        self._store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "rejected": 0, "batches": 0, "errors": 0}
+
+    @property
+    def store(self) -> TelemetryStore:
+        # Engine is created on first use so importing main stays cheap
+        if self._store is None:
+            self._store = TelemetryStore()
+        return self._store
+
+    def record(self, bus_id, lat: float, lng: float, ts: Optional[float] = None,
+               speed: Optional[float] = None, heading: Optional[float] = None):
+        if not (_number(lat) and _number(lng) and _number(speed, True) and _number(heading, True)):
+            self.stats["rejected"] += 1
+            return
+        self._buffer.append({"bus_id": str(bus_id), "ts": ts or time.time(), "lat": lat, "lng": lng,
+                             "speed": speed, "heading": heading})
+        self.stats["recorded"] += 1
+        if len(self._buffer) > self.max_buffer:
+            overflow = len(self._buffer) - self.max_buffer
+            del self._buffer[:overflow]
+            self.stats["dropped"] += overflow
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            try:
+                written, rejected, retry = await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                # Put the batch back in front so it is retried with the next flush
+                log.warning("Telemetry flush failed (%d pings): %s", len(rows), e)
+                self.stats["errors"] += 1
+                self._buffer[:0] = rows
+                return 0
+            if retry:
+                self.stats["errors"] += 1
+                self._buffer[:0] = retry
+            self.stats["written"] += written
+            self.stats["rejected"] += rejected
+            self.stats["batches"] += 1
+            return written
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """(written, rejected, rows to retry). Runs in a worker thread."""
+        try:
+            return self.store.write(rows), 0, []
+        except Exception as e:
+            if _transient(e):
+                raise
+            log.warning("Telemetry batch of %d pings failed, writing one by one: %s", len(rows), e)
+        written = rejected = 0
+        for i, row in enumerate(rows):
+            try:
+                written += self.store.write([row])
+            except Exception as e:
+                if _transient(e):
+                    log.warning("Telemetry flush failed (%d pings): %s", len(rows) - i, e)
+                    return written, rejected, rows[i:]
+                log.warning("Dropping telemetry ping of bus %s: %s", row.get("bus_id"), e)
+                rejected += 1
+        return written, rejected, []
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let an in-progress write finish rather than cancelling it mid-batch
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def track(self, bus_id: str, start_ts: float, end_ts: float, limit: int = 10000):
+        return await asyncio.to_thread(self.store.track, bus_id, start_ts, end_ts, limit)
+
+
+# Shared sink fed by mobile_location_update; started/stopped by the app lifespan
+telemetry = TelemetrySink()
@@ -0,0 +1,399 @@
+# utils/trip_state.py
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.broadcast import FLEET_ROOM, has_subscribers, wire_room
+from utils.gps_utils import EARTH_RADIUS_KM
+from utils.metrics import METRICS_ENABLED, emit_fanout, recipients
+from utils.wire import WIRE_BINARY
+
+log = logging.getLogger(__name__)
+
+SCHEDULED = "scheduled"
+STARTED = "started"
+AT_STOP = "at_stop"
+COMPLETED = "completed"
+OFFLINE = "offline"
+TRIP_STATES = (SCHEDULED, STARTED, AT_STOP, COMPLETED, OFFLINE)
+
+# A fix further from the last one than this speed allows (plus GPS slack) is a jump, not a bus
+TRIP_MAX_SPEED_KMPH = float(os.getenv("TRIP_MAX_SPEED_KMPH", "110"))
+TRIP_JUMP_SLACK_M = float(os.getenv("TRIP_JUMP_SLACK_M", "50"))
+# After this many jumps in a row the new position is taken as real (first fix was the bad one)
+TRIP_MAX_JUMPS = int(os.getenv("TRIP_MAX_JUMPS", "3"))
+# GPS error when the device doesn't report `accuracy`, and unmodelled motion per second for the filter
+TRIP_GPS_NOISE_M = float(os.getenv("TRIP_GPS_NOISE_M", "10"))
+TRIP_PROCESS_NOISE_M = float(os.getenv("TRIP_PROCESS_NOISE_M", "4"))
+# Don't extrapolate the last velocity further than this across a gap in pings
+TRIP_PREDICT_MAX_S = float(os.getenv("TRIP_PREDICT_MAX_S", "10"))
+# Dwell: this close to the stop just reached and this slow for this long
+TRIP_STOP_RADIUS_M = float(os.getenv("TRIP_STOP_RADIUS_M", "60"))
+TRIP_DWELL_SPEED_KMPH = float(os.getenv("TRIP_DWELL_SPEED_KMPH", "10"))
+TRIP_DWELL_MIN_S = float(os.getenv("TRIP_DWELL_MIN_S", "10"))
+TRIP_OFFLINE_S = float(os.getenv("TRIP_OFFLINE_S", "120"))
+TRIP_PUSH_TICK_MS = int(os.getenv("TRIP_PUSH_TICK_MS", "1000"))
+TRIP_EVENT = "trip_states"
+
+M_PER_DEG = EARTH_RADIUS_KM * 1000 * math.pi / 180
+_NUMBER = (float, int)
+
+
+def check_ping(data: Any) -> Optional[str]:
+    """
+    Why a location update can't be used, or None. Type and range checks
+    only, no per-bus state; 0.0 is a valid coordinate, but exactly (0, 0)
+    is what devices report without a fix.
+    """
+    if not isinstance(data, dict):
+        return "bad_payload"
+    bus_id, lat, lng = data.get("bus_id"), data.get("lat"), data.get("lng")
+    if bus_id in (None, "") or lat is None or lng is None:
+        return "missing_field"
+    if type(lat) not in _NUMBER or type(lng) not in _NUMBER or type(bus_id) not in (str, int):
+        return "bad_type"
+    # Optional, but used as a dict key and stored as a number downstream
+    route_id, heading = data.get("route_id"), data.get("heading")
+    if route_id is not None and type(route_id) not in (str, int):
+        return "bad_type"
+    if heading is not None and type(heading) not in _NUMBER:
+        return "bad_type"
+    # NaN fails both comparisons
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return "out_of_range"
+    if lat == 0 and lng == 0:
+        return "no_fix"
+    return None
+
+
+def reported(value: Any) -> Optional[float]:
+    """An optional numeric field (speed, accuracy, heading) as a float, None if absent or unusable."""
+    if type(value) in _NUMBER and 0 <= value < math.inf:
+        return float(value)
+    return None
+
+
+class BusTrip:
+    __slots__ = ("bus_id", "state", "since", "resume", "route_id", "lat", "lng", "ts", "vlat", "vlng", "var",
+                 "coslat", "jumps", "anchor_lat", "anchor_lng", "stop_seq", "stop_lat", "stop_lng", "terminal",
+                 "dwell_since", "rejected")
+
+    def __init__(self, bus_id, ts: float):
+        self.bus_id = bus_id
+        self.state = SCHEDULED
+        self.since = ts
+        self.resume = None  # state to return to when an offline bus pings again
+        self.route_id = None
+        # Filtered position (degrees), velocity (degrees/s) and position variance (m^2)
+        self.lat = self.lng = None
+        self.ts = None
+        self.vlat = self.vlng = 0.0
+        self.var = 0.0
+        self.coslat = 1.0
+        self.jumps = 0
+        self.anchor_lat = self.anchor_lng = None
+        self.stop_seq = None
+        self.stop_lat = self.stop_lng = None
+        self.terminal = False  # stop_seq is the last stop of the route
+        self.dwell_since = None
+        self.rejected = None  # why the latest ping was dropped, None if it was used
+
+
+class TripTracker:
+    """
+    Trip state per bus, driven by pings:
+
+        scheduled -> started      moved off where it was first seen, or notify_start
+        started   -> at_stop      within TRIP_STOP_RADIUS_M of the stop the ETA
+                                  engine last reached, slow for TRIP_DWELL_MIN_S
+        at_stop   -> started      left the stop
+        started   -> completed    stopped at the last stop of its route
+        any       -> offline      disconnected, or silent for TRIP_OFFLINE_S;
+                                  the next ping restores the previous state
+
+    Each ping is checked against the bus's last position (implied speed) and
+    smoothed with a scalar constant-velocity Kalman filter before anything
+    else sees it. Everything per ping is O(1); changes are pushed to fleet
+    dashboards as one batched frame per tick.
+    """
+
+    def __init__(self, sio, eta_engine, tick_ms: int = TRIP_PUSH_TICK_MS):
+        self.sio = sio
+        self.eta_engine = eta_engine
+        self.tick = tick_ms / 1000
+        self.max_speed_mps = TRIP_MAX_SPEED_KMPH / 3.6
+        self.process_var = TRIP_PROCESS_NOISE_M ** 2
+        self._buses: Dict[Any, BusTrip] = {}
+        self._changed: Dict[Any, BusTrip] = {}
+        self._next_sweep = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.counts = dict.fromkeys(TRIP_STATES, 0)
+        # Shared live state when workers split the pings; see EtaEngine.shared
+        self.shared = None
+        self.stats = {"pings": 0, "jumps": 0, "reanchored": 0, "transitions": 0, "dwells": 0, "completed": 0,
+                      "frames": 0}
+
+    # ---- pings ----
+    def on_ping(self, bus_id, lat: float, lng: float, ts: Optional[float] = None,
+                speed_kmph: Optional[float] = None, accuracy_m: Optional[float] = None, route_id=None) -> BusTrip:
+        """
+        Filter one validated fix. Returns the bus's trip with the smoothed
+        position in lat/lng, or with `rejected` set when the fix was dropped.
+        """
+        ts = ts or time.time()
+        self.stats["pings"] += 1
+        trip = self._buses.get(bus_id)
+        if trip is None:
+            trip = self._buses[bus_id] = BusTrip(bus_id, ts)
+            self.counts[SCHEDULED] += 1
+        trip.rejected = None
+        noise = accuracy_m or TRIP_GPS_NOISE_M
+
+        if trip.lat is None or trip.state == OFFLINE:
+            # Velocity and variance say nothing useful after a gap; start over from this fix
+            self._anchor(trip, lat, lng, noise)
+        else:
+            dt = max(ts - trip.ts, 0.0)
+            dy = (lat - trip.lat) * M_PER_DEG
+            dx = (lng - trip.lng) * M_PER_DEG * trip.coslat
+            reach = self.max_speed_mps * dt + TRIP_JUMP_SLACK_M
+            if dx * dx + dy * dy > reach * reach:
+                trip.jumps += 1
+                if trip.jumps < TRIP_MAX_JUMPS:
+                    self.stats["jumps"] += 1
+                    trip.rejected = "jump"
+                    return trip
+                self.stats["reanchored"] += 1
+                self._anchor(trip, lat, lng, noise)
+            else:
+                trip.jumps = 0
+                self._smooth(trip, lat, lng, dt, noise)
+        trip.ts = ts
+
+        if trip.state == OFFLINE:
+            self._set(trip, trip.resume or SCHEDULED, ts)
+        if route_id is not None and route_id != trip.route_id:
+            trip.route_id = route_id
+            self._new_trip(trip, SCHEDULED, ts)
+        self._step(trip, ts, speed_kmph)
+        return trip
+
+    def _anchor(self, trip: BusTrip, lat, lng, noise):
+        trip.lat, trip.lng = lat, lng
+        trip.vlat = trip.vlng = 0.0
+        trip.var = noise * noise
+        trip.coslat = math.cos(math.radians(lat))
+        trip.jumps = 0
+        if trip.anchor_lat is None:
+            trip.anchor_lat, trip.anchor_lng = lat, lng
+
+    def _smooth(self, trip: BusTrip, lat, lng, dt, noise):
+        # Predict along the last velocity, then blend in the fix by the Kalman gain;
+        # velocity follows the residual with the matching alpha-beta gain
+        ahead = min(dt, TRIP_PREDICT_MAX_S)
+        plat = trip.lat + trip.vlat * ahead
+        plng = trip.lng + trip.vlng * ahead
+        prior = trip.var + self.process_var * dt
+        gain = prior / (prior + noise * noise)
+        rlat, rlng = lat - plat, lng - plng
+        trip.lat = plat + gain * rlat
+        trip.lng = plng + gain * rlng
+        trip.var = (1 - gain) * prior
+        if dt > 0:
+            vgain = gain * gain / (2 - gain) / dt
+            trip.vlat += vgain * rlat
+            trip.vlng += vgain * rlng
+
+    def _distance_m(self, trip: BusTrip, lat, lng) -> float:
+        # Equirectangular: exact enough at stop / anchor distances and no trig per ping
+        dy = (lat - trip.lat) * M_PER_DEG
+        dx = (lng - trip.lng) * M_PER_DEG * trip.coslat
+        return math.sqrt(dx * dx + dy * dy)
+
+    def _speed_kmph(self, trip: BusTrip, reported_kmph: Optional[float]) -> float:
+        if reported_kmph is not None:
+            return reported_kmph
+        return math.hypot(trip.vlat, trip.vlng * trip.coslat) * M_PER_DEG * 3.6
+
+    def _step(self, trip: BusTrip, ts: float, speed_kmph: Optional[float]):
+        state = trip.state
+        if state == SCHEDULED:
+            if self._distance_m(trip, trip.anchor_lat, trip.anchor_lng) > TRIP_STOP_RADIUS_M:
+                self._set(trip, STARTED, ts)
+            return
+        if state not in (STARTED, AT_STOP) or trip.stop_lat is None:
+            return
+        near = self._distance_m(trip, trip.stop_lat, trip.stop_lng) <= TRIP_STOP_RADIUS_M
+        if state == AT_STOP:
+            if not near:
+                # One dwell per stop: the next one needs the next arrival
+                trip.stop_lat = trip.stop_lng = None
+                trip.dwell_since = None
+                self._set(trip, STARTED, ts)
+        elif near and self._speed_kmph(trip, speed_kmph) <= TRIP_DWELL_SPEED_KMPH:
+            if trip.terminal:
+                self.stats["completed"] += 1
+                self._set(trip, COMPLETED, ts)
+            elif trip.dwell_since is None:
+                trip.dwell_since = ts
+            elif ts - trip.dwell_since >= TRIP_DWELL_MIN_S:
+                self.stats["dwells"] += 1
+                self._set(trip, AT_STOP, ts)
+        else:
+            trip.dwell_since = None
+
+    def record_arrival(self, bus_id, route_id, seq: int, ts: float, delay_min=None):
+        """EtaEngine arrival listener: the stop a bus reached, where it may dwell or end the trip."""
+        trip = self._buses.get(bus_id)
+        if trip is None or trip.state in (COMPLETED, OFFLINE):
+            return
+        shape = self.eta_engine.route_shape(route_id)
+        if shape is None:
+            return
+        trip.stop_seq = seq
+        trip.stop_lat, trip.stop_lng = float(shape.lats[seq]), float(shape.lons[seq])
+        trip.terminal = seq >= len(shape) - 1
+        trip.dwell_since = None
+        if trip.state == SCHEDULED and seq > 0:
+            self._set(trip, STARTED, ts)
+
+    # ---- transitions ----
+    def _set(self, trip: BusTrip, state: str, ts: float):
+        if trip.state == state:
+            return
+        log.debug("Bus %s: %s -> %s", trip.bus_id, trip.state, state)
+        self.counts[trip.state] -= 1
+        self.counts[state] += 1
+        trip.state = state
+        trip.since = ts
+        self.stats["transitions"] += 1
+        self._changed[trip.bus_id] = trip
+
+    def _new_trip(self, trip: BusTrip, state: str, ts: float):
+        trip.anchor_lat, trip.anchor_lng = trip.lat, trip.lng
+        trip.stop_seq = trip.stop_lat = trip.stop_lng = None
+        trip.terminal = False
+        trip.dwell_since = None
+        self._set(trip, state, ts)
+
+    def start_trip(self, bus_id, ts: Optional[float] = None) -> BusTrip:
+        """The driver started the trip (notify_start): a new trip, started whatever the bus last did."""
+        ts = ts or time.time()
+        trip = self._buses.get(bus_id)
+        if trip is None:
+            trip = self._buses[bus_id] = BusTrip(bus_id, ts)
+            self.counts[SCHEDULED] += 1
+        self._new_trip(trip, STARTED, ts)
+        return trip
+
+    def mark_offline(self, bus_id, ts: Optional[float] = None):
+        trip = self._buses.get(bus_id)
+        if trip is not None and trip.state != OFFLINE:
+            trip.resume = trip.state
+            self._set(trip, OFFLINE, ts or time.time())
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Mark buses silent for TRIP_OFFLINE_S offline; a scan of the fleet, run once per tick."""
+        now = now or time.time()
+        stale = [trip.bus_id for trip in self._buses.values()
+                 if trip.state != OFFLINE and now - (trip.ts or trip.since) > TRIP_OFFLINE_S]
+        for bus_id in stale:
+            self.mark_offline(bus_id, now)
+        return len(stale)
+
+    # ---- reads ----
+    def get(self, bus_id) -> Optional[BusTrip]:
+        return self._buses.get(bus_id)
+
+    def _brief(self, trip: BusTrip) -> Dict[str, Any]:
+        return {"bus_id": trip.bus_id, "state": trip.state, "since": trip.since, "stop": trip.stop_seq}
+
+    def snapshot(self, bus_id) -> Optional[Dict[str, Any]]:
+        trip = self._buses.get(bus_id)
+        if trip is None:
+            return self._remote(self.shared.get(bus_id)) if self.shared is not None else None
+        return {
+            **self._brief(trip),
+            "route_id": trip.route_id,
+            "location": {"lat": trip.lat, "lng": trip.lng} if trip.lat is not None else None,
+            "dwell_s": round(trip.ts - trip.dwell_since, 1) if trip.state == AT_STOP and trip.dwell_since else None,
+            "last_ping": trip.ts,
+        }
+
+    def all(self, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        trips = [self.snapshot(bus_id) for bus_id, trip in list(self._buses.items())
+                 if state is None or trip.state == state]
+        if self.shared is not None:
+            local = {str(bus_id) for bus_id in self._buses}
+            for bus_id, position in self.shared.all().items():
+                remote = self._remote(position) if bus_id not in local else None
+                if remote and (state is None or remote["state"] == state):
+                    trips.append(remote)
+        return trips
+
+    def fleet_counts(self) -> Dict[str, int]:
+        """Buses per state: this worker's counts, or every worker's with a shared live state."""
+        if self.shared is None:
+            return dict(self.counts)
+        counts = dict.fromkeys(TRIP_STATES, 0)
+        for trip in self.all():
+            counts[trip["state"]] += 1
+        return counts
+
+    @staticmethod
+    def _remote(position: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Published with the position by the worker receiving the bus's pings. Its offline
+        # sweep only changes its own copy, so a silent bus is aged out here as well
+        trip = position.get("trip") if position else None
+        if trip and trip["state"] != OFFLINE and time.time() - (trip["last_ping"] or 0) > TRIP_OFFLINE_S:
+            trip = {**trip, "state": OFFLINE}
+        return trip
+
+    # ---- push ----
+    @property
+    def pending(self) -> int:
+        return len(self._changed)
+
+    async def flush(self) -> int:
+        now = time.time()
+        if now >= self._next_sweep:
+            self.expire(now)
+            self._next_sweep = now + min(TRIP_OFFLINE_S / 4, 30)
+        if not self._changed:
+            return 0
+        changed, self._changed = self._changed, {}
+        rooms = [room for room in (FLEET_ROOM, wire_room(FLEET_ROOM, WIRE_BINARY)) if has_subscribers(self.sio, room)]
+        if not rooms:
+            return 0
+        # State changes are rare and small, so every dashboard gets them as JSON
+        await self.sio.emit(TRIP_EVENT, {"ts": now, "trips": [self._brief(t) for t in changed.values()]}, to=rooms)
+        self.stats["frames"] += 1
+        if METRICS_ENABLED:
+            reached = [recipients(self.sio, room) for room in rooms]
+            if None not in reached:
+                emit_fanout.observe(sum(reached), TRIP_EVENT)
+        return len(changed)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("Trip state flush failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
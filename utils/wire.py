@@ -0,0 +1,140 @@
+# utils/wire.py
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Per-client payload encodings for positions; JSON stays the default for existing clients
+WIRE_JSON = "json"
+WIRE_BINARY = "binary"
+WIRE_FORMATS = (WIRE_JSON, WIRE_BINARY)
+WIRE_VERSION = 1
+
+KIND_POSITIONS = 1  # server -> dashboards: many buses per frame
+KIND_PING = 2  # driver -> server: one bus
+
+COORD_SCALE = 1_000_000  # 1e-6 degree is ~0.11 m
+SPEED_SCALE = 100  # 0.01 km/h
+HEADING_SCALE = 100  # 0.01 degree
+UNKNOWN = 0xFFFF  # speed / heading not reported
+MAX_OFFSET_MS = 0x7FFF
+
+# version, kind, frame ts (epoch s), number of bus ids in the table
+_FRAME_HEADER = struct.Struct("<BBdH")
+# bus id index, lat, lng (scaled), ms relative to the frame ts, speed, heading: 16 bytes
+_POSITION = struct.Struct("<Hiih2H")
+# version, kind
+_PING_HEADER = struct.Struct("<BB")
+_PING_BODY = struct.Struct("<ii2H")
+
+
+def _scaled(value: Optional[float], scale: int) -> int:
+    if value is None:
+        return UNKNOWN
+    scaled = round(float(value) * scale)
+    return scaled if 0 <= scaled < UNKNOWN else UNKNOWN
+
+
+def _unscaled(value: int, scale: int) -> Optional[float]:
+    return None if value == UNKNOWN else value / scale
+
+
+def _short_string(value: Any) -> bytes:
+    raw = str(value).encode()
+    if len(raw) > 255:
+        raise ValueError("ids longer than 255 bytes can't be encoded")
+    return bytes((len(raw),)) + raw
+
+
+def encode_positions(positions: Sequence[Tuple[Dict[str, Any], float]], ts: float) -> bytes:
+    """
+    One binary frame for many buses: a header, a table of the bus ids in
+    this frame, then a fixed 16-byte record per position that refers to its
+    bus by table index. Frames carry their own id table so any worker can
+    encode them and a client can decode any frame without earlier state.
+
+    positions are (ping, received_at) pairs; route/school ids and other
+    extra fields are left to the JSON format.
+    """
+    index: Dict[Any, int] = {}
+    names = []
+    records = []
+    pack = _POSITION.pack
+    for data, received_at in positions:
+        bus_id = data["bus_id"]
+        i = index.get(bus_id)
+        offset = round((received_at - ts) * 1000)
+        try:
+            name = _short_string(bus_id) if i is None else None
+            record = pack(
+                len(names) if i is None else i, round(data["lat"] * COORD_SCALE), round(data["lng"] * COORD_SCALE),
+                max(-MAX_OFFSET_MS, min(MAX_OFFSET_MS, offset)),
+                _scaled(data.get("speed"), SPEED_SCALE), _scaled(data.get("heading"), HEADING_SCALE),
+            )
+        except (struct.error, TypeError, ValueError):
+            # An id or coordinates that don't fit the format; JSON clients still get this ping as sent
+            continue
+        # Only buses with a record go in the id table
+        if i is None:
+            index[bus_id] = len(names)
+            names.append(name)
+        records.append(record)
+    return b"".join((_FRAME_HEADER.pack(WIRE_VERSION, KIND_POSITIONS, ts, len(names)), *names,
+                     struct.pack("<I", len(records)), *records))
+
+
+def decode_positions(frame: bytes) -> Tuple[float, List[Dict[str, Any]]]:
+    """Reference decoder for encode_positions (what a binary client implements)."""
+    try:
+        version, kind, ts, n_ids = _FRAME_HEADER.unpack_from(frame)
+        if version != WIRE_VERSION or kind != KIND_POSITIONS:
+            raise ValueError(f"not a v{WIRE_VERSION} positions frame")
+        offset = _FRAME_HEADER.size
+        names = []
+        for _ in range(n_ids):
+            size = frame[offset]
+            names.append(bytes(frame[offset + 1:offset + 1 + size]).decode())
+            offset += 1 + size
+        (count,) = struct.unpack_from("<I", frame, offset)
+        offset += 4
+        positions = []
+        for i, lat, lng, ms, speed, heading in _POSITION.iter_unpack(frame[offset:offset + count * _POSITION.size]):
+            positions.append({"bus_id": names[i], "lat": lat / COORD_SCALE, "lng": lng / COORD_SCALE,
+                              "ts": ts + ms / 1000, "speed": _unscaled(speed, SPEED_SCALE),
+                              "heading": _unscaled(heading, HEADING_SCALE)})
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"malformed positions frame: {e}") from e
+    if len(positions) != count:
+        raise ValueError("malformed positions frame: truncated records")
+    return ts, positions
+
+
+def encode_ping(bus_id: Any, lat: float, lng: float, speed: Optional[float] = None,
+                heading: Optional[float] = None, route_id: Any = None) -> bytes:
+    """A driver's location update: ids as short strings, then lat/lng/speed/heading scaled to ints."""
+    return b"".join((_PING_HEADER.pack(WIRE_VERSION, KIND_PING), _short_string(bus_id),
+                     _short_string("" if route_id is None else route_id),
+                     _PING_BODY.pack(round(lat * COORD_SCALE), round(lng * COORD_SCALE),
+                                     _scaled(speed, SPEED_SCALE), _scaled(heading, HEADING_SCALE))))
+
+
+def decode_ping(frame: bytes) -> Dict[str, Any]:
+    """The dict a JSON driver would have sent; raises ValueError on anything malformed."""
+    try:
+        version, kind = _PING_HEADER.unpack_from(frame)
+        if version != WIRE_VERSION or kind != KIND_PING:
+            raise ValueError(f"not a v{WIRE_VERSION} ping")
+        offset = _PING_HEADER.size
+        size = frame[offset]
+        bus_id = bytes(frame[offset + 1:offset + 1 + size]).decode()
+        offset += 1 + size
+        size = frame[offset]
+        route_id = bytes(frame[offset + 1:offset + 1 + size]).decode()
+        offset += 1 + size
+        lat, lng, speed, heading = _PING_BODY.unpack_from(frame, offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"malformed ping: {e}") from e
+    data = {"bus_id": bus_id, "lat": lat / COORD_SCALE, "lng": lng / COORD_SCALE,
+            "speed": _unscaled(speed, SPEED_SCALE), "heading": _unscaled(heading, HEADING_SCALE)}
+    if route_id:
+        # Route ids are integer keys; the string form is only how they travel
+        data["route_id"] = int(route_id) if route_id.isdigit() else route_id
+    return data